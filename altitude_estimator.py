@@ -0,0 +1,193 @@
+import time
+import numpy as np
+
+# The Tello reports vgz in decimeters per second, positive when descending
+# (north-east-down like the rest of its attitude data)
+TELEMETRY_SPEED_SCALE = 10
+VERTICAL_SPEED_UP = -1
+
+# The Tello's state packets arrive about ten times a second; fusing the
+# same packet again would count it twice
+TELEMETRY_PERIOD = 0.1
+
+# The downward ToF sensor reads 6553 when it has no return and isn't
+# trustworthy much beyond a few meters
+TOF_MAX = 600
+
+# Measurement noise (standard deviation)
+BARO_NOISE = 15.0       # cm
+TOF_NOISE = 3.0         # cm
+SPEED_NOISE = 6.0       # cm/s, mostly from rounding to dm/s
+
+# Process noise (standard deviation of the random walk per sqrt(second))
+ACCEL_NOISE = 80.0      # cm/s per sqrt(s), how hard the drone can change climb rate
+DRIFT_NOISE = 1.0       # cm per sqrt(s), barometer jitter the drift rate doesn't explain
+DRIFT_RATE_NOISE = 0.05 # cm/s per sqrt(s), how fast the weather changes its mind
+
+# A ToF reading further than this many standard deviations from the
+# estimate is something under the drone (a table, a person), not the floor
+TOF_GATE = 3.0
+
+# ToF readings rejected in a row before the estimate is assumed to be the
+# one that's wrong (a jump the other sensors missed) and ToF is trusted again
+TOF_REACQUIRE = 10
+
+#------------------------ BEGIN AltitudeEstimator CLASS ------------------------
+
+class AltitudeEstimator():
+    """
+    Kalman filter for the drone's altitude above the takeoff point.
+
+    The state is altitude, climb rate, barometer drift and drift rate. The
+    barometer measures altitude plus drift, the ToF sensor measures
+    altitude directly (within its range, over flat ground) and vgz
+    measures the climb rate. While the ToF sensor is usable it pins the
+    altitude, so the barometer's drift and how fast it is drifting are
+    learned continuously and carried forward when the drone climbs out of
+    ToF range or passes over something.
+    """
+
+    def __init__(self, baro_noise=BARO_NOISE, tof_noise=TOF_NOISE,
+                 speed_noise=SPEED_NOISE, accel_noise=ACCEL_NOISE,
+                 drift_noise=DRIFT_NOISE, drift_rate_noise=DRIFT_RATE_NOISE,
+                 clock=time.monotonic):
+        """
+        Arguments
+            *_noise: Standard deviations, see the module constants
+            clock:   Time source, HeadsUpTello passes its own
+        """
+        self.baro_noise = baro_noise
+        self.tof_noise = tof_noise
+        self.speed_noise = speed_noise
+        self.accel_noise = accel_noise
+        self.drift_noise = drift_noise
+        self.drift_rate_noise = drift_rate_noise
+        self.clock = clock
+
+        self.state = np.zeros(4)        # altitude, climb rate, baro drift, drift rate
+        self.covariance = np.diag([25.0, 25.0, 25.0, 1.0])
+        self.ground_tof = None
+        self.last_update = None
+        self.tof_used = 0
+        self.tof_rejected = 0
+        self.tof_rejected_in_a_row = 0
+        self.tof_reacquired = 0
+
+    def start(self, baro, tof):
+        """
+        Start on the ground. baro is relative to the reading the ceiling
+        and floor are measured from, tof is what the ToF sensor reads when
+        the drone is sitting on the ground.
+        """
+        self.ground_tof = tof
+        self.state = np.array([0.0, 0.0, float(baro), 0.0])
+        self.covariance = np.diag([1.0, 1.0, self.baro_noise ** 2, 0.1])
+        self.last_update = self.clock()
+
+    def predict(self, dt):
+        """ Carry the state forward dt seconds """
+        if dt <= 0:
+            return
+        transition = np.eye(4)
+        transition[0, 1] = dt
+        transition[2, 3] = dt
+        self.state = transition @ self.state
+        # Each rate's random walk also feeds the value it drives within the step
+        process = np.zeros((4, 4))
+        for value, rate, noise in ((0, 1, self.accel_noise), (2, 3, self.drift_rate_noise)):
+            process[value, value] = noise ** 2 * dt ** 3 / 3
+            process[value, rate] = process[rate, value] = noise ** 2 * dt ** 2 / 2
+            process[rate, rate] = noise ** 2 * dt
+        process[2, 2] += self.drift_noise ** 2 * dt
+        self.covariance = transition @ self.covariance @ transition.T + process
+
+    def _fuse(self, row, measurement, noise, gate=None):
+        """ Scalar measurement update. Returns False if the gate rejected it. """
+        row = np.asarray(row, dtype=float)
+        innovation = measurement - row @ self.state
+        variance = row @ self.covariance @ row + noise ** 2
+        if gate is not None and innovation ** 2 > gate ** 2 * variance:
+            return False
+        gain = self.covariance @ row / variance
+        self.state = self.state + gain * innovation
+        self.covariance = self.covariance - np.outer(gain, row @ self.covariance)
+        return True
+
+    def update(self, baro, tof, vgz, now=None):
+        """
+        Fuse one telemetry packet.
+
+        Arguments
+            baro: Barometer in cm, relative to the same reading as start()
+            tof:  Raw ToF distance in cm
+            vgz:  Raw vertical speed from telemetry
+        """
+        now = self.clock() if now is None else now
+        if self.last_update is None:
+            self.start(baro, tof)
+            return self.altitude
+        self.predict(now - self.last_update)
+        self.last_update = now
+
+        self._fuse([0.0, 1.0, 0.0, 0.0], vgz * TELEMETRY_SPEED_SCALE * VERTICAL_SPEED_UP, self.speed_noise)
+        self._fuse([1.0, 0.0, 1.0, 0.0], baro, self.baro_noise)
+        if 0 < tof < TOF_MAX:
+            gate = TOF_GATE
+            if self.tof_rejected_in_a_row >= TOF_REACQUIRE:
+                # Start the altitude over from ToF without blaming the
+                # jump on the barometer drift or the climb rate
+                jump = tof - self.ground_tof - self.state[0]
+                self.covariance[0, :] = self.covariance[:, 0] = 0.0
+                self.covariance[0, 0] = jump ** 2 + self.tof_noise ** 2
+                gate = None
+            if self._fuse([1.0, 0.0, 0.0, 0.0], tof - self.ground_tof, self.tof_noise, gate):
+                self.tof_used += 1
+                if gate is None:
+                    self.tof_reacquired += 1
+                self.tof_rejected_in_a_row = 0
+            else:
+                self.tof_rejected += 1
+                self.tof_rejected_in_a_row += 1
+        return self.altitude
+
+    def due(self, now=None):
+        """ True once a new telemetry packet should have arrived """
+        now = self.clock() if now is None else now
+        return self.last_update is None or now - self.last_update >= TELEMETRY_PERIOD
+
+    def estimate(self, now=None):
+        """ Altitude at now, extrapolated from the last update """
+        now = self.clock() if now is None else now
+        if self.last_update is None:
+            return 0.0
+        return self.state[0] + self.state[1] * (now - self.last_update)
+
+    @property
+    def altitude(self):
+        return float(self.state[0])
+
+    @property
+    def climb_rate(self):
+        return float(self.state[1])
+
+    @property
+    def baro_drift(self):
+        """ How far the barometer has wandered from the takeoff reading, in cm """
+        return float(self.state[2])
+
+    @property
+    def drift_rate(self):
+        """ Barometer drift in cm per minute """
+        return float(self.state[3]) * 60
+
+    def uncertainty(self):
+        """ Standard deviation of the altitude estimate in cm """
+        return float(np.sqrt(self.covariance[0, 0]))
+
+    def summary(self):
+        return (f"altitude={self.altitude:.0f}cm ±{self.uncertainty():.0f} "
+                f"climb={self.climb_rate:.0f}cm/s baro_drift={self.baro_drift:.0f}cm ({self.drift_rate:+.0f}cm/min) "
+                f"tof used={self.tof_used} rejected={self.tof_rejected} "
+                f"reacquired={self.tof_reacquired}")
+
+#------------------------- END AltitudeEstimator CLASS -------------------------
@@ -0,0 +1,209 @@
+import collections
+import logging
+import threading
+import time
+
+# Priority lanes, most urgent first
+EMERGENCY = 0
+FLIGHT = 1      # takeoff and land
+MANEUVER = 2    # flips and other one-shot moves
+LANE_NAMES = {EMERGENCY: 'emergency', FLIGHT: 'flight', MANEUVER: 'maneuver'}
+
+# How many actions may wait in each lane before new ones are turned away
+DEFAULT_DEPTH = {EMERGENCY: 1, FLIGHT: 1, MANEUVER: 2}
+
+#---------------------------- BEGIN Action CLASS -------------------------------
+
+class Action():
+    """ One queued drone command and what happened to it """
+
+    def __init__(self, name, function, args, lane, on_done, submitted):
+        self.name = name
+        self.function = function
+        self.args = args
+        self.lane = lane
+        self.on_done = on_done
+        self.submitted = submitted
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.cancelled = False
+
+#----------------------------- END Action CLASS --------------------------------
+
+#------------------------- BEGIN CommandExecutor CLASS -------------------------
+
+class CommandExecutor():
+    """
+    Runs blocking drone commands (takeoff, land, flips) off the UI thread.
+
+    One worker runs the flight and maneuver lanes, one action at a time
+    and flight before maneuver, because the drone only handles one command
+    at a time anyway. Emergency actions have their own worker so they
+    start right away even while another command is waiting on the drone,
+    and submitting one cancels everything still queued and turns away new
+    actions until it has finished.
+
+    submit() never blocks. An action is dropped instead of queued when the
+    same action was submitted less than debounce seconds ago, when it is
+    already queued or running, or when its lane is full.
+    """
+
+    def __init__(self, logger=None, debounce=0.5, depth=None, clock=time.perf_counter):
+        """
+        Arguments
+            logger:   Where to log failures, drone_logger if None
+            debounce: Seconds during which a repeat of an action is ignored
+            depth:    Dict of lane -> queue depth, see DEFAULT_DEPTH
+            clock:    Time source for debouncing and wait times, e.g. a
+                      replay's clock
+        """
+        self.logger = logger or logging.getLogger('drone_logger')
+        self.debounce = debounce
+        self.depth = dict(DEFAULT_DEPTH, **(depth or {}))
+        self.clock = clock
+        self.lanes = {lane: collections.deque() for lane in LANE_NAMES}
+        self.condition = threading.Condition()
+        self.running = {}
+        # Worker lanes -> thread id, from taking an action until its on_done returned
+        self.active = {}
+        self.last_submitted = {}
+        self.stopped = False
+
+        self.counts = collections.Counter()
+        self.waits = collections.deque(maxlen=1000)
+        self.max_pending = 0
+
+        self.worker_lanes = ((FLIGHT, MANEUVER), (EMERGENCY,))
+        self.threads = [threading.Thread(target=self._worker, args=(lanes,), daemon=True)
+                        for lanes in self.worker_lanes]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, name, function, *args, lane=MANEUVER, on_done=None):
+        """
+        Queue function(*args) and return True, or return False if it was
+        debounced, coalesced with a pending copy or rejected. on_done, if
+        given, is called from the worker with the finished Action.
+        """
+        now = self.clock()
+        with self.condition:
+            if self.stopped:
+                return self._drop('rejected')
+            last = self.last_submitted.get(name)
+            if last is not None and now - last < self.debounce:
+                return self._drop('debounced')
+            self.last_submitted[name] = now
+            if self._pending(name):
+                return self._drop('coalesced')
+            if lane != EMERGENCY and (self.lanes[EMERGENCY] or EMERGENCY in self.running):
+                return self._drop('rejected')
+            if len(self.lanes[lane]) >= self.depth[lane]:
+                return self._drop('rejected')
+
+            if lane == EMERGENCY:
+                self._cancel_queued()
+            self.lanes[lane].append(Action(name, function, args, lane, on_done, now))
+            self.counts['submitted'] += 1
+            self.max_pending = max(self.max_pending, sum(len(queued) for queued in self.lanes.values()))
+            self.condition.notify_all()
+            return True
+
+    def emergency(self, name, function, *args, on_done=None):
+        """ Cancel everything queued and run function(*args) as soon as possible """
+        with self.condition:
+            # An emergency is never debounced away
+            self.last_submitted.pop(name, None)
+        return self.submit(name, function, *args, lane=EMERGENCY, on_done=on_done)
+
+    def busy(self, *lanes):
+        """ True while an action from any of lanes (all lanes if none given) is queued or running """
+        lanes = lanes or tuple(LANE_NAMES)
+        with self.condition:
+            return any(self.lanes[lane] or lane in self.running for lane in lanes)
+
+    def settled(self, waiting):
+        """
+        True when every worker is idle with nothing queued for it, or is
+        running an action that is blocked in waiting(thread id), e.g.
+        ReplayClock.sleeping. A deterministic replay steps time only once
+        the executor has settled.
+        """
+        with self.condition:
+            for lanes in self.worker_lanes:
+                if lanes in self.active:
+                    if not waiting(self.active[lanes]):
+                        return False
+                elif any(self.lanes[lane] for lane in lanes):
+                    return False
+            return True
+
+    def cancel(self):
+        """ Drop everything that hasn't started yet """
+        with self.condition:
+            self._cancel_queued()
+
+    def stop(self, timeout=None):
+        """ Cancel queued actions and wait up to timeout seconds for running ones """
+        with self.condition:
+            self.stopped = True
+            self._cancel_queued()
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def report(self):
+        waits = sorted(self.waits)
+        wait = f"{waits[len(waits) // 2] * 1000:.1f}ms" if waits else "n/a"
+        counts = " ".join(f"{key}={self.counts[key]}" for key in
+                          ('submitted', 'completed', 'failed', 'cancelled', 'debounced', 'coalesced', 'rejected'))
+        return f"{counts} max_pending={self.max_pending} median_wait={wait}"
+
+    def _drop(self, reason):
+        self.counts[reason] += 1
+        return False
+
+    def _pending(self, name):
+        if any(action.name == name for action in self.running.values()):
+            return True
+        return any(action.name == name for queued in self.lanes.values() for action in queued)
+
+    def _cancel_queued(self):
+        for lane in (FLIGHT, MANEUVER):
+            while self.lanes[lane]:
+                action = self.lanes[lane].popleft()
+                action.cancelled = True
+                self.counts['cancelled'] += 1
+                self.logger.info(f"Cancelled queued {action.name}")
+
+    def _worker(self, lanes):
+        while True:
+            with self.condition:
+                while not self.stopped and not any(self.lanes[lane] for lane in lanes):
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                lane = next(lane for lane in lanes if self.lanes[lane])
+                action = self.lanes[lane].popleft()
+                action.started = self.clock()
+                self.running[lane] = action
+                self.active[lanes] = threading.get_ident()
+            self.waits.append(action.started - action.submitted)
+
+            try:
+                action.function(*action.args)
+            except Exception as excp:
+                action.error = excp
+                self.logger.error(f"{action.name} failed: {excp}")
+            action.finished = self.clock()
+
+            with self.condition:
+                del self.running[lane]
+                self.counts['failed' if action.error else 'completed'] += 1
+                self.condition.notify_all()
+            if action.on_done:
+                action.on_done(action)
+            with self.condition:
+                del self.active[lanes]
+
+#-------------------------- END CommandExecutor CLASS --------------------------
@@ -0,0 +1,181 @@
+import collections
+import logging
+import threading
+import time
+from stats import summarize
+
+# Seconds without a fresh setpoint before the drone is told to hover, and
+# before it is told to land
+HOVER_AFTER = 0.5
+LAND_AFTER = 3.0
+
+# How often the supervisor looks at the heartbeat. It reacts at most this
+# long after a deadline, plus however late its thread gets to run.
+CHECK_PERIOD = 0.01
+
+# The Tello keeps flying the last RC command it got, so the hover is
+# repeated while the loop is stuck in case a UDP packet went missing
+HOVER_REPEAT = 0.25
+
+# Supervisor stages
+IDLE = 'idle'           # the loop isn't flying by RC, nothing to watch
+WATCHING = 'watching'
+HOVERING = 'hovering'
+LANDING = 'landing'
+
+#------------------------ BEGIN FailsafeSupervisor CLASS -----------------------
+
+class FailsafeSupervisor():
+    """
+    Watches the ground station loop from its own thread and stops the
+    drone when the loop stops sending setpoints, for example while it is
+    blocked on telemetry, a log write or a garbage collection pause.
+
+    The loop calls heartbeat() after every RC command it sends, and
+    disarm() while it isn't flying by RC (on the ground, taking off,
+    landing). If no heartbeat arrives for hover_after seconds the
+    supervisor sends a zero RC command so the drone hovers in place, and
+    if there is still none after land_after seconds it calls land. A
+    heartbeat before then hands control back to the loop.
+
+    How late each check runs is recorded all the time, not only during a
+    stall, so report() can state the response time the supervisor
+    actually achieved: check period, plus worst wake-up delay, plus worst
+    time to send the hover. A stall that holds the GIL (a long GC pause)
+    delays the supervisor too, and shows up in the wake-up delays.
+    """
+
+    def __init__(self, drone, land=None, hover=None, hover_after=HOVER_AFTER, land_after=LAND_AFTER,
+                 period=CHECK_PERIOD, logger=None, clock=time.perf_counter):
+        """
+        Arguments
+            drone:       Object with send_rc_control, djitellopy.Tello or
+                         HeadsUpTello.drone
+            land:        Called to land, drone.land if None. It is called on
+                         the supervisor thread, so a slow one should only
+                         hand the landing off (e.g. CommandExecutor.emergency)
+            hover:       Called to hover, a zero RC command if None. Pass
+                         HeadsUpTello.hover so RC shaping restarts from rest
+            hover_after: Seconds without a heartbeat before hovering
+            land_after:  Seconds without a heartbeat before landing
+            period:      Seconds between checks
+            logger:      Where to log, drone_logger if None
+            clock:       Time source shared with whoever calls heartbeat()
+        """
+        self.drone = drone
+        self.land = land or drone.land
+        self.hover = hover or (lambda: drone.send_rc_control(0, 0, 0, 0))
+        self.hover_after = hover_after
+        self.land_after = land_after
+        self.period = period
+        self.logger = logger or logging.getLogger('drone_logger')
+        self.clock = clock
+
+        # Written by the loop, read by the supervisor; None while disarmed
+        self.last_beat = None
+        self.stage = IDLE
+        self.stalled_beat = None
+        self.last_hover = None
+
+        self.wake_delays = collections.deque(maxlen=10000)
+        self.send_times = collections.deque(maxlen=1000)
+        self.hover_responses = collections.deque(maxlen=1000)
+        self.land_responses = collections.deque(maxlen=1000)
+        self.stalls = collections.deque(maxlen=1000)
+        self.checks = 0
+        self.hovers = 0
+        self.landings = 0
+
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._watch, daemon=True)
+        self.thread.start()
+
+    def heartbeat(self):
+        """ The loop has just sent a fresh setpoint """
+        self.last_beat = self.clock()
+
+    def disarm(self):
+        """ The loop isn't flying by RC, so a missing heartbeat isn't a stall """
+        self.last_beat = None
+
+    def stop(self, timeout=1.0):
+        self.stopped.set()
+        self.thread.join(timeout)
+
+    def response_bound(self):
+        """ Worst time seen from a deadline passing to the drone being told, in seconds """
+        wake = max(self.wake_delays, default=0.0)
+        send = max(self.send_times, default=0.0)
+        return self.period + wake + send
+
+    def report(self):
+        return (f"checks={self.checks} wake delay[{summarize(self.wake_delays)}] "
+                f"response bound={self.response_bound() * 1000:.1f}ms "
+                f"hovers={self.hovers} response[{summarize(self.hover_responses)}] "
+                f"landings={self.landings} response[{summarize(self.land_responses)}] "
+                f"stalls[{summarize(self.stalls)}]")
+
+    def _watch(self):
+        next_check = self.clock()
+        while not self.stopped.is_set():
+            next_check += self.period
+            delay = next_check - self.clock()
+            if delay > 0 and self.stopped.wait(delay):
+                return
+            now = self.clock()
+            self.wake_delays.append(max(0.0, now - next_check))
+            # After a long delay carry on from now rather than catching up
+            if now - next_check > self.period:
+                next_check = now
+            self.checks += 1
+            self._check(now)
+
+    def _check(self, now):
+        beat = self.last_beat
+        if beat is None:
+            if self.stage == HOVERING:
+                self.logger.info("Failsafe: RC flying stopped, hover released")
+            self.stage = IDLE
+            return
+        if self.stage == LANDING:
+            # Latched until the loop disarms
+            return
+        if self.stage == HOVERING and beat != self.stalled_beat:
+            stall = beat - self.stalled_beat
+            self.stalls.append(stall)
+            self.logger.warning(f"Failsafe: control loop recovered after {stall:.2f}s")
+            self.stage = WATCHING
+        if self.stage == IDLE:
+            self.stage = WATCHING
+
+        age = now - beat
+        if self.stage == WATCHING:
+            if age >= self.hover_after:
+                self.stage = HOVERING
+                self.stalled_beat = beat
+                self.hovers += 1
+                self._hover()
+                self.hover_responses.append(self.clock() - (beat + self.hover_after))
+                self.logger.warning(f"Failsafe: no setpoint for {age:.2f}s, hovering")
+        elif age >= self.land_after:
+            self.stage = LANDING
+            self.landings += 1
+            self.land_responses.append(self.clock() - (beat + self.land_after))
+            self.logger.error(f"Failsafe: no setpoint for {age:.2f}s, landing")
+            try:
+                self.land()
+            except Exception as excp:
+                self.logger.error(f"Failsafe: land failed: {excp}")
+        elif now - self.last_hover >= HOVER_REPEAT:
+            self._hover()
+
+    def _hover(self):
+        started = self.clock()
+        try:
+            self.hover()
+        except Exception as excp:
+            self.logger.error(f"Failsafe: hover command failed: {excp}")
+        self.last_hover = self.clock()
+        self.send_times.append(self.last_hover - started)
+
+#------------------------- END FailsafeSupervisor CLASS ------------------------
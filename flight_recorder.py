@@ -0,0 +1,441 @@
+import argparse
+import bisect
+import collections
+import json
+import logging
+import threading
+import time
+import numpy as np
+from headless import InputRecorder
+from stats import percentile, summarize
+
+# Drone getters that are just reads of the telemetry the Tello streams;
+# they are logged when their value changes rather than on every call
+NOT_TELEMETRY = ('get_frame_read', 'get_udp_video_address')
+
+# Longest a deterministic replay waits for other threads to catch up with
+# a loop iteration, so a thread that never does can't hang the replay
+SETTLE_TIMEOUT = 1.0
+
+
+def _plain(value):
+    """ Make a value JSON friendly """
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return value
+    if isinstance(value, (np.integer, np.floating)):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _plain(item) for key, item in value.items()}
+    return repr(value)
+
+
+def _is_telemetry(name):
+    return name.startswith('get_') and name not in NOT_TELEMETRY
+
+#------------------------- BEGIN SessionRecorder CLASS -------------------------
+
+class SessionRecorder(InputRecorder):
+    """
+    Records a whole ground station session to one JSON lines log: key
+    events (in the same form as InputRecorder, so ReplayInput can play
+    them), drone commands with their results and durations, telemetry
+    changes, video frame arrivals and loop timing. Every entry has a
+    "kind" and a time "t" in seconds since the recorder was created.
+    Entries can come from several threads.
+    """
+
+    def __init__(self, path, clock=time.perf_counter):
+        super().__init__(path)
+        self.clock = clock
+        self.start = clock()
+        self.lock = threading.Lock()
+
+    def now(self):
+        return self.clock() - self.start
+
+    def record(self, event, now=None):
+        """ Log a key event, stamped with the recorder's own clock """
+        with self.lock:
+            super().record(event, self.clock())
+
+    def write(self, kind, **fields):
+        """ Log one entry of the given kind, stamped now unless t is given """
+        entry = {'kind': kind, 't': round(fields.pop('t', self.now()), 4)}
+        entry.update({key: _plain(value) for key, value in fields.items()})
+        with self.lock:
+            self.log.write(json.dumps(entry) + '\n')
+
+    def close(self):
+        with self.lock:
+            self.log.close()
+
+#-------------------------- END SessionRecorder CLASS --------------------------
+
+#-------------------------- BEGIN RecordingTello CLASS -------------------------
+
+class RecordingTello():
+    """
+    Wraps a drone object (djitellopy.Tello or a fake) and logs every call
+    made on it to a SessionRecorder. Everything else passes straight
+    through, so it can be handed to HeadsUpTello in place of the drone.
+    """
+
+    def __init__(self, drone, recorder):
+        self._drone = drone
+        self._recorder = recorder
+        self._telemetry = {}
+        self._frame_read = None
+        self.calls = collections.Counter()
+
+    def __getattr__(self, name):
+        attribute = getattr(self._drone, name)
+        if not callable(attribute) or name.startswith('_'):
+            return attribute
+        if name == 'get_frame_read':
+            return self._get_frame_read
+        if _is_telemetry(name):
+            return lambda *args: self._read(name, attribute, args)
+        return lambda *args, **kwargs: self._call(name, attribute, args, kwargs)
+
+    def _read(self, name, getter, args):
+        value = getter(*args)
+        self.calls[name] += 1
+        key = (name, args)
+        if self._telemetry.get(key, self) != value:
+            self._telemetry[key] = value
+            self._recorder.write('telemetry', name=name, args=args, value=value)
+        return value
+
+    def _call(self, name, function, args, kwargs):
+        self.calls[name] += 1
+        started = self._recorder.now()
+        result = error = None
+        try:
+            result = function(*args, **kwargs)
+            return result
+        except Exception as excp:
+            error = f"{type(excp).__name__}: {excp}"
+            raise
+        finally:
+            self._recorder.write('command', t=started, name=name, args=args,
+                                 duration=round(self._recorder.now() - started, 4),
+                                 result=result, error=error)
+
+    def _get_frame_read(self, *args, **kwargs):
+        if self._frame_read is None:
+            self._frame_read = RecordingFrameRead(self._drone.get_frame_read(*args, **kwargs), self._recorder)
+        return self._frame_read
+
+#--------------------------- END RecordingTello CLASS --------------------------
+
+#------------------------ BEGIN RecordingFrameRead CLASS -----------------------
+
+class RecordingFrameRead():
+    """ Passes frames through from a frame reader, logging when each new one is first seen """
+
+    def __init__(self, reader, recorder):
+        self._reader = reader
+        self._recorder = recorder
+        self._last = None
+
+    @property
+    def frame(self):
+        frame = self._reader.frame
+        if frame is not None and frame is not self._last:
+            self._last = frame
+            self._recorder.write('frame', shape=frame.shape)
+        return frame
+
+    def __getattr__(self, name):
+        return getattr(self._reader, name)
+
+#------------------------- END RecordingFrameRead CLASS ------------------------
+
+
+def load_session(path):
+    """ Read a session log into a dict of kind -> list of entries """
+    entries = collections.defaultdict(list)
+    with open(path) as log:
+        for line in log:
+            if line.strip():
+                entry = json.loads(line)
+                entries[entry.get('kind', 'input')].append(entry)
+    return entries
+
+#--------------------------- BEGIN ReplayClock CLASS ---------------------------
+
+class ReplayClock():
+    """
+    Session time for a replay, exposing time() and sleep() like the time
+    module so HeadsUpTello can run on it.
+
+    Deterministic replays step through the recorded loop iterations: time
+    only moves when advance() is called, to the start of the next recorded
+    iteration. sleep() on another thread (a command running on the
+    executor) waits until the stepped time has passed, so a command stays
+    busy for as many loop iterations as it did in the recording; on the
+    stepping thread it returns at once. Before advance() returns it waits
+    until every check in settled_checks passes (e.g. the executor and the
+    frame reader have caught up with the new time), so those threads see
+    each iteration where the recording did whatever the scheduler does.
+    The last advance() moves time on to final, when the recording ends,
+    so what was recorded after the last iteration is played too.
+    Otherwise time runs at speed times the wall clock.
+    """
+
+    def __init__(self, loop_times, speed=1.0, deterministic=False, final=None):
+        self.loop_times = loop_times
+        self.speed = speed
+        self.deterministic = deterministic
+        self.end = loop_times[-1] if loop_times else 0.0
+        self.final = max(self.end, final or 0.0)
+        self.index = 0
+        self.now = 0.0
+        self.origin = time.perf_counter()
+        self.condition = threading.Condition()
+        # Whoever sets up the replay runs the loop that steps it
+        self.stepping_thread = threading.get_ident()
+        self.over = False
+        # Thread id -> time it sleeps until, for sleeping()
+        self.sleepers = {}
+        self.settled_checks = []
+        self.settle_timeouts = 0
+
+    def time(self):
+        if self.deterministic:
+            return self.now
+        return (time.perf_counter() - self.origin) * self.speed
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        if not self.deterministic:
+            time.sleep(seconds / self.speed)
+            return
+        if threading.get_ident() == self.stepping_thread:
+            return
+        with self.condition:
+            wake = self.now + seconds
+            self.sleepers[threading.get_ident()] = wake
+            while self.now < wake and not self.over:
+                self.condition.wait()
+            del self.sleepers[threading.get_ident()]
+
+    def sleeping(self, thread):
+        """ True while thread (an id) is blocked in sleep() and not yet due to wake """
+        with self.condition:
+            return thread in self.sleepers and self.sleepers[thread] > self.now and not self.over
+
+    def iteration_end(self):
+        """
+        Just before the next loop iteration started in the recording. Key
+        events were logged while the iteration that handled them ran, so
+        this is when a deterministic replay has had all of this
+        iteration's. Otherwise just the time.
+        """
+        if not self.deterministic:
+            return self.time()
+        with self.condition:
+            if self.index < len(self.loop_times):
+                return self.loop_times[self.index] - 1e-6
+            return self.final
+
+    def advance(self):
+        """ Move to the next loop iteration. Returns False once the recording is over. """
+        if not self.deterministic:
+            return self.time() <= self.end
+        with self.condition:
+            if self.index >= len(self.loop_times):
+                # Nothing is left to wait for
+                self.now = self.final
+                self.over = True
+                self.condition.notify_all()
+            else:
+                self.now = self.loop_times[self.index]
+                self.index += 1
+                self.condition.notify_all()
+        self._settle()
+        return not self.over
+
+    def _settle(self):
+        """ Wait, up to SETTLE_TIMEOUT, until every settled check passes """
+        deadline = time.perf_counter() + SETTLE_TIMEOUT
+        while not all(check() for check in self.settled_checks):
+            if time.perf_counter() > deadline:
+                self.settle_timeouts += 1
+                return
+            time.sleep(0.0005)
+
+#---------------------------- END ReplayClock CLASS ----------------------------
+
+class ReplayException(Exception):
+    """ A command failed in the recording, so it fails in the replay """
+
+#--------------------------- BEGIN ReplayTello CLASS ---------------------------
+
+class ReplayTello():
+    """
+    A fake drone that plays back a session log. Telemetry getters return
+    the value recorded at the current replay time. Commands return what
+    the n-th call of that command returned in the recording (or raise what
+    it raised) and take as long as they did; in a deterministic replay
+    they end at the recorded time. Frames show up at the recorded times,
+    and a deterministic replay delivers every one of them.
+
+    Calls the recording doesn't have an answer for are counted in
+    unmatched; they are the first thing to look at when a replay diverges.
+    """
+
+    LOGGER = logging.getLogger('replay_tello')
+
+    def __init__(self, path, speed=1.0, deterministic=False):
+        """
+        Arguments
+            path:          Session log written by SessionRecorder
+            speed:         Replay speed when not deterministic, 10 is 10x
+            deterministic: Step through recorded loop iterations instead
+                           of following the wall clock
+        """
+        session = load_session(path)
+        self.frame_times = [entry['t'] for entry in session['frame']]
+        self.clock = ReplayClock([entry['t'] for entry in session['loop']], speed, deterministic,
+                                 final=self.frame_times[-1] if self.frame_times else None)
+
+        self.telemetry = collections.defaultdict(lambda: ([], []))
+        for entry in session['telemetry']:
+            times, values = self.telemetry[(entry['name'], tuple(entry['args']))]
+            times.append(entry['t'])
+            values.append(entry['value'])
+
+        self.responses = collections.defaultdict(collections.deque)
+        for entry in session['command']:
+            self.responses[entry['name']].append(entry)
+
+        self.frame_shape = tuple(session['frame'][0]['shape']) if session['frame'] else (720, 960, 3)
+        self.recorded_calls = collections.Counter(entry['name'] for entry in session['command'])
+        self.calls = collections.Counter()
+        self.unmatched = collections.Counter()
+        self.frame_read = None
+
+    def __getattr__(self, name):
+        # There's no real video stream to decode out of process
+        if name.startswith('_') or name == 'get_udp_video_address':
+            raise AttributeError(name)
+        if _is_telemetry(name):
+            return lambda *args: self._read(name, args)
+        return lambda *args, **kwargs: self._command(name)
+
+    def _read(self, name, args):
+        self.calls[name] += 1
+        times, values = self.telemetry.get((name, args), ((), ()))
+        index = bisect.bisect_right(times, self.clock.time()) - 1
+        if index < 0:
+            if not values:
+                self.unmatched[name] += 1
+                return 0
+            index = 0
+        return values[index]
+
+    def _command(self, name):
+        self.calls[name] += 1
+        if not self.responses[name]:
+            self.unmatched[name] += 1
+            return None
+        entry = self.responses[name].popleft()
+        if self.clock.deterministic:
+            # Finish when the recorded command did, not a loop iteration's
+            # worth of offset later or earlier
+            self.clock.sleep(entry['t'] + entry['duration'] - self.clock.time())
+        else:
+            self.clock.sleep(entry['duration'])
+        if entry['error']:
+            raise ReplayException(entry['error'])
+        return entry['result']
+
+    def get_frame_read(self, *args, **kwargs):
+        if self.frame_read is None:
+            self.frame_read = ReplayFrameRead(self.frame_times, self.frame_shape, self.clock)
+            if self.clock.deterministic:
+                self.clock.settled_checks.append(self.frame_read.caught_up)
+        return self.frame_read
+
+    def report(self):
+        """ Calls made compared to the recording, per command """
+        lines = []
+        for name in sorted(set(self.recorded_calls) | {name for name in self.calls if not _is_telemetry(name)}):
+            lines.append(f"  {name:<20} recorded={self.recorded_calls[name]} replayed={self.calls[name]}")
+        if self.unmatched:
+            lines.append(f"  unmatched: {dict(self.unmatched)}")
+        return "\n".join(lines)
+
+#---------------------------- END ReplayTello CLASS ----------------------------
+
+#------------------------- BEGIN ReplayFrameRead CLASS -------------------------
+
+class ReplayFrameRead():
+    """
+    Frames at the times they arrived in the recording. The pixels are a
+    plain gradient; each new frame is a new view of it, so consumers that
+    look for a new frame object see one at every recorded arrival. On a
+    deterministic clock each read moves on by at most one frame, so a
+    reader that falls behind still gets every frame, and caught_up() says
+    when it has had all of them up to now.
+    """
+
+    def __init__(self, frame_times, shape, clock):
+        self.frame_times = frame_times
+        self.clock = clock
+        self.background = np.zeros(shape, dtype=np.uint8)
+        self.background[:, :, 1] = np.linspace(40, 200, shape[1], dtype=np.uint8)
+        self.index = -1
+        self._frame = None
+
+    @property
+    def frame(self):
+        index = bisect.bisect_right(self.frame_times, self.clock.time()) - 1
+        if self.clock.deterministic:
+            index = min(index, self.index + 1)
+        if index != self.index and index >= 0:
+            self.index = index
+            self._frame = self.background[:]
+        return self._frame
+
+    def caught_up(self):
+        return bisect.bisect_right(self.frame_times, self.clock.time()) - 1 <= self.index
+
+    def stop(self):
+        pass
+
+#-------------------------- END ReplayFrameRead CLASS --------------------------
+
+
+def compare(baseline_path, candidate_path):
+    """ Print loop timing and command counts of two session logs side by side """
+    sessions = [load_session(baseline_path), load_session(candidate_path)]
+    print(f"{'':<22}{'baseline':>14}{'candidate':>14}")
+
+    for label, fraction in (('loop work p50', 0.5), ('loop work p99', 0.99)):
+        values = []
+        for session in sessions:
+            work = sorted(entry['work'] for entry in session['loop'])
+            values.append(f"{percentile(work, fraction) * 1000:.2f}ms" if work else "n/a")
+        print(f"{label:<22}{values[0]:>14}{values[1]:>14}")
+
+    for session_label, session in zip(('baseline', 'candidate'), sessions):
+        work = [entry['work'] for entry in session['loop']]
+        print(f"{session_label} loops={len(work)} work[{summarize(work)}] frames={len(session['frame'])}")
+
+    counts = [collections.Counter(entry['name'] for entry in session['command']) for session in sessions]
+    for name in sorted(set(counts[0]) | set(counts[1])):
+        marker = "" if counts[0][name] == counts[1][name] else "  <-"
+        print(f"{name:<22}{counts[0][name]:>14}{counts[1][name]:>14}{marker}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare two recorded ground station sessions")
+    parser.add_argument('baseline', help="session log to compare against")
+    parser.add_argument('candidate', help="session log to check, e.g. recorded while replaying the baseline")
+    args = parser.parse_args()
+    compare(args.baseline, args.candidate)
@@ -1,8 +1,13 @@
-import dji_matrix as djim
 import logging
 import logging.config
 from datetime import datetime
 import math
+import time
+from waypoint_controller import WaypointController
+from setpoint_shaper import SetpointShaper
+from altitude_estimator import AltitudeEstimator
+from frame_ring import SharedFrameRead
+import survey
 
 #------------------------- BEGIN HeadsUpTello CLASS ----------------------------
 
@@ -27,6 +32,7 @@ class HeadsUpTello():
 
         self.name = parameters['name']
         self.mission = parameters['mission']
+        self.log_to_file = parameters.get('log_to_file', True)
 
         self._setup_logging(debug_level)
 
@@ -36,10 +42,17 @@ class HeadsUpTello():
         # to choose one or the other.
         self.drone = drone_object
         self.drone.LOGGER.setLevel(debug_level)
+        # A simulated drone brings its own virtual clock so missions can run
+        # faster than real time; a real drone runs on the wall clock
+        clock = getattr(drone_object, 'clock', None)
+        self.time = clock.time if clock else time.monotonic
+        self.sleep = clock.sleep if clock else time.sleep
         self.ceiling = parameters['ceiling']
         self.floor = parameters['floor']
         self.min_fly_battery = parameters['min_takeoff_power']
         self.min_op_battery = parameters['min_operating_power']
+        # How far the drone flies per percent of battery, for sizing survey sorties
+        self.cm_per_battery_percent = parameters.get('cm_per_battery_percent', 300)
 
         try:
             self.drone.connect()
@@ -52,10 +65,22 @@ class HeadsUpTello():
             raise
 
         self.initial_barometer = self.drone.get_barometer()
+        # Baro, ToF and climb rate fused into one altitude, see altitude()
+        self.altitude_estimator = AltitudeEstimator(clock=self.time)
+        self.altitude_estimator.start(0, self.drone.get_distance_tof())
         self.home_coords = [0, 0]
         self.x, self.y = 0, 0
         self.rotation_angle = 0
 
+        # Video decoded in a separate process, see streamon
+        self.frame_reader = None
+
+        # Optional jerk-limited shaping of RC commands, see enable_rc_shaping
+        self.rc_shaper = None
+        self.last_move_time = None
+        # Set from other threads when the drone was stopped without move()
+        self.rc_shaper_stale = False
+
         return
     
     def _setup_logging(self, debug_level):
@@ -99,6 +124,10 @@ class HeadsUpTello():
             },
         }
 
+        if not self.log_to_file:
+            del log_settings['handlers']['error_file_handler']
+            log_settings['loggers']['drone_logger']['handlers'] = ['debug_console_handler']
+
         logging.config.dictConfig(log_settings)
         self.logger = logging.getLogger('drone_logger')
 
@@ -111,6 +140,9 @@ class HeadsUpTello():
     def disconnect(self):
         """ Gracefully close the connection with the drone. """
         self.logger.info(f"{self.name} connection closed gracefully.")
+        if self.frame_reader:
+            self.frame_reader.stop()
+            self.frame_reader = None
         self.drone.end()
         self.connected = False
         return
@@ -147,14 +179,67 @@ class HeadsUpTello():
         self.logger.debug(f"Current barometer reading: {(self.drone.get_barometer() - self.initial_barometer)}cm")
         return (self.drone.get_barometer() - self.initial_barometer)
     
-    def streamon(self):
-        """ Turn on camera stream """
+    def altitude(self):
+        """
+        Return the drone's altitude above the takeoff point in cm, fused
+        from the barometer, ToF sensor and climb rate. Unlike get_baro()
+        this follows the barometer's drift with the weather.
+        """
+        estimator = self.altitude_estimator
+        if estimator.due():
+            estimator.update(self.drone.get_barometer() - self.initial_barometer,
+                             self.drone.get_distance_tof(), self.drone.get_speed_z())
+            self.logger.debug(f"Altitude: {estimator.summary()}")
+        return estimator.estimate()
+
+    def streamon(self, decode_process=False, **ring_options):
+        """
+        Turn on camera stream. With decode_process the video is decoded in
+        a separate process into shared memory instead of in a thread of
+        this one, so decoding doesn't slow down the control loop; see
+        frame_ring.SharedFrameRead for ring_options (slots, width, height).
+        """
         self.drone.streamon()
+        if decode_process:
+            self._start_frame_reader(**ring_options)
 
-    def get_frame_read(self):
-        """ Get current frame of camera feed """
+    def get_frame_read(self, decode_process=False):
+        """
+        Get current frame of camera feed. Returns the out-of-process reader
+        if streamon(decode_process=True) started one, or starts one now if
+        decode_process is given.
+        """
+        if decode_process:
+            self._start_frame_reader()
+        if self.frame_reader:
+            return self.frame_reader
         return self.drone.get_frame_read()
 
+    def _start_frame_reader(self, **ring_options):
+        if self.frame_reader:
+            return
+        # Simulated drones have no video stream to decode
+        if not hasattr(self.drone, 'get_udp_video_address'):
+            self.logger.warning("Out-of-process video needs a real video stream, decoding in process")
+            return
+        self.frame_reader = SharedFrameRead(self.drone.get_udp_video_address(), **ring_options)
+        self.logger.info("Decoding video in a separate process")
+
+    def set_video_resolution(self, resolution):
+        """ Set the camera resolution (Tello.RESOLUTION_480P or RESOLUTION_720P) """
+        self.logger.info(f"Setting video resolution: {resolution}")
+        self.drone.set_video_resolution(resolution)
+
+    def set_video_fps(self, fps):
+        """ Set the camera frame rate (Tello.FPS_5, FPS_15 or FPS_30) """
+        self.logger.info(f"Setting video fps: {fps}")
+        self.drone.set_video_fps(fps)
+
+    def set_video_bitrate(self, bitrate):
+        """ Set the video bitrate (Tello.BITRATE_AUTO or BITRATE_1MBPS..5MBPS) """
+        self.logger.info(f"Setting video bitrate: {bitrate}")
+        self.drone.set_video_bitrate(bitrate)
+
     def height(self):
         """ Prints height of drone """
         return self.drone.get_height()
@@ -233,13 +318,57 @@ class HeadsUpTello():
         self.logger.info("Drone is landing")
         self.drone.land()
         self.logger.info(f"{self.name} has landed.")
+        self.rc_shaper_stale = True
         return
-    
+
+    def emergency_land(self):
+        """
+        Lands without waiting for the reply, so it can be sent while another
+        command is still waiting on the drone. djitellopy hands replies to
+        whichever command pops them first from one unlocked list, so two
+        commands waiting at once can take each other's replies; the one
+        already waiting may get land's reply and return early instead.
+        """
+        self.logger.warning(f"{self.name} emergency landing")
+        self.drone.send_command_without_return('land')
+        self.rc_shaper_stale = True
+
+    def hover(self):
+        """
+        Stops RC flight where the drone is. Safe to call from another thread
+        (the failsafe's) while the loop is stuck: shaping restarts from rest
+        on the next move() rather than from the setpoint before the stop.
+        """
+        self.drone.send_rc_control(0, 0, 0, 0)
+        self.rc_shaper_stale = True
+
+    def enable_rc_shaping(self, **limits):
+        """
+        Smooth every command sent through move() with acceleration and jerk
+        limits and an expo curve. Accepts max_accel, max_jerk and expo for
+        all axes, or a dict of them per axis (left_right, forward_back,
+        up_down, yaw). See SetpointShaper.
+        """
+        self.rc_shaper = SetpointShaper(**limits)
+        self.last_move_time = None
+        self.logger.info(f"RC shaping enabled: {limits}")
+
     def move(self, x, y, z, w):
         """ RC controls - used for pygame interface """
         
         self.battery_check()
 
+        # Shape the setpoint at whatever rate move() is being called
+        if self.rc_shaper:
+            if self.rc_shaper_stale:
+                self.rc_shaper_stale = False
+                self.rc_shaper.reset()
+                self.last_move_time = None
+            now = self.time()
+            dt = now - self.last_move_time if self.last_move_time is not None else 0
+            self.last_move_time = now
+            x, y, z, w = self.rc_shaper.step((x, y, z, w), dt)
+
         self.logger.info("Drone is moving")
         self.drone.send_rc_control(x, y, z, w)
         self.update_coordinates(x, y)
@@ -249,8 +378,8 @@ class HeadsUpTello():
         self.battery_check()
 
         self.drone.set_speed(speed)
-        if self.ceiling - self.get_baro() <= 0:
-            difference = (self.drone.get_height() + distance) - self.ceiling
+        if self.altitude() + distance > self.ceiling:
+            difference = round(self.altitude() + distance - self.ceiling)
             self.logger.warning(f"Cannot fly above ceiling. Command is {difference}cm above ceiling.")
             return
         else:
@@ -262,8 +391,8 @@ class HeadsUpTello():
         self.battery_check()
 
         self.drone.set_speed(speed)
-        if self.floor - self.get_baro() >= 0:
-            difference = (self.drone.get_height() - distance) + self.floor
+        if self.altitude() - distance < self.floor:
+            difference = round(self.floor - (self.altitude() - distance))
             self.logger.warning(f"Cannot fly below floor. Command is {difference}cm below floor.")
             return
         else:
@@ -377,45 +506,64 @@ class HeadsUpTello():
         self.drone.flip(direction)
 
     # gpt helped with a lot of the math
-    def go_home(self, direct_flight=True, speed=20):
+    def go_home(self, direct_flight=True, speed=20, closed_loop=False):
         """ Returns the drone home """
         self.battery_check()
 
-        self.fly_to_coordinates(0, 0, direct_flight)
+        arrived = self.fly_to_coordinates(0, 0, direct_flight, closed_loop)
 
         # Rotate bearing back to original
         self.rotate_to_bearing(0)
 
-        self.x = 0
-        self.y = 0
+        # Closed loop already left x, y at the position it ended up at
+        if closed_loop and not arrived:
+            self.logger.warning(f"Didn't make it home, stopped at ({self.x:.0f}, {self.y:.0f})")
+            return
+        if not closed_loop:
+            self.x = 0
+            self.y = 0
         self.logger.info("Returned home.")
 
     def flyto_mission_ceiling(self, speed=20):
         """ Flies drone to mission ceiling"""
         self.battery_check()
 
-
-        diff = self.ceiling - self.get_baro()
-
-        time = diff//20
-
-        for i in range(int(time)+1):
-            self.drone.move_up(20)
-
-        self.logger.info(f"Reached ceiling: {self.get_baro}")
+        self.drone.set_speed(speed)
+        if self._change_altitude(self.ceiling, self.drone.move_up, self.drone.move_down, "ceiling"):
+            self.logger.info(f"Reached ceiling: {self.altitude():.0f}cm")
 
     def flyto_mission_floor(self, speed=20):
         """ Flies drone to mission floor"""
         self.battery_check()
 
-        diff = self.get_baro - self.floor
-
-        time = diff//20
-
-        for i in range(int(time)+1):
-            self.drone.move_down(20)
+        self.drone.set_speed(speed)
+        if self._change_altitude(self.floor, self.drone.move_up, self.drone.move_down, "floor"):
+            self.logger.info(f"Reached floor: {self.altitude():.0f}cm")
 
-        self.logger.info(f"Reached floor: {self.get_baro()}")
+    def _change_altitude(self, target, up, down, label):
+        """
+        Climbs or descends to within 20cm of target (shorter moves aren't
+        possible) in moves of at most MAX_LEG, re-measuring after each so the
+        last one doesn't overshoot. Gives up with a warning when a move was
+        refused or didn't get any closer, e.g. while the fused altitude isn't
+        converging, or after more moves than the distance needs. Returns True
+        if it got there.
+        """
+        difference = target - self.altitude()
+        attempts = int(abs(difference) // survey.MAX_LEG) + 3
+        while abs(difference) >= 20:
+            distance = int(min(abs(difference), survey.MAX_LEG))
+            if difference > 0:
+                up(distance)
+            else:
+                down(distance)
+            remaining = target - self.altitude()
+            attempts -= 1
+            if abs(remaining) >= abs(difference) or (attempts <= 0 and abs(remaining) >= 20):
+                self.logger.warning(f"Couldn't reach {label} {target}cm, {remaining:.0f}cm off")
+                return False
+            difference = remaining
+        return True
 
     def rotate_to_bearing(self, degrees):
         """ Rotates the drone to an absolute bearing (direction). """
@@ -438,10 +586,87 @@ class HeadsUpTello():
         self.rotation_angle = degrees
         self.logger.info(f"Rotated the bearing: {self.rotation_angle}")
 
-    def fly_to_coordinates(self, x, y, direct_flight=False):
-        """ Flies the drone to the coordinates (x, y). """
+    def fly_waypoints(self, waypoints, **options):
+        """
+        Flies through a list of (x, y) waypoints in one continuous motion
+        using closed-loop RC control on the drone's velocity and yaw
+        telemetry. Returns True if the dead-reckoned position settled
+        within tolerance of the last waypoint, which nothing confirms.
+        Options are passed on to WaypointController.
+        """
+        self.battery_check()
+
+        options.setdefault('clock', self.time)
+        options.setdefault('sleep', self.sleep)
+        controller = WaypointController(self, **options)
+        arrived = controller.fly(waypoints)
+        if arrived:
+            self.logger.info(f"Estimated arrival at waypoint ({self.x:.0f}, {self.y:.0f}) in "
+                             f"{controller.commands} commands (dead-reckoned, not confirmed)")
+        else:
+            self.logger.warning(f"Stopped short of waypoint at ({self.x:.0f}, {self.y:.0f})")
+        return arrived
+
+    def plan_survey(self, area, altitude, spacing, pattern='lawnmower', sortie_distance=None):
+        """
+        Plans an area-coverage flight over a polygon (see survey.rectangle)
+        with passes spacing cm apart at altitude cm. Pattern is 'lawnmower'
+        or 'spiral'. The route is split into sorties that each fit in
+        sortie_distance cm including the trip home; by default that is what
+        the current battery allows. Returns a SurveyPlan, or None if the
+        survey can't be flown within the mission bounds.
+        """
+        if altitude > self.ceiling or altitude < self.floor:
+            self.logger.warning(f"Survey altitude {altitude}cm is outside the mission floor/ceiling.")
+            return None
+
+        if sortie_distance is None:
+            sortie_distance = (self.get_battery() - self.min_op_battery) * self.cm_per_battery_percent
+            if sortie_distance <= 0:
+                self.logger.warning("Not enough battery to plan a survey sortie.")
+                return None
+
+        try:
+            plan = survey.plan_survey(area, altitude, spacing, pattern, sortie_distance,
+                                      home=tuple(self.home_coords))
+        except ValueError as excp:
+            # e.g. a sortie can't reach the far end of the area and get back
+            self.logger.warning(f"Can't plan survey: {excp}")
+            return None
+        self.logger.info(f"Planned survey: {plan.summary()}")
+        return plan
+
+    def fly_survey(self, plan, sortie=0, closed_loop=True):
+        """
+        Flies one sortie of a SurveyPlan: climbs or descends to the survey
+        altitude, flies the route and returns home. Swap batteries and call
+        again with the next sortie number to continue the survey.
+        """
         self.battery_check()
 
+        route = plan.sorties[sortie]
+        self._change_altitude(plan.altitude, self.fly_up, self.fly_down, "survey altitude")
+
+        self.logger.info(f"Flying survey sortie {sortie + 1} of {len(plan.sorties)}")
+        if closed_loop:
+            # Allow for flying at a slow 20cm/s plus time to settle
+            self.fly_waypoints(route, timeout=plan.length(sortie) / 20 + 30)
+        else:
+            for x, y in route:
+                self.fly_to_coordinates(x, y)
+
+        self.go_home(closed_loop=closed_loop)
+
+    def fly_to_coordinates(self, x, y, direct_flight=False, closed_loop=False):
+        """
+        Flies the drone to the coordinates (x, y). With closed_loop the
+        drone is steered there by telemetry feedback instead of fixed moves.
+        """
+        self.battery_check()
+
+        if closed_loop:
+            return self.fly_waypoints([(x, y)])
+
         self.drone.set_speed(50)
 
         delta_x = x - self.x
@@ -0,0 +1,263 @@
+import os
+import subprocess
+import sys
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+# Seconds PyAV waits for the stream to start, the same as djitellopy
+FRAME_GRAB_TIMEOUT = 5
+
+# Header fields (int64) at the start of the shared memory
+LATEST = 0      # sequence number of the newest complete frame, 0 before the first
+DECODED = 1     # frames written so far
+STOP = 2        # set by the reader to ask the decoder to exit
+STATUS = 3      # one of the STATUS_* values below
+SLOTS = 4
+SLOT_BYTES = 5
+HEADER_FIELDS = 8
+
+STATUS_STARTING = 0
+STATUS_RUNNING = 1
+STATUS_ENDED = 2
+STATUS_FAILED = 3
+
+# Per-slot metadata (int64): sequence number, height, width, decode time
+META_FIELDS = 4
+SEQ, HEIGHT, WIDTH, STAMP = range(META_FIELDS)
+
+# Pixel data starts on a cache line boundary
+ALIGN = 64
+
+
+def ring_size(slots, slot_bytes):
+    """ Bytes of shared memory needed for a ring """
+    return _pixel_offset(slots) + slots * slot_bytes
+
+
+def _pixel_offset(slots):
+    used = (HEADER_FIELDS + slots * META_FIELDS) * 8
+    return (used + ALIGN - 1) // ALIGN * ALIGN
+
+#---------------------------- BEGIN FrameRing CLASS ----------------------------
+
+class FrameRing():
+    """
+    NumPy views over a ring of frame slots in a shared memory buffer.
+
+    The decoder writes frame n into slot n % slots. While it writes, the
+    slot's sequence number is -1. After the pixels are in place it sets
+    the slot's sequence number, then LATEST. A reader that finds LATEST
+    in its slot can use the pixels in place until the decoder comes around
+    to that slot again, which valid() checks.
+    """
+
+    def __init__(self, buffer, slots=None, slot_bytes=None):
+        """
+        Attach to buffer. Pass slots and slot_bytes to lay out a new ring;
+        leave them out to use the layout already in the buffer.
+        """
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buffer)
+        if slots is not None:
+            self.header[:] = 0
+            self.header[SLOTS] = slots
+            self.header[SLOT_BYTES] = slot_bytes
+        self.slots = int(self.header[SLOTS])
+        self.slot_bytes = int(self.header[SLOT_BYTES])
+        self.meta = np.ndarray((self.slots, META_FIELDS), dtype=np.int64, buffer=buffer,
+                               offset=HEADER_FIELDS * 8)
+        if slots is not None:
+            self.meta[:] = 0
+        self.pixels = np.ndarray((self.slots, self.slot_bytes), dtype=np.uint8, buffer=buffer,
+                                 offset=_pixel_offset(self.slots))
+
+    def write(self, image, stamp_ns):
+        """ Copy an RGB image into the next slot and publish it. Returns its sequence number. """
+        size = image.nbytes
+        if size > self.slot_bytes:
+            raise ValueError(f"{image.shape} frame doesn't fit a {self.slot_bytes} byte slot")
+        seq = int(self.header[LATEST]) + 1
+        slot = seq % self.slots
+        self.meta[slot, SEQ] = -1
+        self.pixels[slot, :size].reshape(image.shape)[...] = image
+        self.meta[slot, HEIGHT] = image.shape[0]
+        self.meta[slot, WIDTH] = image.shape[1]
+        self.meta[slot, STAMP] = stamp_ns
+        self.meta[slot, SEQ] = seq
+        self.header[LATEST] = seq
+        self.header[DECODED] += 1
+        return seq
+
+    def view(self, seq):
+        """ (frame, stamp_ns) for frame seq without copying, or (None, None) if it's gone """
+        slot = seq % self.slots
+        height, width, stamp = (int(value) for value in self.meta[slot, HEIGHT:])
+        frame = self.pixels[slot, :height * width * 3].reshape(height, width, 3)
+        if self.meta[slot, SEQ] != seq:
+            return None, None
+        return frame, stamp
+
+    def valid(self, seq):
+        """ True while frame seq hasn't been overwritten """
+        return int(self.meta[seq % self.slots, SEQ]) == seq
+
+    def release(self):
+        """ Drop the views so the shared memory can be closed """
+        self.header = self.meta = self.pixels = None
+
+#----------------------------- END FrameRing CLASS -----------------------------
+
+#------------------------- BEGIN SharedFrameRead CLASS -------------------------
+
+class SharedFrameRead():
+    """
+    Drop-in for djitellopy's BackgroundFrameRead that decodes the video in
+    a separate process, so H.264 decoding doesn't compete for the GIL with
+    the ground station loop.
+
+    The decoder is started with subprocess on this file rather than with
+    multiprocessing, which would re-run the ground station script in the
+    child on Windows. Frames arrive in a shared memory FrameRing.
+
+    .frame is the newest frame as a read-only view into shared memory, and
+    the same object until a newer frame arrives, like BackgroundFrameRead.
+    seq and timestamp describe the frame .frame last returned. timestamp is
+    when the frame's packet was read off the stream, before decoding, in
+    time.perf_counter seconds (which is system-wide), so frame ages
+    measured from it include the decode. A view stays valid for about
+    slots frames; copy it, or check valid(seq), if it is kept longer.
+    """
+
+    def __init__(self, address, slots=8, width=960, height=720):
+        """
+        Arguments
+            address:       Video address, Tello.get_udp_video_address()
+            slots:         Frames in the ring
+            width, height: Largest frame the ring has to hold
+        """
+        slot_bytes = width * height * 3
+        self.shm = shared_memory.SharedMemory(create=True, size=ring_size(slots, slot_bytes))
+        self.ring = FrameRing(self.shm.buf, slots, slot_bytes)
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__),
+                                         self.shm.name, address])
+        self.seq = 0
+        self.timestamp = None
+        self._frame = None
+        self.frames_read = 0
+        self.frames_skipped = 0
+        self.final_decoded = 0
+        self.stopped = False
+
+    @property
+    def frame(self):
+        """ The newest decoded frame, None until the first one arrives """
+        if self.stopped:
+            return self._frame
+        seq = int(self.ring.header[LATEST])
+        if seq == self.seq:
+            return self._frame
+        frame, stamp = self.ring.view(seq)
+        if frame is None:
+            return self._frame
+        frame.flags.writeable = False
+        if self.seq:
+            self.frames_skipped += seq - self.seq - 1
+        self.frames_read += 1
+        self.seq = seq
+        self.timestamp = stamp / 1e9
+        self._frame = frame
+        return frame
+
+    def read(self):
+        """ (seq, timestamp, frame) of the newest frame, read together """
+        frame = self.frame
+        return self.seq, self.timestamp, frame
+
+    def valid(self, seq=None):
+        """ True while frame seq (the last one read by default) hasn't been overwritten """
+        if self.stopped:
+            return False
+        return self.ring.valid(self.seq if seq is None else seq)
+
+    def status(self):
+        if self.stopped:
+            return STATUS_ENDED
+        return int(self.ring.header[STATUS])
+
+    def decoded(self):
+        """ Frames the decoder has written """
+        return self.final_decoded if self.stopped else int(self.ring.header[DECODED])
+
+    def report(self):
+        return (f"decoded={self.decoded()} read={self.frames_read} "
+                f"skipped={self.frames_skipped} slots={self.ring.slots}")
+
+    def stop(self, timeout=2.0):
+        """ Stop the decoder and free the shared memory """
+        if self.stopped:
+            return
+        self.ring.header[STOP] = 1
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            # Still waiting on a stream that never started
+            self.process.kill()
+            self.process.wait()
+        self.final_decoded = int(self.ring.header[DECODED])
+        self.stopped = True
+        self._frame = None
+        self.ring.release()
+        try:
+            self.shm.close()
+        except BufferError:
+            # A consumer still holds a frame; the mapping goes when it does
+            pass
+        self.shm.unlink()
+
+#-------------------------- END SharedFrameRead CLASS --------------------------
+
+
+def _attach(name):
+    """ Open an existing shared memory block without taking ownership of it """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching registers the block for cleanup,
+        # which would unlink it when this process exits
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == 'posix':
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def decode_into_ring(name, address):
+    """ Decoder process: decode address with PyAV into the ring in shared memory name """
+    import av
+
+    shm = _attach(name)
+    ring = FrameRing(shm.buf)
+    parent = os.getppid()
+    try:
+        container = av.open(address, timeout=(FRAME_GRAB_TIMEOUT, None))
+        ring.header[STATUS] = STATUS_RUNNING
+        for packet in container.demux(video=0):
+            # Stop when asked to, or when the ground station has gone away
+            if ring.header[STOP] or os.getppid() != parent:
+                break
+            # Stamp frames with when their data arrived, not when decoding finished
+            received = time.perf_counter_ns()
+            for frame in packet.decode():
+                ring.write(frame.to_ndarray(format='rgb24'), received)
+        container.close()
+        ring.header[STATUS] = STATUS_ENDED
+    except Exception as excp:
+        ring.header[STATUS] = STATUS_FAILED
+        print(f"Video decoder failed: {excp}", file=sys.stderr)
+    finally:
+        ring.release()
+        shm.close()
+
+
+if __name__ == '__main__':
+    decode_into_ring(sys.argv[1], sys.argv[2])
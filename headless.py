@@ -0,0 +1,260 @@
+import json
+import collections
+import socket
+import threading
+import queue
+import time
+import pygame
+from stats import percentile, summarize
+
+# Key names used by input scripts, sockets and input logs mapped to the
+# pygame key codes the ground station loop reacts to.
+KEY_CODES = {
+    'w': pygame.K_w,
+    'a': pygame.K_a,
+    's': pygame.K_s,
+    'd': pygame.K_d,
+    'q': pygame.K_q,
+    'e': pygame.K_e,
+    'up': pygame.K_UP,
+    'down': pygame.K_DOWN,
+    'space': pygame.K_SPACE,
+    'shift': pygame.K_RSHIFT,
+    '1': pygame.K_1,
+    '2': pygame.K_2,
+    '3': pygame.K_3,
+    '4': pygame.K_4,
+    'x': pygame.K_x,
+    'escape': pygame.K_ESCAPE,
+}
+KEY_NAMES = {code: name for name, code in KEY_CODES.items()}
+
+
+def parse_command(line):
+    """
+    Turn one text command into a list of (event type, key code) pairs.
+
+    Accepted forms are "down <key>", "up <key>" and "tap <key>" (a press
+    immediately followed by a release). Blank lines and # comments return
+    an empty list.
+    """
+    line = line.split('#', 1)[0].strip()
+    if not line:
+        return []
+
+    action, name = line.split()
+    code = KEY_CODES[name.lower()]
+    if action == 'down':
+        return [(pygame.KEYDOWN, code)]
+    elif action == 'up':
+        return [(pygame.KEYUP, code)]
+    elif action == 'tap':
+        return [(pygame.KEYDOWN, code), (pygame.KEYUP, code)]
+    raise ValueError(f"Unknown input action: {action}")
+
+
+def make_events(pairs):
+    """ Build pygame key events from (event type, key code) pairs """
+    return [pygame.event.Event(kind, key=code) for kind, code in pairs]
+
+#-------------------------- BEGIN ScriptedInput CLASS --------------------------
+
+class ScriptedInput():
+    """
+    Plays back key presses from a text script on a schedule. Each line is
+    "<seconds> <down|up|tap> <key>", where seconds is measured from the
+    first call to poll(). Example:
+
+        0.0 tap shift     # takeoff
+        2.0 down w
+        4.5 up w
+    """
+
+    def __init__(self, path):
+        self.schedule = []
+        with open(path) as script:
+            for line in script:
+                body = line.split('#', 1)[0].strip()
+                if not body:
+                    continue
+                at, command = body.split(None, 1)
+                for pair in parse_command(command):
+                    self.schedule.append((float(at), pair))
+        self.schedule.sort(key=lambda item: item[0])
+        self.index = 0
+        self.start = None
+
+    def poll(self, now):
+        """ Return the pygame events that are due at time now """
+        if self.start is None:
+            self.start = now
+
+        due = []
+        while self.index < len(self.schedule) and \
+                self.schedule[self.index][0] <= now - self.start:
+            due.append(self.schedule[self.index][1])
+            self.index += 1
+        return make_events(due)
+
+    def finished(self):
+        """ True once every scripted event has been delivered """
+        return self.index >= len(self.schedule)
+
+#--------------------------- END ScriptedInput CLASS ---------------------------
+
+#-------------------------- BEGIN ReplayInput CLASS ----------------------------
+
+class ReplayInput(ScriptedInput):
+    """
+    Plays back an input log written by InputRecorder. The log is JSON lines
+    of {"t": seconds, "type": "down"|"up", "key": name}. Times count from
+    the first poll() unless start gives the poll time that t=0 maps to.
+    """
+
+    def __init__(self, path, speed=1.0, start=None):
+        self.schedule = []
+        with open(path) as log:
+            for line in log:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get('kind', 'input') != 'input':
+                    continue
+                kind = pygame.KEYDOWN if entry['type'] == 'down' else pygame.KEYUP
+                self.schedule.append((entry['t'] / speed, (kind, KEY_CODES[entry['key']])))
+        self.schedule.sort(key=lambda item: item[0])
+        self.index = 0
+        self.start = start
+
+#--------------------------- END ReplayInput CLASS -----------------------------
+
+#-------------------------- BEGIN SocketInput CLASS ----------------------------
+
+class SocketInput():
+    """
+    Accepts key commands over TCP, one command per line in the same form
+    as a script without the time column ("down w", "tap shift"). Commands
+    are applied on the next loop iteration after they arrive.
+    """
+
+    def __init__(self, port, host='127.0.0.1'):
+        self.pending = queue.Queue()
+        self.server = socket.create_server((host, port))
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        """ Accept clients one after another and queue their commands """
+        while True:
+            conn, _ = self.server.accept()
+            with conn, conn.makefile('r') as lines:
+                for line in lines:
+                    try:
+                        for pair in parse_command(line):
+                            self.pending.put(pair)
+                    except (KeyError, ValueError):
+                        conn.sendall(f"bad command: {line.strip()}\n".encode())
+
+    def poll(self, now):
+        """ Return every pygame event received since the last poll """
+        pairs = []
+        while not self.pending.empty():
+            pairs.append(self.pending.get_nowait())
+        return make_events(pairs)
+
+    def finished(self):
+        """ A socket never runs out of input """
+        return False
+
+#--------------------------- END SocketInput CLASS -----------------------------
+
+#------------------------- BEGIN InputRecorder CLASS ---------------------------
+
+class InputRecorder():
+    """ Writes key events to an input log that ReplayInput can play back. """
+
+    def __init__(self, path):
+        self.log = open(path, 'w')
+        self.start = None
+
+    def record(self, event, now):
+        """ Log a KEYDOWN/KEYUP event for a key the ground station knows """
+        if event.type not in (pygame.KEYDOWN, pygame.KEYUP):
+            return
+        if event.key not in KEY_NAMES:
+            return
+        if self.start is None:
+            self.start = now
+
+        entry = {
+            'kind': 'input',
+            't': round(now - self.start, 4),
+            'type': 'down' if event.type == pygame.KEYDOWN else 'up',
+            'key': KEY_NAMES[event.key],
+        }
+        self.log.write(json.dumps(entry) + '\n')
+
+    def close(self):
+        self.log.close()
+
+#-------------------------- END InputRecorder CLASS ----------------------------
+
+#--------------------------- BEGIN LoopTimer CLASS -----------------------------
+
+class LoopTimer():
+    """
+    Measures how long each pass of the ground station loop takes (work time)
+    and how far apart passes start (period), and summarizes both with
+    percentiles. Used for throughput and latency soak tests.
+    """
+
+    def __init__(self, window=1000, report_interval=10.0, clock=time.perf_counter):
+        self.window = window
+        self.report_interval = report_interval
+        self.clock = clock
+        self.work = collections.deque(maxlen=window)
+        self.periods = collections.deque(maxlen=window)
+        self.iterations = 0
+        self.overruns = 0
+        self.budget = None
+        self.started = None
+        self.last_start = None
+        self.last_report = None
+
+    def set_budget(self, fps):
+        """ Count iterations whose work takes longer than one frame at fps """
+        self.budget = 1.0 / fps if fps else None
+
+    def begin(self):
+        """ Mark the start of a loop iteration """
+        now = self.clock()
+        if self.started is None:
+            self.started = now
+            self.last_report = now
+        if self.last_start is not None:
+            self.periods.append(now - self.last_start)
+        self.last_start = now
+
+    def end(self):
+        """ Mark the end of the work portion of a loop iteration """
+        elapsed = self.clock() - self.last_start
+        self.work.append(elapsed)
+        self.iterations += 1
+        if self.budget is not None and elapsed > self.budget:
+            self.overruns += 1
+
+    def due(self):
+        """ True when report_interval seconds have passed since the last report """
+        if self.last_report is None or not self.report_interval:
+            return False
+        return self.clock() - self.last_report >= self.report_interval
+
+    def report(self):
+        """ Return a one-line summary of the recent loop timing """
+        self.last_report = self.clock()
+        runtime = self.last_report - self.started if self.started is not None else 0
+        rate = self.iterations / runtime if runtime > 0 else 0
+        return (f"loops={self.iterations} rate={rate:.1f}/s overruns={self.overruns} "
+                f"work[{summarize(self.work)}] period[{summarize(self.periods)}]")
+
+#---------------------------- END LoopTimer CLASS ------------------------------
@@ -0,0 +1,179 @@
+import collections
+import threading
+import time
+import numpy as np
+from stats import percentile
+
+# Timestamps each frame collects on its way to the screen, in order:
+#   decode  - the frame's data was read off the stream (out-of-process
+#             reader), or the camera thread first saw the decoded frame
+#   rotate  - the frame has been rotated for display
+#   queue   - the display loop has taken it off the frame queue
+#   surface - it has been turned into a pygame surface
+#   flip    - the display has been updated with it
+STAGES = ('decode', 'rotate', 'queue', 'surface', 'flip')
+
+# Layout of the timestamp a synthetic frame carries in a band across the
+# middle of its left edge, clear of the HUD text drawn over the video:
+# two guard blocks (white, black) then TIMESTAMP_BITS blocks, most
+# significant bit first. Blocks are big and pure black/white so the code
+# survives H.264 when the synthetic stream comes from a simulator.
+BLOCK = 16
+TIMESTAMP_BITS = 32
+GUARD = (1, 0)
+
+
+def new_timeline(decoded_at=None):
+    """
+    Start a frame's timeline with its decode stamp: decoded_at if the frame
+    reader knows when the frame's data arrived (time.perf_counter), else now
+    """
+    return {'decode': time.perf_counter() if decoded_at is None else decoded_at}
+
+
+def stamp(timeline, stage):
+    """ Record that a frame reached a stage """
+    timeline[stage] = time.perf_counter()
+
+
+def wall_clock_ms():
+    """ Wall clock milliseconds as carried in a synthetic frame """
+    return int(time.time() * 1000) & ((1 << TIMESTAMP_BITS) - 1)
+
+
+def encode_timestamp(frame, ms):
+    """ Paint a millisecond timestamp into an RGB frame """
+    top = frame.shape[0] // 2 - BLOCK // 2
+    bits = list(GUARD) + [(ms >> shift) & 1 for shift in range(TIMESTAMP_BITS - 1, -1, -1)]
+    for index, bit in enumerate(bits):
+        frame[top:top + BLOCK, index * BLOCK:(index + 1) * BLOCK] = 255 if bit else 0
+    return frame
+
+
+def decode_timestamp(frame):
+    """
+    Read the timestamp painted by encode_timestamp from a frame in its
+    original orientation (rows, columns). Returns None if the frame
+    doesn't carry one.
+    """
+    count = len(GUARD) + TIMESTAMP_BITS
+    if frame.shape[0] < BLOCK or frame.shape[1] < count * BLOCK:
+        return None
+    # Sample the middle of every block
+    centers = frame[frame.shape[0] // 2, BLOCK // 2:count * BLOCK:BLOCK]
+    bits = (centers.mean(axis=-1) > 127).astype(np.int64)
+    if tuple(bits[:len(GUARD)]) != GUARD:
+        return None
+    value = 0
+    for bit in bits[len(GUARD):]:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def displayed_frame(pixels):
+    """
+    Undo the display transform on a pygame pixel array (x, y) of the video
+    area so it can be read like the original frame (rows, columns). The
+    camera thread rotates frames 90 degrees counterclockwise and
+    surfarray treats the first axis as x, so original row r, column c is
+    shown at x = width - 1 - c, y = r. This is a view, nothing is copied.
+    """
+    return pixels[::-1, :, :].transpose(1, 0, 2)
+
+#------------------------ BEGIN SyntheticFrameRead CLASS -----------------------
+
+class SyntheticFrameRead():
+    """
+    Stands in for djitellopy's BackgroundFrameRead with generated frames
+    that carry their own wall clock timestamp, for calibrated end-to-end
+    latency tests. A simulator can paint the same code into the video it
+    streams with encode_timestamp so the real decode path is measured too.
+    """
+
+    def __init__(self, width=960, height=720, fps=30):
+        self.period = 1.0 / fps
+        # A gradient background so the frame looks like something
+        ramp = np.linspace(40, 200, width, dtype=np.uint8)
+        self.background = np.zeros((height, width, 3), dtype=np.uint8)
+        self.background[:, :, 1] = ramp
+        self.background[:, :, 2] = ramp[::-1]
+        self.frame = None
+        self.stopped = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        next_frame = time.perf_counter()
+        while not self.stopped:
+            frame = self.background.copy()
+            self.frame = encode_timestamp(frame, wall_clock_ms())
+            next_frame += self.period
+            time.sleep(max(0.0, next_frame - time.perf_counter()))
+
+    def stop(self):
+        self.stopped = True
+
+#------------------------- END SyntheticFrameRead CLASS ------------------------
+
+#------------------------- BEGIN LatencyRecorder CLASS -------------------------
+
+class LatencyRecorder():
+    """
+    Gathers frame timelines from the ground station and reports how long
+    frames spend in each stage, decode-to-flip latency and, for frames that
+    carry a timestamp, true end-to-end latency from the moment the frame
+    was generated to the moment it was on screen.
+    """
+
+    def __init__(self, window=5000):
+        self.stages = {stage: collections.deque(maxlen=window) for stage in STAGES[1:]}
+        self.pipeline = collections.deque(maxlen=window)
+        self.end_to_end = collections.deque(maxlen=window)
+        self.before_decode = collections.deque(maxlen=window)
+        self.frames = 0
+
+    def record(self, timeline, flipped_wall_ms=None, encoded_ms=None):
+        """
+        Add one displayed frame.
+
+        Arguments
+            timeline:        The frame's stage timestamps
+            flipped_wall_ms: wall_clock_ms() right after the flip
+            encoded_ms:      Timestamp decoded from the frame, if any
+        """
+        if any(stage not in timeline for stage in STAGES):
+            return
+        self.frames += 1
+        for previous, stage in zip(STAGES, STAGES[1:]):
+            self.stages[stage].append(timeline[stage] - timeline[previous])
+        self.pipeline.append(timeline['flip'] - timeline['decode'])
+
+        if encoded_ms is not None and flipped_wall_ms is not None:
+            modulus = 1 << TIMESTAMP_BITS
+            difference = (flipped_wall_ms - encoded_ms) % modulus
+            if difference > modulus // 2:
+                difference -= modulus
+            total = difference / 1000
+            self.end_to_end.append(total)
+            # Everything before our pipeline: encode, network, decode
+            self.before_decode.append(total - (timeline['flip'] - timeline['decode']))
+
+    def report(self):
+        """ Return a multi-line latency breakdown in milliseconds """
+        lines = [f"frames={self.frames}"]
+        for stage, samples in self.stages.items():
+            lines.append(f"  {stage:<8} {self._summary(samples)}")
+        lines.append(f"  {'pipeline':<8} {self._summary(self.pipeline)}  (decode -> flip)")
+        if self.end_to_end:
+            lines.append(f"  {'upstream':<8} {self._summary(self.before_decode)}  (generated -> decode)")
+            lines.append(f"  {'total':<8} {self._summary(self.end_to_end)}  (generated -> on screen)")
+        return "\n".join(lines)
+
+    def _summary(self, samples):
+        ordered = sorted(samples)
+        if not ordered:
+            return "no samples"
+        return " ".join(f"p{int(fraction * 100)}={percentile(ordered, fraction) * 1000:.1f}"
+                        for fraction in (0.5, 0.9, 0.99)) + f" max={ordered[-1] * 1000:.1f}"
+
+#-------------------------- END LatencyRecorder CLASS --------------------------
@@ -1,10 +1,77 @@
+import argparse
+import collections
+import os
+import time
 import pygame
 from djitellopy import Tello
 from flightcontroller import HeadsUpTello
+import headless
+from video_relay import VideoRelay
+from video_quality import VideoStats, AdaptiveVideoQuality
+import latency_probe
+from sparkline import Sparkline
+from command_executor import CommandExecutor, FLIGHT, EMERGENCY
+from failsafe import FailsafeSupervisor
+from flight_recorder import SessionRecorder, RecordingTello, ReplayTello
+from simulator import SimulatedTello, RealTimeClock, compare_shaping, shaping_report
 import threading
 import queue
 import cv2
 
+# Command line options - with no options the ground station runs on the
+# desktop with the keyboard like it always has
+parser = argparse.ArgumentParser(description="Heads-Up Flight ground station")
+parser.add_argument('--headless', action='store_true',
+                    help="use SDL's dummy video driver instead of a real window")
+parser.add_argument('--no-render', action='store_true',
+                    help="skip the HUD text, graphs, overlay and display updates (frames are still converted to surfaces)")
+parser.add_argument('--script', help="scripted input file: '<seconds> <down|up|tap> <key>' per line")
+parser.add_argument('--input-port', type=int, help="accept 'down w'/'up w'/'tap shift' commands over TCP")
+parser.add_argument('--replay-input', help="replay an input log written with --record-input")
+parser.add_argument('--record-input', help="write every key event to an input log")
+parser.add_argument('--record-session',
+                    help="log input, telemetry, drone commands, frame and loop timing for replay")
+parser.add_argument('--replay-session', help="fly a recorded session against a fake drone instead of the real one")
+parser.add_argument('--replay-speed', type=float, default=1.0, help="speed up a replayed session, 10 is 10x")
+parser.add_argument('--deterministic', action='store_true',
+                    help="replay one recorded loop iteration per loop, as fast as possible")
+parser.add_argument('--drone-host', default='192.168.10.1', help="drone or simulator address")
+parser.add_argument('--simulator', action='store_true',
+                    help="fly a simulated drone in real time instead of the real one (synthetic video)")
+parser.add_argument('--duration', type=float, help="stop after this many seconds")
+parser.add_argument('--fps', type=int, default=30, help="loop rate cap, 0 runs as fast as possible")
+parser.add_argument('--timing-interval', type=float, default=10.0,
+                    help="seconds between loop timing reports, 0 only reports at exit")
+parser.add_argument('--rc-shaping', action='store_true', help="smooth RC commands with acceleration/jerk limits")
+parser.add_argument('--shape-accel', type=float, default=250, help="RC shaping acceleration limit (RC units/s)")
+parser.add_argument('--shape-jerk', type=float, default=1500, help="RC shaping jerk limit (RC units/s^2)")
+parser.add_argument('--shape-expo', type=float, default=0.3, help="RC shaping expo curve, 0 is linear")
+parser.add_argument('--adaptive-video', action='store_true',
+                    help="lower/raise video resolution, fps and bitrate to keep frame age under a target "
+                         "(decodes out of process, which timestamps frames on arrival)")
+parser.add_argument('--target-latency', type=float, default=150, help="adaptive video frame age target in ms")
+parser.add_argument('--latency-probe', action='store_true',
+                    help="time every frame through decode, rotate, queue, surface and flip")
+parser.add_argument('--synthetic-video', action='store_true',
+                    help="show generated timestamped frames instead of the drone camera (calibrated latency test)")
+parser.add_argument('--decode-process', action='store_true',
+                    help="decode video in a separate process into shared memory")
+parser.add_argument('--relay-port', type=int, help="share the video feed on localhost (MJPEG and WebSocket)")
+parser.add_argument('--relay-width', type=int, default=640, help="width of the relayed video")
+parser.add_argument('--relay-quality', type=int, default=70, help="JPEG quality of the relayed video")
+parser.add_argument('--graph-seconds', type=float, default=30, help="seconds of telemetry shown in the HUD graphs")
+parser.add_argument('--failsafe-hover', type=float, default=0.5,
+                    help="hover when the loop sends no RC command for this many seconds")
+parser.add_argument('--failsafe-land', type=float, default=3.0,
+                    help="land when the loop sends no RC command for this many seconds")
+parser.add_argument('--no-failsafe', action='store_true', help="don't watch the loop for stalls")
+parser.add_argument('--no-graphs', action='store_true', help="hide the HUD telemetry graphs")
+args = parser.parse_args()
+
+if args.headless or args.no_render:
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
 # Initialize Pygame
 SCREEN_WIDTH = 960
 SCREEN_HEIGHT = 720
@@ -24,9 +91,12 @@ background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
 background.fill(background_color)
 
 # Initialize our opening screen logo
-logo_surface = pygame.image.load('logo.jpg')
-logo_rect = logo_surface.get_rect()
-logo_rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+# (nothing to show when not rendering, and the logo may not be there)
+logo_surface = None
+if not args.no_render and os.path.exists('logo.jpg'):
+    logo_surface = pygame.image.load('logo.jpg')
+    logo_rect = logo_surface.get_rect()
+    logo_rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
 show_logo = True
 
 # Initialize if there has been takeoff
@@ -38,12 +108,6 @@ yv = 0
 zv = 0
 wv = 0
 
-# Flag to track if a flip is in progress
-flip_in_progress = False
-
-# Flag to track if landing or takeoff is in progress
-t_in_progress = False
-
 mission_params = {
     'mission': 'Drone Race',
     'name': 'hawk',
@@ -53,50 +117,107 @@ mission_params = {
     'floor': -10000,
 }
 
-# Connect to drone
-tello = Tello()
+# Connect to drone, a recorded session or the simulator
+session_recorder = SessionRecorder(args.record_session) if args.record_session else None
+replay_drone = None
+if args.replay_session:
+    replay_drone = ReplayTello(args.replay_session, args.replay_speed, args.deterministic)
+    tello = replay_drone
+elif args.simulator:
+    tello = SimulatedTello(clock=RealTimeClock())
+else:
+    tello = Tello(host=args.drone_host)
+if session_recorder:
+    tello = RecordingTello(tello, session_recorder)
 hawk = HeadsUpTello(mission_params, tello)
 hawk.battery_check()
-
-# Get drone's video stream
-hawk.streamon()
+if args.rc_shaping:
+    hawk.enable_rc_shaping(max_accel=args.shape_accel, max_jerk=args.shape_jerk, expo=args.shape_expo)
+
+# Get drone's video stream. Adaptive video needs the out-of-process
+# decoder's arrival timestamps to see how old frames really are.
+hawk.streamon(decode_process=args.decode_process or args.adaptive_video)
+
+# Takeoff, land, flips and video settings wait for the drone to answer, so
+# they run on the command executor and the game loop never blocks on them
+executor = CommandExecutor(hawk.logger, clock=replay_drone.clock.time if replay_drone else time.perf_counter)
+if replay_drone and args.deterministic:
+    # Let commands catch up with each recorded loop iteration before the next
+    replay_drone.clock.settled_checks.append(lambda: executor.settled(replay_drone.clock.sleeping))
+
+# Optional relay so more viewers can watch without decoding the stream again
+relay = None
+if args.relay_port:
+    relay = VideoRelay(args.relay_port, args.relay_width, args.relay_quality, logger=hawk.logger)
+    relay.start()
+
+# Frame age, processing time and drops for the adaptive video controller
+video_stats = VideoStats()
+video_quality = None
+if args.adaptive_video:
+    video_quality = AdaptiveVideoQuality(hawk, video_stats, executor, target_age=args.target_latency / 1000)
+
+# Per-stage frame latency measurement
+latency_recorder = latency_probe.LatencyRecorder() if args.latency_probe else None
+synthetic_video = latency_probe.SyntheticFrameRead() if args.synthetic_video else None
 
 def camera_thread():
     """ Thread function to continuously update the camera frame """
+    last_frame = None
     while True:
-        frame = hawk.get_frame_read().frame
-        if frame is not None:
-            # Rotate frame to match display
-            frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
-            # Put the frame in the queue (overwrite old frame if queue is full)
-            if frame_queue.full():
-                frame_queue.get()
-            frame_queue.put(frame)
-
-def perform_flip(direction):
-    """ Perform a flip """
-    global flip_in_progress
-    if not flip_in_progress:
-        flip_in_progress = True
-        hawk.flip(direction)
-        flip_in_progress = False
-
-# Landing and takeoff separate because of t variable
-def takeoff():
-    """ Perform takeoff """
-    global t_in_progress
-    if not t_in_progress:
-        t_in_progress = True
-        hawk.takeoff()
-        t_in_progress = False
-
-def land():
-    """ Perform landing """
-    global t_in_progress
-    if not t_in_progress:
-        t_in_progress = True
-        hawk.land()
-        t_in_progress = False
+        reader = synthetic_video or hawk.get_frame_read()
+        frame = reader.frame
+        # Only handle frames we haven't seen yet
+        if frame is None or frame is last_frame:
+            time.sleep(0.002)
+            continue
+        last_frame = frame
+        seen = time.perf_counter()
+        # The out-of-process reader knows when the frame's data arrived, so
+        # its age includes the decode
+        timeline = latency_probe.new_timeline(getattr(reader, 'timestamp', None))
+        # The out-of-process reader hands out views into its frame ring,
+        # which the decoder overwrites a few frames later. The relay keeps
+        # frames longer than that, so it gets a copy of the decoded frame
+        # (from before the display-only rotation); nothing else does.
+        shared = None
+        if relay:
+            shared = frame.copy() if hasattr(reader, 'valid') else frame
+        # Rotate frame to match display, which reads the view straight into
+        # a new array
+        frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        if hasattr(reader, 'valid') and not reader.valid():
+            # The decoder got to the slot while it was being read
+            continue
+        latency_probe.stamp(timeline, 'rotate')
+        video_stats.frame_arrived()
+        video_stats.frame_processed(timeline['rotate'] - seen)
+        if shared is not None:
+            relay.publish(shared)
+
+        # Put the frame in the queue (overwrite old frame if queue is full)
+        try:
+            frame_queue.get_nowait()
+            video_stats.frame_dropped()
+        except queue.Empty:
+            pass
+        frame_queue.put((frame, timeline))
+
+# Flip keys and the direction they flip
+FLIP_KEYS = {pygame.K_1: 'f', pygame.K_2: 'b', pygame.K_3: 'r', pygame.K_4: 'l'}
+
+# The executor reports finished actions from its worker threads, so they
+# are passed back here and the loop acts on them
+finished_actions = queue.Queue()
+
+# Hover, then land, if the loop stops sending RC commands while flying
+failsafe = None
+if not args.no_failsafe:
+    failsafe = FailsafeSupervisor(
+        hawk.drone,
+        land=lambda: executor.emergency('failsafe land', hawk.emergency_land, on_done=finished_actions.put),
+        hover=hawk.hover,
+        hover_after=args.failsafe_hover, land_after=args.failsafe_land, logger=hawk.logger)
 
 # Shared queue for camera frames
 frame_queue = queue.Queue(maxsize=1)  # Limit queue size to avoid lag
@@ -108,65 +229,21 @@ camera_thread.start()
 # Load keyboard overlay images
 KEY_SIZE = (50, 50)
 
-# Define key images with both default and pressed states
-key_images = {
-    'w': {
-        'default': pygame.transform.scale(pygame.image.load('Keys\\w_w.png').convert_alpha(), KEY_SIZE),
-        'pressed': pygame.transform.scale(pygame.image.load('Keys\\w_b.png').convert_alpha(), KEY_SIZE),
-    },
-    'a': {
-        'default': pygame.transform.scale(pygame.image.load('Keys\\a_w.png').convert_alpha(), KEY_SIZE),
-        'pressed': pygame.transform.scale(pygame.image.load('Keys\\a_b.png').convert_alpha(), KEY_SIZE),
-    },
-    's': {
-        'default': pygame.transform.scale(pygame.image.load('Keys\\s_w.png').convert_alpha(), KEY_SIZE),
-        'pressed': pygame.transform.scale(pygame.image.load('Keys\\s_b.png').convert_alpha(), KEY_SIZE),
-    },
-    'd': {
-        'default': pygame.transform.scale(pygame.image.load('Keys\\d_w.png').convert_alpha(), KEY_SIZE),
-        'pressed': pygame.transform.scale(pygame.image.load('Keys\\d_b.png').convert_alpha(), KEY_SIZE),
-    },
-    'q': {
-        'default': pygame.transform.scale(pygame.image.load('Keys\\q_w.png').convert_alpha(), KEY_SIZE),
-        'pressed': pygame.transform.scale(pygame.image.load('Keys\\q_b.png').convert_alpha(), KEY_SIZE),
-    },
-    'e': {
-        'default': pygame.transform.scale(pygame.image.load('Keys\\e_w.png').convert_alpha(), KEY_SIZE),
-        'pressed': pygame.transform.scale(pygame.image.load('Keys\\e_b.png').convert_alpha(), KEY_SIZE),
-    },
-    'up': {
-        'default': pygame.transform.scale(pygame.image.load('Keys\\up_w.png').convert_alpha(), KEY_SIZE),
-        'pressed': pygame.transform.scale(pygame.image.load('Keys\\up_b.png').convert_alpha(), KEY_SIZE),
-    },
-    'down': {
-        'default': pygame.transform.scale(pygame.image.load('Keys\\down_w.png').convert_alpha(), KEY_SIZE),
-        'pressed': pygame.transform.scale(pygame.image.load('Keys\\down_b.png').convert_alpha(), KEY_SIZE),
-    },
-    'space': {
-        'default': pygame.transform.scale(pygame.image.load('Keys\\space_w.png').convert_alpha(), KEY_SIZE),
-        'pressed': pygame.transform.scale(pygame.image.load('Keys\\space_b.png').convert_alpha(), KEY_SIZE),
-    },
-    'shift': {
-        'default': pygame.transform.scale(pygame.image.load('Keys\\shift_w.png').convert_alpha(), KEY_SIZE),
-        'pressed': pygame.transform.scale(pygame.image.load('Keys\\shift_b.png').convert_alpha(), KEY_SIZE),
-    },
-    '1': {
-        'default': pygame.transform.scale(pygame.image.load('Keys\\1_w.png').convert_alpha(), KEY_SIZE),
-        'pressed': pygame.transform.scale(pygame.image.load('Keys\\1_b.png').convert_alpha(), KEY_SIZE),
-    },
-    '2': {
-        'default': pygame.transform.scale(pygame.image.load('Keys\\2_w.png').convert_alpha(), KEY_SIZE),
-        'pressed': pygame.transform.scale(pygame.image.load('Keys\\2_b.png').convert_alpha(), KEY_SIZE),
-    },
-    '3': {
-        'default': pygame.transform.scale(pygame.image.load('Keys\\3_w.png').convert_alpha(), KEY_SIZE),
-        'pressed': pygame.transform.scale(pygame.image.load('Keys\\3_b.png').convert_alpha(), KEY_SIZE),
-    },
-    '4': {
-        'default': pygame.transform.scale(pygame.image.load('Keys\\4_w.png').convert_alpha(), KEY_SIZE),
-        'pressed': pygame.transform.scale(pygame.image.load('Keys\\4_b.png').convert_alpha(), KEY_SIZE),
-    },
-}
+# Keys on the overlay; Keys/<key>_w.png is the default image and
+# Keys/<key>_b.png the pressed one
+OVERLAY_KEYS = ['w', 'a', 's', 'd', 'q', 'e', 'up', 'down', 'space', 'shift', '1', '2', '3', '4']
+
+def load_key_image(key, color):
+    return pygame.transform.scale(pygame.image.load(os.path.join('Keys', f'{key}_{color}.png')).convert_alpha(), KEY_SIZE)
+
+# Define key images with both default and pressed states, only loaded
+# when there is a screen to draw them on
+key_images = {}
+if not args.no_render:
+    key_images = {
+        key: {'default': load_key_image(key, 'w'), 'pressed': load_key_image(key, 'b')}
+        for key in OVERLAY_KEYS
+    }
 
 # Define positions for the keys (adjust as needed)
 key_positions = {
@@ -190,7 +267,7 @@ key_positions = {
 pressed_keys = set()
 
 # Initialize a dictionary to track the key states (default or pressed)
-key_states = {key: 'default' for key in key_images}
+key_states = {key: 'default' for key in OVERLAY_KEYS}
 
 # Key presses
 W = False
@@ -202,11 +279,90 @@ PD = False
 Q = False
 E = False
 
+# Keys currently held down - built from KEYDOWN/KEYUP events rather than
+# pygame.key.get_pressed() so scripted and socket input drive it too
+keys = collections.defaultdict(bool)
+
+# Scripted/socket/replayed input sources for headless runs
+input_sources = []
+if args.script:
+    input_sources.append(headless.ScriptedInput(args.script))
+if args.replay_input:
+    input_sources.append(headless.ReplayInput(args.replay_input))
+replay_input = None
+if replay_drone:
+    # Replayed key events are timed on the session clock like everything else
+    replay_input = headless.ReplayInput(args.replay_session, start=0.0)
+if args.input_port:
+    input_sources.append(headless.SocketInput(args.input_port))
+input_recorder = headless.InputRecorder(args.record_input) if args.record_input else None
+
+loop_timer = headless.LoopTimer(report_interval=args.timing_interval)
+loop_timer.set_budget(args.fps)
+# Keep roughly the recorded number of loops per recorded second
+loop_fps = args.fps
+if replay_drone:
+    loop_fps = 0 if args.deterministic else args.fps * args.replay_speed
+# The loop runs on the replay's session clock when replaying, so
+# --duration and scripted input follow the recording
+loop_clock = replay_drone.clock.time if replay_drone else time.perf_counter
+start_time = loop_clock()
+
+# Telemetry graphs under the HUD readings: battery and temperature on the
+# left, height and barometer on the right
+GRAPH_SIZE = (160, 36)
+graphs = {}
+if not args.no_graphs:
+    graphs = {
+        'battery': (Sparkline(*GRAPH_SIZE, seconds=args.graph_seconds, low=0, high=100), (0, 55)),
+        'temperature': (Sparkline(*GRAPH_SIZE, seconds=args.graph_seconds, min_span=4), (0, 95)),
+        'height': (Sparkline(*GRAPH_SIZE, seconds=args.graph_seconds, min_span=20), (SCREEN_WIDTH - GRAPH_SIZE[0], 105)),
+        'baro': (Sparkline(*GRAPH_SIZE, seconds=args.graph_seconds, min_span=20), (SCREEN_WIDTH - GRAPH_SIZE[0], 145)),
+    }
+graph_times = collections.deque(maxlen=5000)
+
 # Run the game loop
 running = True
 while running:
+    # Stop at the end of the recording, without an iteration it didn't have
+    if replay_drone and not replay_drone.clock.advance():
+        break
+    loop_timer.begin()
+    loop_started = session_recorder.now() if session_recorder else None
+    now = loop_clock()
+
+    # Feed scripted input into the event queue as if it came from the keyboard
+    for source in input_sources:
+        for event in source.poll(now):
+            pygame.event.post(event)
+    if replay_input:
+        for event in replay_input.poll(replay_drone.clock.iteration_end()):
+            pygame.event.post(event)
+
+    if args.duration is not None and now - start_time >= args.duration:
+        running = False
+
+    # A takeoff that failed can be tried again, and after a failsafe
+    # landing shift takes off again
+    while not finished_actions.empty():
+        action = finished_actions.get_nowait()
+        if action.name == 'takeoff' and action.error:
+            t = False
+        elif action.name == 'failsafe land' and not action.error:
+            t = False
+
     # Cycle through all of the current events
     for event in pygame.event.get():
+        if input_recorder:
+            input_recorder.record(event, now)
+        if session_recorder:
+            session_recorder.record(event)
+
+        if event.type == pygame.KEYDOWN:
+            keys[event.key] = True
+        elif event.type == pygame.KEYUP:
+            keys[event.key] = False
+
         # User clicked the X to close program
         if event.type == pygame.QUIT:
             running = False
@@ -218,6 +374,23 @@ while running:
             if event.key == pygame.K_ESCAPE:
                 running = False
 
+            # Drone commands fire once per key press, not every frame it's held
+            if event.key == pygame.K_RSHIFT:
+                if not t:
+                    if executor.submit('takeoff', hawk.takeoff, lane=FLIGHT, on_done=finished_actions.put):
+                        t = True
+                else:
+                    # Flips still waiting would run on the ground
+                    executor.cancel()
+                    if executor.submit('land', hawk.land, lane=FLIGHT):
+                        t = False
+            elif event.key == pygame.K_x:
+                # Emergency land: jumps the queue and cancels anything waiting
+                executor.emergency('emergency land', hawk.emergency_land)
+                t = False
+            elif event.key in FLIP_KEYS and t:
+                executor.submit(f'flip {FLIP_KEYS[event.key]}', hawk.flip, FLIP_KEYS[event.key])
+
         # Mark the key as pressed when it's pressed down
             if event.key == pygame.K_w:
                 pressed_keys.add('w')
@@ -307,54 +480,29 @@ while running:
                 pressed_keys.discard('4')
                 key_states['4'] = 'default'
 
-    # Update the key images based on the current key states
-    for key in key_images:
-        if key_states[key] == 'pressed':
-            key_images[key] = pygame.transform.scale(pygame.image.load(f'Keys\\{key}_b.png').convert_alpha(), KEY_SIZE)
-        else:
-            key_images[key] = pygame.transform.scale(pygame.image.load(f'Keys\\{key}_w.png').convert_alpha(), KEY_SIZE)
-
-    # Capture all of the simultaneously pressed keys
-    keys = pygame.key.get_pressed()
-
-    # Takeoff / land
-    if t == False:
-        if keys[pygame.K_RSHIFT]:
-            threading.Thread(target=takeoff()).start()
-            t = True
-    else:
-        if keys[pygame.K_RSHIFT]:
-            threading.Thread(target=land()).start()
-            t = False
-
-    if t == True:
-
-        # flips
-        if keys[pygame.K_1]:
-            threading.Thread(target=perform_flip, args=("f",)).start()
-        elif keys[pygame.K_2]:
-            threading.Thread(target=perform_flip, args=("b",)).start()
-        elif keys[pygame.K_3]:
-            threading.Thread(target=perform_flip, args=("r",)).start()
-        elif keys[pygame.K_4]:
-            threading.Thread(target=perform_flip, args=("l",)).start()
+    # No RC while taking off or landing, the drone is busy with that
+    if t == True and not executor.busy(FLIGHT, EMERGENCY):
 
-        # Up down
+        # Up down, kept 20cm inside the limits using the fused altitude
+        altitude = hawk.altitude()
         if keys[pygame.K_UP] and keys[pygame.K_DOWN]:
             PU = True
             PD = True
             zv = 0
         elif keys[pygame.K_UP]:
-            if hawk.ceiling - (hawk.get_baro() + 20) >= 0:  # ceiling
+            if hawk.ceiling - (altitude + 20) >= 0:  # ceiling
                 PU = True
                 zv = 100
             else:
+                # At a limit: stop, rather than keep the last climb or descent
+                zv = 0
                 print("Uh oh")  # needed this else
         elif keys[pygame.K_DOWN]:
-            if hawk.floor - (hawk.get_baro() + 20) <= 0:  # floor
+            if altitude - 20 >= hawk.floor:  # floor
                 PD = True
                 zv = -100
             else:
+                zv = 0
                 print("Uh oh")  # needed this else
         else:
             PU = False
@@ -412,75 +560,158 @@ while running:
         # Make nicer
         try:
             hawk.move(xv, yv, zv, wv)
+            if failsafe:
+                failsafe.heartbeat()
         except:
             print("Unable to move")
+    elif failsafe:
+        failsafe.disarm()
 
     # Place surfaces on the screen but don't display them (order matters)
     screen.blit(background, (0, 0))
+    frame_timeline = None
 
-    if show_logo:
+    if show_logo and logo_surface:
         screen.blit(logo_surface, logo_rect)
     else:
         # Get the latest frame from the queue
         if not frame_queue.empty():
-            frame = frame_queue.get()
+            frame, frame_timeline = frame_queue.get()
+            latency_probe.stamp(frame_timeline, 'queue')
             # Convert the frame to a Pygame surface
             webcam_surface = pygame.surfarray.make_surface(frame)
+            latency_probe.stamp(frame_timeline, 'surface')
             webcam_rect = webcam_surface.get_rect()
             webcam_rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
             screen.blit(webcam_surface, webcam_rect)
 
-    # Coords and degrees
-    x, y = hawk.coords()
-    coords = f"Rotation = {round(hawk.yaw())}°"
-    coords_surface = font.render(coords, True, COLOR_GREEN)
-    coords_rect = coords_surface.get_rect()
-    coords_rect.topright = (960, 0)
-    screen.blit(coords_surface, coords_rect)
-
-    # Height
+    # HUD readings, still read with --no-render so the loop does the same
+    # telemetry work, just without rendering the text
+    heading = hawk.yaw()
     height = hawk.height()
-    h = f"Height = {round(height, 2)}cm"
-    hs = font.render(h, True, COLOR_GREEN)
-    hr = hs.get_rect()
-    hr.topright = (960, 25)
-    screen.blit(hs, hr)
-
-    # Baro
     barometer = hawk.get_baro()
-    b = f"Baro = {round(barometer, 2)}cm"
-    bs = font.render(b, True, COLOR_GREEN)
-    br = bs.get_rect()
-    br.topright = (960, 50)
-    screen.blit(bs, br)
-
-    # Battery
+    altitude = hawk.altitude()
+    baro_drift = hawk.altitude_estimator.baro_drift
     battery = hawk.get_battery()
-    bat = f"{battery}%"
-    b_surface = font.render(bat, True, COLOR_GREEN)
-    b_rect = b_surface.get_rect()
-    b_rect.topleft = (0, 0)
-    screen.blit(b_surface, b_rect)
-
-    # Temp
     temp = hawk.get_temperature()
-    temperature = f"{temp}°F"
-    t_surface = font.render(temperature, True, COLOR_GREEN)
-    t_rect = t_surface.get_rect()
-    t_rect.topleft = (0, 25)
-    screen.blit(t_surface, t_rect)
+
+    if not args.no_render:
+        # Coords and degrees
+        coords = f"Rotation = {round(heading)}°"
+        coords_surface = font.render(coords, True, COLOR_GREEN)
+        coords_rect = coords_surface.get_rect()
+        coords_rect.topright = (960, 0)
+        screen.blit(coords_surface, coords_rect)
+
+        # Height
+        h = f"Height = {round(height, 2)}cm"
+        hs = font.render(h, True, COLOR_GREEN)
+        hr = hs.get_rect()
+        hr.topright = (960, 25)
+        screen.blit(hs, hr)
+
+        # Baro
+        b = f"Baro = {round(barometer, 2)}cm"
+        bs = font.render(b, True, COLOR_GREEN)
+        br = bs.get_rect()
+        br.topright = (960, 50)
+        screen.blit(bs, br)
+
+        # Fused altitude and how far the barometer has drifted since takeoff
+        alt = f"Altitude = {round(altitude)}cm ({round(baro_drift):+d})"
+        alt_surface = font.render(alt, True, COLOR_GREEN)
+        alt_rect = alt_surface.get_rect()
+        alt_rect.topright = (960, 75)
+        screen.blit(alt_surface, alt_rect)
+
+        # Battery
+        bat = f"{battery}%"
+        b_surface = font.render(bat, True, COLOR_GREEN)
+        b_rect = b_surface.get_rect()
+        b_rect.topleft = (0, 0)
+        screen.blit(b_surface, b_rect)
+
+        # Temp
+        temperature = f"{temp}°F"
+        t_surface = font.render(temperature, True, COLOR_GREEN)
+        t_rect = t_surface.get_rect()
+        t_rect.topleft = (0, 25)
+        screen.blit(t_surface, t_rect)
+
+    # Telemetry graphs
+    if graphs:
+        graph_start = time.perf_counter()
+        readings = {'battery': battery, 'temperature': temp, 'height': height, 'baro': barometer}
+        for name, (graph, position) in graphs.items():
+            graph.update(readings[name], now)
+            if not args.no_render:
+                graph.draw(screen, position)
+        graph_times.append(time.perf_counter() - graph_start)
 
     # Place key images on the screen (keyboard overlay)
-    for key, image in key_images.items():
-        screen.blit(image, key_positions[key])
+    for key, images in key_images.items():
+        screen.blit(images[key_states[key]], key_positions[key])
 
     # Draw the current frame on the screen
-    pygame.display.update()
+    if not args.no_render:
+        pygame.display.update()
+
+    if frame_timeline is not None:
+        latency_probe.stamp(frame_timeline, 'flip')
+        video_stats.frame_displayed(frame_timeline['decode'], frame_timeline['flip'])
+        if latency_recorder:
+            flipped_ms = latency_probe.wall_clock_ms()
+            # Read the timestamp back from what is actually on screen
+            encoded_ms = None
+            if not args.no_render:
+                pixels = pygame.surfarray.pixels3d(screen.subsurface(webcam_rect))
+                encoded_ms = latency_probe.decode_timestamp(latency_probe.displayed_frame(pixels))
+                del pixels
+            latency_recorder.record(frame_timeline, flipped_ms, encoded_ms)
+    if video_quality:
+        video_quality.update()
+
+    loop_timer.end()
+    if session_recorder:
+        session_recorder.write('loop', t=loop_started, work=loop_timer.work[-1])
+    if loop_timer.due():
+        print(f"Loop timing: {loop_timer.report()}")
+        if latency_recorder:
+            print(f"Frame latency (ms): {latency_recorder.report()}")
 
     # Set a consistent speed that is reasonable and matches our camera
-    clock.tick(30)
+    clock.tick(loop_fps)
 
 # Close down everything
+print(f"Loop timing: {loop_timer.report()}")
+if video_quality:
+    print(f"Adaptive video: {video_quality.last_summary}")
+if latency_recorder:
+    print(f"Frame latency (ms): {latency_recorder.report()}")
+if graph_times:
+    print(f"Telemetry graphs per frame: {headless.summarize(graph_times)}")
+if hawk.rc_shaper:
+    print(f"RC shaping:\n{hawk.rc_shaper.report()}")
+    # Fly this session's inputs again in the simulator to see what shaping did for the drone
+    comparison = compare_shaping(hawk.rc_shaper.inputs, hawk.rc_shaper.limits)
+    print(f"RC shaping, this session's inputs flown in the simulator:\n{shaping_report(comparison)}")
+if hawk.frame_reader:
+    print(f"Video decoder: {hawk.frame_reader.report()}")
+if relay:
+    print(f"Video relay: {relay.stats()}")
+    relay.stop()
+if input_recorder:
+    input_recorder.close()
+if failsafe:
+    failsafe.stop()
+    print(f"Failsafe: {failsafe.report()}")
+executor.stop(timeout=10)
+print(f"Drone commands: {executor.report()}")
+print(f"Altitude: {hawk.altitude_estimator.summary()}")
 hawk.land()
 hawk.disconnect()
+if replay_drone:
+    print(f"Replayed commands:\n{replay_drone.report()}")
+if session_recorder:
+    session_recorder.close()
 pygame.quit()
\ No newline at end of file
@@ -0,0 +1,151 @@
+import math
+
+# Default limits in RC units (-100..100): 0 -> 100 takes about half a second
+DEFAULT_LIMITS = {
+    'max_accel': 250,   # RC units per second
+    'max_jerk': 1500,   # RC units per second^2
+    'expo': 0.3,        # 0 is linear, 1 is fully cubic
+}
+
+# Axis order used by send_rc_control and HeadsUpTello.move
+AXES = ('left_right', 'forward_back', 'up_down', 'yaw')
+
+# Longest step we integrate in one go, so a stalled loop doesn't cause a jump
+MAX_STEP = 0.1
+
+#--------------------------- BEGIN AxisShaper CLASS ----------------------------
+
+class AxisShaper():
+    """
+    Shapes one RC axis so the command follows its target with limited
+    acceleration and jerk. The acceleration is planned so it can ramp back
+    to zero exactly as the command reaches the target, which is what
+    keeps it from overshooting.
+    """
+
+    def __init__(self, max_accel, max_jerk, expo=0.0, settle_band=2):
+        self.max_accel = max_accel
+        self.max_jerk = max_jerk
+        self.expo = expo
+        self.settle_band = settle_band
+
+        self.value = 0.0
+        self.accel = 0.0
+
+        # Metrics of the shaped command, none of them depend on the loop
+        # rate. How the drone responds is measured in the simulator, see
+        # simulator.compare_shaping.
+        self.total_change = 0.0     # sum of |change in command|
+        self.travel = 0.0           # integral of |command|
+        self.peak_accel = 0.0
+        self.settling_times = []
+        self.last_target = 0.0
+        self.target_changed = None
+        self.elapsed = 0.0
+
+    def reset(self):
+        """ Forget the current command, e.g. after landing """
+        self.value = 0.0
+        self.accel = 0.0
+        self.target_changed = None
+
+    def apply_expo(self, target):
+        """ Soften small stick/key inputs while keeping full range at the ends """
+        t = max(-1.0, min(1.0, target / 100.0))
+        return 100.0 * ((1 - self.expo) * t + self.expo * t ** 3)
+
+    def step(self, raw_target, dt):
+        """ Advance the shaped command by dt seconds toward raw_target """
+        dt = min(dt, MAX_STEP)
+        target = self.apply_expo(raw_target)
+
+        if target != self.last_target:
+            self.last_target = target
+            self.target_changed = self.elapsed
+
+        if dt <= 0:
+            return self.value
+
+        error = target - self.value
+        # Fastest acceleration we can still ramp down to zero from in time
+        wanted = math.copysign(math.sqrt(2 * self.max_jerk * abs(error)), error)
+        wanted = max(-self.max_accel, min(self.max_accel, wanted))
+
+        change = max(-self.max_jerk * dt, min(self.max_jerk * dt, wanted - self.accel))
+        self.accel += change
+        new_value = self.value + self.accel * dt
+
+        # Land exactly on the target instead of dithering around it
+        if (target - new_value) * error <= 0:
+            new_value = target
+            self.accel = 0.0
+        self.total_change += abs(new_value - self.value)
+        self.value = new_value
+
+        self.elapsed += dt
+        self.travel += abs(self.value) * dt
+        self.peak_accel = max(self.peak_accel, abs(self.accel))
+
+        if self.target_changed is not None and abs(target - self.value) <= self.settle_band:
+            self.settling_times.append(self.elapsed - self.target_changed)
+            self.target_changed = None
+
+        return self.value
+
+#---------------------------- END AxisShaper CLASS -----------------------------
+
+#------------------------- BEGIN SetpointShaper CLASS --------------------------
+
+class SetpointShaper():
+    """
+    Jerk-limited setpoint shaping for all four RC axes. Call step() once
+    per control loop pass with the raw RC targets and send what it returns.
+
+    Limits can be set for every axis at once or per axis:
+
+        SetpointShaper(max_accel=200, yaw={'max_accel': 400})
+
+    The raw targets are kept in inputs as [targets, seconds] runs so the
+    session can be flown again in the simulator, shaped and unshaped
+    (simulator.compare_shaping).
+    """
+
+    def __init__(self, **limits):
+        self.limits = limits
+        self.inputs = []
+        shared = {name: limits.get(name, value) for name, value in DEFAULT_LIMITS.items()}
+        self.axes = []
+        for axis in AXES:
+            settings = dict(shared)
+            settings.update(limits.get(axis, {}))
+            self.axes.append(AxisShaper(**settings))
+
+    def step(self, targets, dt):
+        """ Return the shaped (left_right, forward_back, up_down, yaw) RC values """
+        targets = tuple(targets)
+        if self.inputs and self.inputs[-1][0] == targets:
+            self.inputs[-1][1] += min(dt, MAX_STEP)
+        else:
+            self.inputs.append([targets, min(dt, MAX_STEP)])
+        return tuple(int(round(shaper.step(target, dt)))
+                     for shaper, target in zip(self.axes, targets))
+
+    def reset(self):
+        for shaper in self.axes:
+            shaper.reset()
+
+    def report(self):
+        """ Summarize the shaped command per axis: changes, travel, settling time and peak acceleration """
+        lines = []
+        for axis, shaper in zip(AXES, self.axes):
+            lines.append(f"{axis}: total_change={shaper.total_change:.0f} travel={shaper.travel:.0f} "
+                         f"settle_median={_median(shaper.settling_times):.2f}s over {len(shaper.settling_times)} changes "
+                         f"peak_accel={shaper.peak_accel:.0f}/s")
+        return "\n".join(lines)
+
+#-------------------------- END SetpointShaper CLASS ---------------------------
+
+
+def _median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2] if ordered else 0.0
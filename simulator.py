@@ -0,0 +1,631 @@
+import argparse
+import collections
+import itertools
+import logging
+import math
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+# Flight model defaults, loosely matched to a Tello
+RC_MAX_SPEED = 100      # cm/s at an RC value of 100
+RESPONSE_TIME = 0.4     # s, first-order lag from RC command to velocity
+YAW_RATE = 90           # deg/s at an RC value of 100, and for rotate commands
+CLIMB_SPEED = 60        # cm/s for takeoff and landing
+TAKEOFF_HEIGHT = 80     # cm
+COMMAND_OVERHEAD = 0.3  # s the drone takes to accept and settle a command
+HOVER_DRAIN = 100 / (13 * 60)   # percent per second, about 13 minutes of hover
+MOTION_DRAIN = 0.00004  # extra percent per second per (cm/s)^2 of airspeed
+ACCEL_DRAIN = 0.00002   # extra percent per second per cm/s^2 of acceleration
+STEP = 0.02             # s, integration step of the flight model
+
+# Damping of the second-order velocity response used to compare RC shaping;
+# a real drone overshoots a little when it starts or stops hard
+SHAPING_DAMPING = 0.6
+SETTLE_BAND = 5         # cm/s, how close to the command counts as settled
+
+
+class SimulatorException(Exception):
+    """ Raised where a real Tello would answer a command with an error """
+
+#-------------------------- BEGIN VirtualClock CLASS ---------------------------
+
+class VirtualClock():
+    """
+    Simulated time. sleep() advances it instantly and lets the simulated
+    drone fly through the skipped time, so missions run as fast as the CPU
+    allows. Exposes time() and sleep() like the time module.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = start
+        self.listeners = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        end = self.now + seconds
+        while self.now < end:
+            dt = min(STEP, end - self.now)
+            for listener in self.listeners:
+                listener(dt)
+            self.now += dt
+
+#--------------------------- END VirtualClock CLASS ----------------------------
+
+#-------------------------- BEGIN RealTimeClock CLASS --------------------------
+
+class RealTimeClock():
+    """
+    Wall-clock time, for flying a SimulatedTello by hand from the ground
+    station (pygame_test.py --simulator). sleep() really sleeps, and a
+    background thread keeps the simulated drone flying in STEP increments
+    as time passes. Reading the time also catches the drone up, so
+    telemetry read right after an RC command is never a step behind.
+    """
+
+    def __init__(self):
+        self.listeners = []
+        self.started = time.perf_counter()
+        self.now = 0.0
+        # Game loop, command executor and failsafe threads all read the clock
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._tick, daemon=True)
+        self.thread.start()
+
+    def time(self):
+        with self.lock:
+            elapsed = time.perf_counter() - self.started
+            while self.now < elapsed:
+                dt = min(STEP, elapsed - self.now)
+                for listener in self.listeners:
+                    listener(dt)
+                self.now += dt
+            return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+        self.time()
+
+    def _tick(self):
+        while True:
+            time.sleep(STEP)
+            self.time()
+
+#--------------------------- END RealTimeClock CLASS ---------------------------
+
+#------------------------- BEGIN SimulatedTello CLASS --------------------------
+
+class SimulatedTello():
+    """
+    An in-process stand-in for djitellopy.Tello for HeadsUpTello. It keeps
+    position, velocity, yaw, height and battery on a VirtualClock: blocking
+    commands advance the clock by how long the real drone would take, and
+    RC commands are flown by a simple first-order model whenever the clock
+    moves, or a second-order one that can overshoot if response_damping
+    is set. Wind pushes the drone around; like the real drone's downward
+    camera position hold, the model cancels wind_rejection of it.
+
+    Frames: x is to the right and y forward of the power-on heading, yaw
+    is clockwise. Telemetry uses the Tello's units (speed in dm/s, with
+    vgx along the power-on nose direction and vgy to the right of it).
+    """
+
+    LOGGER = logging.getLogger('simulated_tello')
+
+    def __init__(self, clock=None, wind=(0.0, 0.0), gust=0.0, wind_rejection=0.9,
+                 battery=100.0, barometer=10000, baro_drift=0.0, baro_noise=10.0,
+                 response_damping=None, seed=None):
+        """
+        Arguments
+            clock:      VirtualClock (or RealTimeClock) to run on, a new
+                        VirtualClock if None
+            wind:       (x, y) wind in cm/s
+            gust:       Standard deviation of random gusts in cm/s
+            wind_rejection: Fraction of the wind the drone cancels out,
+                        lower it to model flying without position hold
+            battery:    Starting battery percent
+            barometer:  Absolute barometer reading on the ground in cm
+            baro_drift: Barometer drift in cm per minute (weather)
+            baro_noise: Standard deviation of barometer readings in cm
+            response_damping: Damping ratio of a second-order velocity
+                        response with natural period RESPONSE_TIME. Below 1
+                        it overshoots. None keeps the first-order lag.
+            seed:       Random seed so runs are repeatable
+        """
+        self.clock = clock or VirtualClock()
+        self.clock.listeners.append(self.step)
+        self.wind = wind
+        self.gust = gust
+        self.wind_rejection = wind_rejection
+        self.random = random.Random(seed)
+        self.battery = float(battery)
+        self.barometer = barometer
+        self.baro_drift = baro_drift
+        self.baro_noise = baro_noise
+        self.response_damping = response_damping
+
+        self.x, self.y, self.z = 0.0, 0.0, 0.0
+        self.vx, self.vy, self.vz = 0.0, 0.0, 0.0
+        self.ax, self.ay, self.az = 0.0, 0.0, 0.0
+        self.yaw = 0.0
+        self.rc = (0, 0, 0, 0)
+        self.speed = 20
+        self.flying = False
+        self.stream = False
+        self.video = {}
+        self.frame_read = None
+        self.commands = collections.Counter()
+        self.distance = 0.0
+
+    # --- Flight model -------------------------------------------------------
+
+    def step(self, dt):
+        """ Advance the flight model by dt seconds """
+        self.battery = max(0.0, self.battery - HOVER_DRAIN * dt * (1 if self.flying else 0.1))
+        if not self.flying:
+            return
+
+        left_right, forward_back, up_down, yaw_rc = self.rc
+        heading = math.radians(self.yaw)
+        # Body-frame RC to a world-frame target velocity
+        target_x = (left_right * math.cos(heading) + forward_back * math.sin(heading)) * RC_MAX_SPEED / 100
+        target_y = (forward_back * math.cos(heading) - left_right * math.sin(heading)) * RC_MAX_SPEED / 100
+        target_z = up_down * RC_MAX_SPEED / 100
+        if self.response_damping is None:
+            blend = 1 - math.exp(-dt / RESPONSE_TIME)
+            self.ax = (target_x - self.vx) * blend / dt
+            self.ay = (target_y - self.vy) * blend / dt
+            self.az = (target_z - self.vz) * blend / dt
+        else:
+            rate = 1 / RESPONSE_TIME
+            damping = 2 * self.response_damping * rate
+            self.ax += (rate * rate * (target_x - self.vx) - damping * self.ax) * dt
+            self.ay += (rate * rate * (target_y - self.vy) - damping * self.ay) * dt
+            self.az += (rate * rate * (target_z - self.vz) - damping * self.az) * dt
+        ax, ay = self.ax, self.ay
+        self.vx += ax * dt
+        self.vy += ay * dt
+        self.vz += self.az * dt
+
+        wind_x, wind_y = self._wind()
+        self.x += (self.vx + wind_x) * dt
+        self.y += (self.vy + wind_y) * dt
+        self.z = max(0.0, self.z + self.vz * dt)
+        self.yaw = (self.yaw + yaw_rc * YAW_RATE / 100 * dt) % 360
+        self.distance += math.hypot(self.vx, self.vy) * dt
+
+        airspeed = self.vx * self.vx + self.vy * self.vy + self.vz * self.vz
+        self.battery = max(0.0, self.battery - (MOTION_DRAIN * airspeed + ACCEL_DRAIN * math.hypot(ax, ay)) * dt)
+
+    def _wind(self):
+        """ The part of the wind the drone doesn't cancel out, with gusts """
+        wind_x, wind_y = self.wind
+        if self.gust:
+            wind_x += self.random.gauss(0, self.gust)
+            wind_y += self.random.gauss(0, self.gust)
+        leak = 1 - self.wind_rejection
+        return wind_x * leak, wind_y * leak
+
+    def _command(self, name, duration=COMMAND_OVERHEAD):
+        """ Count a blocking command and let the time it takes pass """
+        self.commands[name] += 1
+        if self.battery <= 0:
+            raise SimulatorException(f"{name}: battery empty")
+        self.rc = (0, 0, 0, 0)
+        self.clock.sleep(duration)
+
+    def _fly(self, name, distance, forward, right, up=0.0):
+        """ Blocking move of distance cm along a body-frame direction """
+        if not self.flying:
+            raise SimulatorException(f"{name}: not flying")
+        if not 20 <= distance <= 500:
+            raise SimulatorException(f"{name}: out of range {distance}")
+        duration = distance / self.speed
+        heading = math.radians(self.yaw)
+        self.x += (right * math.cos(heading) + forward * math.sin(heading)) * distance
+        self.y += (forward * math.cos(heading) - right * math.sin(heading)) * distance
+        self.z = max(0.0, self.z + up * distance)
+        self.distance += distance
+        # The move replaces any RC motion; wind still acts while it runs
+        self.vx = self.vy = self.vz = 0.0
+        self.ax = self.ay = self.az = 0.0
+        self.battery = max(0.0, self.battery - MOTION_DRAIN * self.speed ** 2 * duration)
+        self._command(name, duration + COMMAND_OVERHEAD)
+
+    # --- djitellopy.Tello interface used by HeadsUpTello -------------------
+
+    def connect(self):
+        self._command('connect', 0.1)
+
+    def end(self):
+        self.commands['end'] += 1
+        if self.frame_read:
+            self.frame_read.stop()
+
+    def takeoff(self):
+        self.flying = True
+        self.z = TAKEOFF_HEIGHT
+        self._command('takeoff', TAKEOFF_HEIGHT / CLIMB_SPEED + COMMAND_OVERHEAD)
+
+    def land(self):
+        duration = self.z / CLIMB_SPEED + COMMAND_OVERHEAD
+        self.z = 0.0
+        self.vx = self.vy = self.vz = 0.0
+        self.ax = self.ay = self.az = 0.0
+        self._command('land', duration)
+        self.flying = False
+
+    def emergency(self):
+        self.commands['emergency'] += 1
+        self.flying = False
+        self.z = 0.0
+
+    def send_command_without_return(self, command):
+        # Returns at once like the real drone; only land is simulated
+        self.commands[command] += 1
+        if command != 'land':
+            raise SimulatorException(f"{command}: not simulated")
+        self.flying = False
+        self.z = 0.0
+        self.vx = self.vy = self.vz = 0.0
+        self.ax = self.ay = self.az = 0.0
+        self.rc = (0, 0, 0, 0)
+
+    def send_rc_control(self, left_right, forward_back, up_down, yaw):
+        self.commands['rc'] += 1
+        self.rc = tuple(max(-100, min(100, int(value))) for value in
+                        (left_right, forward_back, up_down, yaw))
+
+    def set_speed(self, speed):
+        if not 10 <= speed <= 100:
+            raise SimulatorException(f"set_speed: out of range {speed}")
+        self.speed = speed
+        self._command('speed', 0.05)
+
+    def move_up(self, distance):
+        self._fly('up', distance, 0, 0, 1)
+
+    def move_down(self, distance):
+        self._fly('down', distance, 0, 0, -1)
+
+    def move_forward(self, distance):
+        self._fly('forward', distance, 1, 0)
+
+    def move_back(self, distance):
+        self._fly('back', distance, -1, 0)
+
+    def move_left(self, distance):
+        self._fly('left', distance, 0, -1)
+
+    def move_right(self, distance):
+        self._fly('right', distance, 0, 1)
+
+    def rotate_clockwise(self, degrees):
+        self.yaw = (self.yaw + degrees) % 360
+        self._command('cw', degrees / YAW_RATE + COMMAND_OVERHEAD)
+
+    def rotate_counter_clockwise(self, degrees):
+        self.yaw = (self.yaw - degrees) % 360
+        self._command('ccw', degrees / YAW_RATE + COMMAND_OVERHEAD)
+
+    def flip(self, direction):
+        if self.battery < 50:
+            raise SimulatorException("flip: battery below 50%")
+        self.battery -= 1.0
+        self._command('flip', 1.5)
+
+    def streamon(self):
+        self.stream = True
+        self._command('streamon', 0.05)
+
+    def streamoff(self):
+        self.stream = False
+        self._command('streamoff', 0.05)
+
+    def get_frame_read(self):
+        """ Timestamped synthetic frames (see latency_probe), created on first use """
+        if self.frame_read is None:
+            from latency_probe import SyntheticFrameRead
+            self.frame_read = SyntheticFrameRead()
+        return self.frame_read
+
+    def set_video_resolution(self, resolution):
+        self.video['resolution'] = resolution
+        self._command('setresolution', 0.05)
+
+    def set_video_fps(self, fps):
+        self.video['fps'] = fps
+        self._command('setfps', 0.05)
+
+    def set_video_bitrate(self, bitrate):
+        self.video['bitrate'] = bitrate
+        self._command('setbitrate', 0.05)
+
+    def get_battery(self):
+        return int(self.battery)
+
+    def get_barometer(self):
+        drift = self.baro_drift * self.clock.time() / 60
+        noise = self.random.gauss(0, self.baro_noise) if self.baro_noise else 0.0
+        return int(self.barometer + self.z + drift + noise)
+
+    def get_height(self):
+        return int(round(self.z, -1))
+
+    def get_distance_tof(self):
+        return int(self.z) + 10
+
+    def get_temperature(self):
+        return 20 + (100 - self.battery) / 10
+
+    def get_yaw(self):
+        return int(round((self.yaw + 180) % 360 - 180))
+
+    def get_speed_x(self):
+        return int(round(self._ground_velocity()[1] / 10))
+
+    def get_speed_y(self):
+        return int(round(self._ground_velocity()[0] / 10))
+
+    def get_speed_z(self):
+        # Positive when descending, like the real drone
+        return int(round(-self.vz / 10))
+
+    def body_velocity(self):
+        """ True (right, forward, up) velocity in cm/s relative to the air, in the body frame """
+        heading = math.radians(self.yaw)
+        right = self.vx * math.cos(heading) - self.vy * math.sin(heading)
+        forward = self.vx * math.sin(heading) + self.vy * math.cos(heading)
+        return right, forward, self.vz
+
+    def _ground_velocity(self):
+        leak = 1 - self.wind_rejection
+        return self.vx + self.wind[0] * leak, self.vy + self.wind[1] * leak
+
+#-------------------------- END SimulatedTello CLASS ---------------------------
+
+#-------------------------- BEGIN StepResponse CLASS ---------------------------
+
+class StepResponse():
+    """
+    Measures how a velocity follows each change of its command, per axis:
+    the overshoot past the new command and the settling time until it
+    stays within SETTLE_BAND of it. A change still unsettled when the next
+    one comes counts as settling for as long as it was held.
+    """
+
+    def __init__(self, axes=3, band=SETTLE_BAND):
+        self.band = band
+        self.target = [0.0] * axes
+        self.direction = [0.0] * axes
+        self.changed = [None] * axes
+        self.last_outside = [0.0] * axes
+        self.peak = [0.0] * axes
+        self.overshoots = []
+        self.settling_times = []
+
+    def command(self, now, targets):
+        """ Note the commanded velocities at time now """
+        for axis, target in enumerate(targets):
+            if target != self.target[axis]:
+                self._finish(axis)
+                self.direction[axis] = math.copysign(1.0, target - self.target[axis])
+                self.target[axis] = target
+                self.changed[axis] = now
+                self.last_outside[axis] = now
+                self.peak[axis] = 0.0
+
+    def sample(self, now, velocities):
+        """ Measure the velocities at time now """
+        for axis, velocity in enumerate(velocities):
+            if self.changed[axis] is None:
+                continue
+            error = velocity - self.target[axis]
+            self.peak[axis] = max(self.peak[axis], error * self.direction[axis])
+            if abs(error) > self.band:
+                self.last_outside[axis] = now
+
+    def finish(self):
+        for axis in range(len(self.target)):
+            self._finish(axis)
+
+    def _finish(self, axis):
+        if self.changed[axis] is None:
+            return
+        self.overshoots.append(self.peak[axis])
+        self.settling_times.append(self.last_outside[axis] - self.changed[axis])
+        self.changed[axis] = None
+
+#--------------------------- END StepResponse CLASS ----------------------------
+
+# Mission parameters for simulated runs; file logging is off so thousands
+# of runs don't fight over one log file
+SIM_PARAMETERS = {
+    'mission': 'Simulation',
+    'name': 'sim',
+    'min_takeoff_power': 30,
+    'min_operating_power': 20,
+    'ceiling': 300,
+    'floor': 20,
+    'log_to_file': False,
+}
+
+
+def run_mission(mission, settings):
+    """
+    Fly one mission against a fresh simulated drone and return its outcome.
+
+    Arguments
+        mission:  Function mission(hawk, settings) that flies the drone and
+                  may return a dict of extra results
+        settings: Dict of run settings. wind, gust, wind_rejection, battery,
+                  baro_drift, baro_noise, response_damping and seed
+                  configure the drone, parameters
+                  overrides SIM_PARAMETERS, anything else is for the mission.
+    """
+    from flightcontroller import HeadsUpTello
+
+    drone = SimulatedTello(wind=settings.get('wind', (0.0, 0.0)),
+                           gust=settings.get('gust', 0.0),
+                           wind_rejection=settings.get('wind_rejection', 0.9),
+                           battery=settings.get('battery', 100.0),
+                           baro_drift=settings.get('baro_drift', 0.0),
+                           baro_noise=settings.get('baro_noise', 10.0),
+                           response_damping=settings.get('response_damping'),
+                           seed=settings.get('seed'))
+    parameters = dict(SIM_PARAMETERS, **settings.get('parameters', {}))
+    outcome = dict(settings)
+    started = time.perf_counter()
+    try:
+        hawk = HeadsUpTello(parameters, drone, logging.WARNING)
+        result = mission(hawk, settings)
+        outcome['ok'] = True
+        if isinstance(result, dict):
+            outcome.update(result)
+    except Exception as excp:
+        outcome['ok'] = False
+        outcome['error'] = f"{type(excp).__name__}: {excp}"
+
+    outcome['sim_seconds'] = drone.clock.time()
+    outcome['cpu_seconds'] = time.perf_counter() - started
+    outcome['battery_used'] = settings.get('battery', 100.0) - drone.battery
+    outcome['distance'] = drone.distance
+    outcome['position'] = (drone.x, drone.y, drone.z)
+    outcome['commands'] = sum(drone.commands.values())
+    return outcome
+
+
+def expand_grid(grid):
+    """ Every combination of a dict of lists, as a list of dicts """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def sweep(mission, grid, processes=None, chunksize=8):
+    """
+    Run mission for every combination of settings in grid across a process
+    pool and return the outcomes in grid order. mission must be a module
+    level function so it can be sent to the worker processes.
+
+        results = sweep(waypoint_mission, {'speed': [20, 40, 60],
+                                           'wind': [(0, 0), (30, 0)],
+                                           'seed': range(10)})
+    """
+    runs = expand_grid(grid)
+    if processes == 1:
+        return [run_mission(mission, settings) for settings in runs]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(partial(run_mission, mission), runs, chunksize=chunksize))
+
+
+def waypoint_mission(hawk, settings):
+    """
+    Example mission: take off, fly a square closed-loop in the order given
+    by settings['order'] at settings['speed'] (max RC), then go home.
+    """
+    square = [(200, 0), (200, 200), (0, 200)]
+    order = settings.get('order', (0, 1, 2))
+    hawk.takeoff()
+    arrived = hawk.fly_waypoints([square[index] for index in order],
+                                 max_rc=settings.get('speed', 40))
+    hawk.go_home(closed_loop=True)
+    hawk.land()
+    return {'arrived': arrived}
+
+
+def shaping_mission(hawk, settings):
+    """
+    Take off and fly settings['inputs'], raw RC inputs as recorded in
+    SetpointShaper.inputs, through move() once per settings['period'],
+    shaped with settings['limits'] if settings['shaped'], then land. The
+    unshaped run still gets the expo curve so only the acceleration and
+    jerk limits differ. Measures the drone's true velocity response.
+    """
+    from setpoint_shaper import SetpointShaper
+
+    curves = SetpointShaper(**settings['limits']).axes
+    if settings['shaped']:
+        hawk.enable_rc_shaping(**settings['limits'])
+    drone = hawk.drone
+    response = StepResponse()
+    drone.clock.listeners.append(lambda dt: response.sample(drone.clock.time() + dt, drone.body_velocity()))
+
+    hawk.takeoff()
+    period = settings['period']
+    for targets, seconds in settings['inputs']:
+        expo = [curve.apply_expo(target) for curve, target in zip(curves, targets)]
+        response.command(drone.clock.time(), [value * RC_MAX_SPEED / 100 for value in expo[:3]])
+        if not settings['shaped']:
+            targets = tuple(int(round(value)) for value in expo)
+        for _ in range(int(round(seconds / period))):
+            hawk.move(*targets)
+            hawk.sleep(period)
+    response.finish()
+    hawk.land()
+    return {'overshoots': response.overshoots, 'settling_times': response.settling_times}
+
+
+def compare_shaping(inputs, limits=None, period=1 / 30, **settings):
+    """
+    Fly the same raw RC inputs (SetpointShaper.inputs) through the simulator
+    unshaped and shaped with limits, on a drone with a SHAPING_DAMPING
+    velocity response unless settings say otherwise. Returns the outcomes
+    of shaping_mission as {'unshaped': ..., 'shaped': ...}.
+    """
+    settings = dict({'response_damping': SHAPING_DAMPING, 'seed': 1}, **settings)
+    settings.update(inputs=inputs, limits=limits or {}, period=period)
+    return {name: run_mission(shaping_mission, dict(settings, shaped=name == 'shaped'))
+            for name in ('unshaped', 'shaped')}
+
+
+def shaping_report(comparison):
+    """ One line per run of compare_shaping """
+    lines = []
+    for name, outcome in comparison.items():
+        if not outcome['ok']:
+            lines.append(f"{name}: failed, {outcome['error']}")
+            continue
+        overshoots = sorted(outcome['overshoots'])
+        settling = sorted(outcome['settling_times'])
+        middle = len(settling) // 2
+        lines.append(f"{name}: battery_used={outcome['battery_used']:.3f}% distance={outcome['distance']:.0f}cm "
+                     f"overshoot median={overshoots[middle] if overshoots else 0:.1f}cm/s "
+                     f"max={max(overshoots, default=0):.1f}cm/s "
+                     f"settle median={settling[middle] if settling else 0:.2f}s over {len(settling)} changes")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a parameter sweep of simulated missions")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes, default is one per CPU")
+    parser.add_argument('--seeds', type=int, default=5, help="random seeds per combination")
+    args = parser.parse_args()
+
+    grid = {
+        'speed': [20, 40, 60],
+        'wind': [(0, 0), (100, 0), (0, -100)],
+        'gust': [0, 10],
+        'battery': [60, 100],
+        'order': list(itertools.permutations(range(3))),
+        'seed': list(range(args.seeds)),
+    }
+    started = time.perf_counter()
+    results = sweep(waypoint_mission, grid, args.processes)
+    elapsed = time.perf_counter() - started
+
+    flown = sum(result['sim_seconds'] for result in results)
+    failed = [result for result in results if not result['ok']]
+    print(f"{len(results)} missions, {flown / 3600:.1f} simulated hours in {elapsed:.1f}s, {len(failed)} failed")
+    for speed in grid['speed']:
+        runs = [result for result in results if result['speed'] == speed and result['ok']]
+        if runs:
+            print(f"speed {speed}: mean time {sum(r['sim_seconds'] for r in runs) / len(runs):.1f}s, "
+                  f"mean battery {sum(r['battery_used'] for r in runs) / len(runs):.2f}%, "
+                  f"arrived {sum(1 for r in runs if r.get('arrived')) / len(runs):.0%}")
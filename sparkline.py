@@ -0,0 +1,151 @@
+import numpy as np
+import pygame
+
+GRAPH_BACKGROUND = (20, 20, 20)
+GRAPH_ALPHA = 180
+
+#---------------------------- BEGIN Sparkline CLASS ----------------------------
+
+class Sparkline():
+    """
+    A small scrolling graph of one telemetry channel over the last few
+    seconds, drawn straight into a NumPy pixel buffer. Time moves the graph
+    left one column at a time: the buffer is shifted in place and only the
+    new column is drawn, as a vertical segment from the previous value to
+    the new one so the line stays joined. The whole graph is only redrawn
+    when a value falls outside the current range and the scale widens.
+
+    The buffer is laid out (x, y, rgb) like pygame.surfarray, so it goes to
+    the screen with a single blit_array.
+    """
+
+    def __init__(self, width=160, height=36, seconds=30, color=(64, 255, 64),
+                 low=None, high=None, min_span=1.0):
+        """
+        Arguments
+            width, height: Size of the graph in pixels
+            seconds:       Time covered by the full width
+            color:         Line color
+            low, high:     Fixed range, or None to fit the values seen
+            min_span:      Smallest range the graph zooms in to
+        """
+        self.width = width
+        self.height = height
+        self.column_time = seconds / width
+        self.color = np.array(color, dtype=np.uint8)
+        self.background = np.array(GRAPH_BACKGROUND, dtype=np.uint8)
+        self.fixed_range = low is not None and high is not None
+        self.low = low
+        self.high = high
+        self.min_span = min_span
+
+        self.pixels = np.empty((width, height, 3), dtype=np.uint8)
+        self.pixels[:] = self.background
+        # Value behind every column, NaN where there's no data yet
+        self.values = np.full(width, np.nan)
+        self.rows = np.arange(height)
+        self.last_column_time = None
+        self.latest = None
+
+        self.surface = pygame.Surface((width, height))
+        self.surface.set_alpha(GRAPH_ALPHA)
+        self.dirty = True
+
+    def update(self, value, now):
+        """ Add the latest reading; scrolls as many columns as time has passed """
+        if value is None:
+            return
+        self.latest = float(value)
+        if self.last_column_time is None:
+            self.last_column_time = now
+            columns = 1
+        else:
+            columns = int((now - self.last_column_time) / self.column_time)
+            if columns <= 0:
+                return
+            self.last_column_time += columns * self.column_time
+
+        rescaled = self._fit(self.latest)
+        self._scroll(columns)
+        if rescaled:
+            self._redraw()
+
+    def _scroll(self, columns):
+        """ Shift left by columns and draw the new value into the last one """
+        columns = min(columns, self.width)
+        # Anything skipped over (a stalled loop) holds the previous value
+        self._scroll_values(columns - 1)
+        self.pixels[:-1] = self.pixels[1:]
+        self.values[:-1] = self.values[1:]
+        self.values[-1] = self.latest
+        self.pixels[-1] = self.background
+        self._draw_column(self.width - 1)
+        self.dirty = True
+
+    def _scroll_values(self, columns):
+        """ Repeat the last drawn value for columns that passed without a draw """
+        if columns <= 0:
+            return
+        columns = min(columns, self.width)
+        held = self.values[-1]
+        self.pixels[:-columns] = self.pixels[columns:]
+        self.values[:-columns] = self.values[columns:]
+        self.values[-columns:] = held
+        self.pixels[-columns:] = self.background
+        for column in range(self.width - columns, self.width):
+            self._draw_column(column)
+
+    def _row(self, values):
+        """ Pixel row for values, top of the graph is the high end """
+        span = self.high - self.low
+        scaled = (values - self.low) / span if span > 0 else np.zeros_like(values)
+        return np.rint((self.height - 1) * (1 - np.clip(scaled, 0, 1))).astype(int)
+
+    def _draw_column(self, column):
+        value = self.values[column]
+        if np.isnan(value):
+            return
+        row = int(self._row(np.array([value]))[0])
+        previous = self.values[column - 1] if column > 0 else np.nan
+        start = row if np.isnan(previous) else int(self._row(np.array([previous]))[0])
+        top, bottom = min(row, start), max(row, start)
+        self.pixels[column, top:bottom + 1] = self.color
+
+    def _fit(self, value):
+        """ Widen the range to include value. Returns True if it changed. """
+        if self.fixed_range:
+            return False
+        if self.low is None:
+            self.low = value - self.min_span / 2
+            self.high = value + self.min_span / 2
+            return True
+        if self.low <= value <= self.high:
+            return False
+        # Leave some headroom so a slow climb doesn't rescale every column
+        margin = 0.1 * max(self.high - self.low, self.min_span)
+        self.low = min(self.low, value - margin)
+        self.high = max(self.high, value + margin)
+        return True
+
+    def _redraw(self):
+        """ Draw every column at once, used when the scale changes """
+        self.pixels[:] = self.background
+        known = ~np.isnan(self.values)
+        if known.any():
+            rows = self._row(np.where(known, self.values, self.low))
+            previous = np.concatenate([[rows[0]], rows[:-1]])
+            previous = np.where(np.concatenate([[False], known[:-1]]), previous, rows)
+            top = np.minimum(rows, previous)[:, None]
+            bottom = np.maximum(rows, previous)[:, None]
+            line = (self.rows[None, :] >= top) & (self.rows[None, :] <= bottom) & known[:, None]
+            self.pixels[line] = self.color
+        self.dirty = True
+
+    def draw(self, screen, position):
+        """ Blit the graph with its top-left corner at position """
+        if self.dirty:
+            pygame.surfarray.blit_array(self.surface, self.pixels)
+            self.dirty = False
+        screen.blit(self.surface, position)
+
+#----------------------------- END Sparkline CLASS -----------------------------
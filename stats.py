@@ -0,0 +1,21 @@
+# Percentile summaries for timing measurements, kept free of pygame so
+# modules that never open a window can use them
+
+
+def percentile(ordered, fraction):
+    """ Nearest-rank percentile of an already sorted list """
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    """ Format p50/p95/p99/max of a collection of durations in milliseconds """
+    ordered = sorted(samples)
+    if not ordered:
+        return "no samples"
+    return (f"p50={percentile(ordered, 0.50) * 1000:.2f}ms "
+            f"p95={percentile(ordered, 0.95) * 1000:.2f}ms "
+            f"p99={percentile(ordered, 0.99) * 1000:.2f}ms "
+            f"max={ordered[-1] * 1000:.2f}ms")
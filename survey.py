@@ -0,0 +1,256 @@
+import numpy as np
+
+# The Tello can't fly a single move longer than this
+MAX_LEG = 500
+
+# Points closer together than this (cm) are treated as the same point
+EPSILON = 1e-6
+
+
+def rectangle(x_min, y_min, x_max, y_max):
+    """ Corner list for an axis-aligned rectangle, usable as a polygon """
+    return np.array([[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]], dtype=float)
+
+
+def _rotation(angle):
+    """ Matrix that rotates points by -angle so the sweep direction lies along x """
+    c, s = np.cos(angle), np.sin(angle)
+    return np.array([[c, s], [-s, c]])
+
+
+def sweep_angle(polygon):
+    """
+    Pick the sweep direction that needs the fewest passes. The narrowest
+    width of a polygon is always measured across one of its edges, so
+    only edge directions need checking.
+    """
+    edges = np.roll(polygon, -1, axis=0) - polygon
+    angles = np.arctan2(edges[:, 1], edges[:, 0])
+    normals = np.stack([-np.sin(angles), np.cos(angles)], axis=1)
+    spread = polygon @ normals.T
+    widths = spread.max(axis=0) - spread.min(axis=0)
+    return angles[np.argmin(widths)]
+
+
+def lawnmower(polygon, spacing, angle=None):
+    """
+    Boustrophedon coverage of a polygon. Returns an (N, 2) array of
+    waypoints: passes spacing cm apart, alternating direction, each pass
+    clipped to the polygon. Concave polygons can give several segments
+    on one pass; they are flown in order along the pass.
+
+    Arguments
+        polygon: (M, 2) corners in order, e.g. from rectangle()
+        spacing: Distance between passes in cm
+        angle:   Sweep direction in radians, chosen automatically if None
+    """
+    polygon = np.asarray(polygon, dtype=float)
+    if spacing <= 0:
+        raise ValueError("Track spacing must be positive")
+    if angle is None:
+        angle = sweep_angle(polygon)
+
+    # Work in a frame where every pass is horizontal
+    rotate = _rotation(angle)
+    local = polygon @ rotate.T
+    low, high = local[:, 1].min(), local[:, 1].max()
+    count = max(1, int(np.ceil((high - low) / spacing)))
+    lines = low + (high - low - (count - 1) * spacing) / 2 + np.arange(count) * spacing
+
+    # Where every pass crosses every edge (NaN where it doesn't)
+    start = local
+    end = np.roll(local, -1, axis=0)
+    y1, y2 = start[:, 1], end[:, 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (lines[:, None] - y1[None, :]) / (y2 - y1)[None, :]
+        crossings = start[None, :, 0] + t * (end - start)[None, :, 0]
+    crosses = ((y1[None, :] <= lines[:, None]) & (lines[:, None] < y2[None, :])) | \
+              ((y2[None, :] <= lines[:, None]) & (lines[:, None] < y1[None, :]))
+    crossings = np.where(crosses, crossings, np.nan)
+
+    # Sort each pass left to right, odd passes right to left, NaNs last
+    direction = np.where(np.arange(count) % 2 == 0, 1.0, -1.0)[:, None]
+    crossings = np.sort(crossings * direction, axis=1) * direction
+
+    ys = np.broadcast_to(lines[:, None], crossings.shape)
+    points = np.stack([crossings, ys], axis=-1).reshape(-1, 2)
+    points = points[~np.isnan(points[:, 0])]
+    return points @ rotate
+
+
+def spiral(polygon, spacing, angle=None):
+    """
+    Inward rectangular spiral over a rectangle, in any orientation.
+    Returns an (N, 2) array of waypoints. Other shapes are rejected: the
+    spiral's rings would leave the area, and clipped rings would need
+    flights outside it to join them up. Use lawnmower() for those.
+    """
+    polygon = np.asarray(polygon, dtype=float)
+    if spacing <= 0:
+        raise ValueError("Track spacing must be positive")
+    if angle is None:
+        angle = sweep_angle(polygon)
+
+    rotate = _rotation(angle)
+    local = polygon @ rotate.T
+    (x0, y0), (x1, y1) = local.min(axis=0), local.max(axis=0)
+    box = (x1 - x0) * (y1 - y0)
+    if abs(area(polygon) - box) > 1e-6 * max(box, 1.0):
+        raise ValueError("Spiral surveys need a rectangular area, use the lawnmower pattern")
+    rings = max(1, int(np.ceil(min(x1 - x0, y1 - y0) / (2 * spacing))))
+    inset = spacing / 2 + np.arange(rings) * spacing
+    left, right = x0 + inset, x1 - inset
+    bottom, top = y0 + inset, y1 - inset
+    keep = (left <= right) & (bottom <= top)
+    left, right, bottom, top = left[keep], right[keep], bottom[keep], top[keep]
+
+    # Each ring: bottom-left, bottom-right, top-right, top-left, then down
+    # the left side to the next ring's bottom edge
+    corners = np.stack([
+        np.stack([left, bottom], axis=1),
+        np.stack([right, bottom], axis=1),
+        np.stack([right, top], axis=1),
+        np.stack([left, top], axis=1),
+        np.stack([left, bottom + spacing], axis=1),
+    ], axis=1).reshape(-1, 2)[:-1]
+    return simplify(corners) @ rotate
+
+
+def area(polygon):
+    """ Area of a simple polygon (shoelace formula) """
+    x, y = np.asarray(polygon, dtype=float).T
+    return abs(x @ np.roll(y, -1) - y @ np.roll(x, -1)) / 2
+
+
+def simplify(points):
+    """ Drop repeated points and points in the middle of a straight line """
+    points = np.asarray(points, dtype=float)
+    if len(points) < 2:
+        return points
+    moved = np.any(np.abs(np.diff(points, axis=0)) > EPSILON, axis=1)
+    points = points[np.concatenate([[True], moved])]
+    if len(points) < 3:
+        return points
+    before = points[1:-1] - points[:-2]
+    after = points[2:] - points[1:-1]
+    cross = before[:, 0] * after[:, 1] - before[:, 1] * after[:, 0]
+    dot = (before * after).sum(axis=1)
+    straight = (np.abs(cross) <= EPSILON * np.hypot(*before.T) * np.hypot(*after.T)) & (dot > 0)
+    return points[np.concatenate([[True], ~straight, [True]])]
+
+
+def split_sorties(points, budget, home=(0, 0)):
+    """
+    Cut a route into sorties whose total distance (home -> first point,
+    along the route, last point -> home) fits in budget cm. A sortie ends
+    exactly where the battery budget runs out, even mid-leg, and the next
+    one picks up from that point so nothing is left uncovered.
+    """
+    home = np.asarray(home, dtype=float)
+    points = np.asarray(points, dtype=float)
+    if len(points) == 0:
+        return []
+    to_home = np.hypot(*(points - home).T)
+    along = np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(points, axis=0).T))])
+    # Distance flown to reach a point plus the trip home from it. Each leg
+    # adds more to the first term than it can take off the second, so this
+    # never decreases and the furthest reachable point is a binary search.
+    reach = along + to_home
+
+    sorties = []
+    begin, begin_along, upcoming = points[0], 0.0, 1
+    while True:
+        allowed = budget - np.hypot(*(begin - home)) + begin_along
+        last = int(np.searchsorted(reach, allowed, side='right')) - 1
+        if last >= len(points) - 1:
+            sorties.append(simplify(np.vstack([begin, points[upcoming:]])))
+            return sorties
+
+        # Find the point on the next leg where the budget runs out: moving
+        # s cm from anchor must satisfy s + |anchor + s*u - home| = remaining
+        if last >= upcoming:
+            anchor, anchor_along, leg_end = points[last], along[last], points[last + 1]
+        else:
+            anchor, anchor_along, leg_end = begin, begin_along, points[upcoming]
+        remaining = allowed - anchor_along
+        offset = anchor - home
+        leg = leg_end - anchor
+        unit = leg / np.hypot(*leg)
+        denominator = 2 * (offset @ unit + remaining)
+        step = (remaining ** 2 - offset @ offset) / denominator if denominator > 0 else 0.0
+        if last < upcoming and step < 1:
+            raise ValueError(f"Sortie budget of {budget:.0f}cm is too small to fly "
+                             f"from ({begin[0]:.0f}, {begin[1]:.0f})")
+        cut = anchor + unit * step
+
+        sorties.append(simplify(np.vstack([begin, points[upcoming:last + 1], cut])))
+        begin, begin_along = cut, anchor_along + step
+        upcoming = max(upcoming, last + 1)
+
+#--------------------------- BEGIN SurveyPlan CLASS ----------------------------
+
+class SurveyPlan():
+    """ A coverage flight plan split into sorties that each start and end at home. """
+
+    def __init__(self, sorties, altitude, pattern, spacing, home=(0, 0)):
+        self.sorties = sorties
+        self.altitude = altitude
+        self.pattern = pattern
+        self.spacing = spacing
+        self.home = tuple(home)
+
+    def length(self, sortie=None):
+        """ Distance in cm flown for one sortie or the whole plan, including trips home """
+        routes = self.sorties if sortie is None else [self.sorties[sortie]]
+        total = 0.0
+        for route in routes:
+            path = np.vstack([self.home, route, self.home])
+            total += np.hypot(*np.diff(path, axis=0).T).sum()
+        return total
+
+    def turns(self):
+        """ Number of direction changes in the plan """
+        return sum(max(0, len(route) - 2) for route in self.sorties)
+
+    def commands(self):
+        """ Move commands needed when each leg is flown with discrete moves """
+        total = 0
+        for route in self.sorties:
+            legs = np.hypot(*np.diff(route, axis=0).T)
+            total += int(np.maximum(1, np.ceil(legs / MAX_LEG)).sum())
+        return total
+
+    def summary(self):
+        return (f"{self.pattern} at {self.altitude}cm, {self.spacing}cm spacing: "
+                f"{len(self.sorties)} sorties, {self.length():.0f}cm, "
+                f"{self.turns()} turns, {self.commands()} move commands")
+
+#---------------------------- END SurveyPlan CLASS -----------------------------
+
+
+def plan_survey(area, altitude, spacing, pattern='lawnmower', sortie_distance=None,
+                angle=None, home=(0, 0)):
+    """
+    Build a SurveyPlan over area (a polygon or rectangle() corners).
+
+    Arguments
+        area:            (M, 2) polygon corners in HeadsUpTello coordinates
+        altitude:        Survey height in cm
+        spacing:         Track spacing in cm
+        pattern:         'lawnmower' or 'spiral'
+        sortie_distance: cm one battery can fly, None keeps one sortie
+        angle:           Sweep direction in radians, automatic if None
+        home:            Where every sortie starts and ends
+    """
+    if pattern == 'lawnmower':
+        route = simplify(lawnmower(area, spacing, angle))
+    elif pattern == 'spiral':
+        route = spiral(area, spacing, angle)
+    else:
+        raise ValueError(f"Unknown survey pattern: {pattern}")
+
+    if sortie_distance is None:
+        sorties = [route]
+    else:
+        sorties = split_sorties(route, sortie_distance, home)
+    return SurveyPlan(sorties, altitude, pattern, spacing, home)
@@ -0,0 +1,16 @@
+import pytest
+
+
+class FakeClock():
+    """ A clock that only moves when told to, by setting now """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
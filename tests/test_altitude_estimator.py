@@ -0,0 +1,106 @@
+import random
+import pytest
+
+np = pytest.importorskip('numpy')
+from altitude_estimator import AltitudeEstimator, TELEMETRY_PERIOD, TOF_REACQUIRE
+
+GROUND_TOF = 10
+NO_RETURN = 6553
+
+
+def fly(estimator, seconds, height, drift_per_minute=0.0, tof=None, start=0.0, seed=1):
+    """
+    Feed telemetry for a flight profile. height(t) is the true altitude,
+    tof(t, height) overrides the ToF reading. Returns (time, true height,
+    estimate) at every packet.
+    """
+    noise = random.Random(seed)
+    history = []
+    steps = int(round(seconds / TELEMETRY_PERIOD))
+    for step in range(1, steps + 1):
+        now = start + step * TELEMETRY_PERIOD
+        truth = height(now)
+        climb = (height(now + 0.05) - height(now - 0.05)) / 0.1
+        baro = truth + drift_per_minute * now / 60 + noise.gauss(0, 10)
+        reading = truth + GROUND_TOF if tof is None else tof(now, truth)
+        vgz = -int(round(climb / 10))
+        estimator.update(baro, reading, vgz, now)
+        history.append((now, truth, estimator.altitude))
+    return history
+
+
+def started():
+    estimator = AltitudeEstimator(clock=lambda: 0.0)
+    estimator.start(0, GROUND_TOF)
+    return estimator
+
+
+def hover(altitude):
+    """ Take off at 60cm/s and hold altitude """
+    return lambda t: min(60 * t, altitude)
+
+
+def test_tof_pins_the_altitude_and_learns_the_baro_drift():
+    estimator = started()
+    history = fly(estimator, 60, hover(100), drift_per_minute=60)
+    assert estimator.altitude == pytest.approx(100, abs=2)
+    assert estimator.baro_drift == pytest.approx(60, abs=8)
+    assert estimator.drift_rate == pytest.approx(60, abs=20)
+    assert max(abs(truth - estimate) for _, truth, estimate in history[50:]) < 5
+
+
+def test_drift_is_carried_above_tof_range():
+    estimator = started()
+    fly(estimator, 60, hover(100), drift_per_minute=60)
+
+    # Climb out of ToF range and stay there for a while
+    def height(t):
+        return 100 + min(t - 60, 10) * 60
+
+    history = fly(estimator, 30, height, drift_per_minute=60, start=60,
+                  tof=lambda t, h: NO_RETURN if h > 500 else h + GROUND_TOF, seed=2)
+    errors = [abs(truth - estimate) for _, truth, estimate in history[-100:]]
+    # The raw barometer would be 60-90cm off by now
+    assert np.mean(errors) < 25
+
+
+def test_something_under_the_drone_is_ignored():
+    estimator = started()
+    fly(estimator, 10, hover(120))
+    assert estimator.tof_rejected == 0
+    # A table 80cm tall passes under for half a second
+    fly(estimator, 0.5, lambda t: 120, start=10, tof=lambda t, h: h + GROUND_TOF - 80)
+    assert estimator.altitude == pytest.approx(120, abs=5)
+    assert estimator.tof_rejected == 5
+    fly(estimator, 1, lambda t: 120, start=10.5)
+    assert estimator.tof_rejected == 5
+    assert estimator.tof_reacquired == 0
+
+
+def test_a_lasting_tof_jump_is_reacquired():
+    estimator = started()
+    fly(estimator, 10, hover(120))
+    # The floor really is 50cm lower from here (the drone flew off a step)
+    fly(estimator, 2, lambda t: 120, start=10, tof=lambda t, h: h + GROUND_TOF + 50)
+    assert estimator.tof_reacquired == 1
+    assert estimator.tof_rejected == TOF_REACQUIRE
+    assert estimator.altitude == pytest.approx(170, abs=3)
+
+
+def test_climb_rate_sign_and_extrapolation():
+    estimator = started()
+    fly(estimator, 5, lambda t: 40 * t)
+    assert estimator.climb_rate == pytest.approx(40, abs=5)
+    last = estimator.last_update
+    assert estimator.estimate(last + 0.5) == pytest.approx(estimator.altitude + 0.5 * estimator.climb_rate)
+    assert not estimator.due(last + 0.05)
+    assert estimator.due(last + 1.5 * TELEMETRY_PERIOD)
+
+
+def test_first_update_starts_the_filter():
+    estimator = AltitudeEstimator(clock=lambda: 0.0)
+    assert estimator.estimate() == 0.0
+    estimator.update(-30, GROUND_TOF, 0)
+    assert estimator.ground_tof == GROUND_TOF
+    assert estimator.baro_drift == -30
+    assert "tof used=0" in estimator.summary()
@@ -0,0 +1,170 @@
+import threading
+import time
+import pytest
+from command_executor import CommandExecutor, EMERGENCY, FLIGHT, MANEUVER
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def executor():
+    executor = CommandExecutor(debounce=0)
+    yield executor
+    executor.stop(timeout=5)
+
+
+def blocker(executor, lane=FLIGHT):
+    """ Occupy a worker until the returned event is set """
+    release = threading.Event()
+    started = threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(5)
+
+    executor.submit(f'hold {lane}', hold, lane=lane)
+    assert started.wait(5)
+    return release
+
+
+def test_runs_off_the_calling_thread_and_reports(executor):
+    done, threads = [], []
+    assert executor.submit('takeoff', lambda: threads.append(threading.get_ident()),
+                           lane=FLIGHT, on_done=done.append)
+    wait_until(lambda: done)
+    assert threads[0] != threading.get_ident()
+    action = done[0]
+    assert action.name == 'takeoff'
+    assert action.error is None
+    assert action.started >= action.submitted
+    assert not executor.busy()
+    assert executor.counts['completed'] == 1
+
+
+def test_failures_are_reported(executor):
+    done = []
+    executor.submit('flip f', lambda: 1 / 0, on_done=done.append)
+    wait_until(lambda: done)
+    assert isinstance(done[0].error, ZeroDivisionError)
+    assert executor.counts['failed'] == 1
+
+
+def test_repeats_are_debounced():
+    executor = CommandExecutor(debounce=10)
+    try:
+        assert executor.submit('flip f', lambda: None)
+        assert not executor.submit('flip f', lambda: None)
+        assert executor.counts['debounced'] == 1
+    finally:
+        executor.stop(timeout=5)
+
+
+def test_pending_copies_coalesce_and_full_lanes_reject(executor):
+    release = blocker(executor)
+    assert executor.submit('flip f', lambda: None)
+    assert not executor.submit('flip f', lambda: None)
+    assert executor.submit('flip b', lambda: None)
+    assert not executor.submit('flip l', lambda: None)
+    assert executor.counts['coalesced'] == 1
+    assert executor.counts['rejected'] == 1
+    assert executor.busy(MANEUVER)
+    release.set()
+    wait_until(lambda: not executor.busy())
+
+
+def test_flight_lane_runs_before_maneuvers(executor):
+    order = []
+    release = blocker(executor, MANEUVER)
+    executor.submit('flip f', order.append, 'flip')
+    executor.submit('land', order.append, 'land', lane=FLIGHT)
+    release.set()
+    wait_until(lambda: len(order) == 2)
+    assert order == ['land', 'flip']
+
+
+def test_emergency_jumps_the_queue(executor):
+    order = []
+    release = blocker(executor)
+    executor.submit('flip f', order.append, 'flip')
+    assert executor.emergency('emergency land', order.append, 'emergency')
+    # Runs on its own worker while the flight worker is still busy
+    wait_until(lambda: order == ['emergency'])
+    assert executor.counts['cancelled'] == 1
+    release.set()
+    wait_until(lambda: not executor.busy())
+    assert order == ['emergency']
+
+
+def test_new_actions_wait_out_an_emergency(executor):
+    release = blocker(executor, EMERGENCY)
+    assert not executor.submit('takeoff', lambda: None, lane=FLIGHT)
+    release.set()
+    wait_until(lambda: not executor.busy(EMERGENCY))
+    assert executor.submit('takeoff', lambda: None, lane=FLIGHT)
+
+
+def test_emergencies_are_never_debounced():
+    executor = CommandExecutor(debounce=10)
+    try:
+        ran = []
+        executor.emergency('emergency land', ran.append, 1)
+        wait_until(lambda: not executor.busy())
+        assert executor.emergency('emergency land', ran.append, 2)
+        wait_until(lambda: ran == [1, 2])
+    finally:
+        executor.stop(timeout=5)
+
+
+def test_stop_rejects_and_cancels():
+    executor = CommandExecutor(debounce=0)
+    release = blocker(executor)
+    executor.submit('flip f', lambda: None)
+    release.set()
+    executor.stop(timeout=5)
+    assert not executor.submit('takeoff', lambda: None, lane=FLIGHT)
+    assert "rejected=1" in executor.report()
+
+
+def test_emergency_land_does_not_wait_for_a_reply():
+    import simulator
+
+    def mission(hawk, settings):
+        hawk.takeoff()
+        hawk.enable_rc_shaping()
+        hawk.emergency_land()
+        return {'flying': hawk.drone.flying, 'stale': hawk.rc_shaper_stale}
+
+    outcome = simulator.run_mission(mission, {'seed': 1})
+    assert outcome['ok'], outcome.get('error')
+    assert not outcome['flying']
+    assert outcome['stale']
+
+
+def test_debounce_follows_the_given_clock():
+    now = [0.0]
+    executor = CommandExecutor(debounce=0.5, clock=lambda: now[0])
+    try:
+        assert executor.submit('flip f', lambda: None)
+        now[0] = 0.6
+        wait_until(lambda: not executor.busy())
+        assert executor.submit('flip f', lambda: None)
+    finally:
+        executor.stop(timeout=5)
+
+
+def test_settled_while_idle_or_waiting(executor):
+    waiting = set()
+    assert executor.settled(waiting.__contains__)
+    release = blocker(executor)
+    # Busy with something that isn't waiting on the replay clock
+    assert not executor.settled(waiting.__contains__)
+    waiting.add(executor.active[(FLIGHT, MANEUVER)])
+    assert executor.settled(waiting.__contains__)
+    release.set()
+    wait_until(lambda: executor.settled(set().__contains__))
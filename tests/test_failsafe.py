@@ -0,0 +1,136 @@
+import time
+import pytest
+import failsafe
+from failsafe import FailsafeSupervisor, HOVERING, IDLE, LANDING, WATCHING
+
+
+class FakeDrone():
+    def __init__(self):
+        self.rc = []
+        self.landings = 0
+
+    def send_rc_control(self, *values):
+        self.rc.append(values)
+
+    def land(self):
+        self.landings += 1
+
+
+def stopped_supervisor(clock, **options):
+    """ A supervisor whose thread is stopped so the test can drive its checks """
+    drone = FakeDrone()
+    supervisor = FailsafeSupervisor(drone, clock=clock, hover_after=0.5, land_after=3.0, **options)
+    supervisor.stop()
+    return supervisor, drone
+
+
+def check(supervisor, clock, at):
+    clock.now = at
+    supervisor._check(at)
+
+
+def test_disarmed_never_hovers(clock):
+    supervisor, drone = stopped_supervisor(clock)
+    check(supervisor, clock, 100.0)
+    assert supervisor.stage == IDLE
+    assert drone.rc == []
+
+
+def test_hovers_then_lands_when_the_loop_stalls(clock):
+    supervisor, drone = stopped_supervisor(clock)
+    supervisor.heartbeat()
+    check(supervisor, clock, 0.4)
+    assert supervisor.stage == WATCHING
+    check(supervisor, clock, 0.5)
+    assert supervisor.stage == HOVERING
+    assert drone.rc == [(0, 0, 0, 0)]
+
+    # The hover is repeated in case a packet went missing
+    check(supervisor, clock, 0.6)
+    assert len(drone.rc) == 1
+    check(supervisor, clock, 0.5 + failsafe.HOVER_REPEAT)
+    assert len(drone.rc) == 2
+
+    check(supervisor, clock, 3.0)
+    assert supervisor.stage == LANDING
+    assert drone.landings == 1
+    # Latched until the loop disarms
+    supervisor.heartbeat()
+    check(supervisor, clock, 3.1)
+    assert supervisor.stage == LANDING
+    supervisor.disarm()
+    check(supervisor, clock, 3.2)
+    assert supervisor.stage == IDLE
+    assert (supervisor.hovers, supervisor.landings) == (1, 1)
+
+
+def test_a_heartbeat_hands_control_back(clock):
+    supervisor, drone = stopped_supervisor(clock)
+    supervisor.heartbeat()
+    check(supervisor, clock, 0.6)
+    assert supervisor.stage == HOVERING
+    clock.now = 1.2
+    supervisor.heartbeat()
+    check(supervisor, clock, 1.25)
+    assert supervisor.stage == WATCHING
+    assert list(supervisor.stalls) == [pytest.approx(1.2)]
+    assert drone.landings == 0
+
+
+def test_hover_and_land_callables(clock):
+    hovers, landings = [], []
+    supervisor, drone = stopped_supervisor(clock, hover=lambda: hovers.append(1),
+                                           land=lambda: landings.append(1))
+    supervisor.heartbeat()
+    check(supervisor, clock, 0.5)
+    check(supervisor, clock, 3.0)
+    assert (hovers, landings, drone.rc, drone.landings) == ([1], [1], [], 0)
+
+
+def test_failing_commands_are_logged_not_raised(clock):
+    def broken():
+        raise OSError("no route to drone")
+
+    supervisor, _ = stopped_supervisor(clock, hover=broken, land=broken)
+    supervisor.heartbeat()
+    check(supervisor, clock, 0.5)
+    check(supervisor, clock, 3.0)
+    assert supervisor.stage == LANDING
+
+
+def test_supervisor_thread_reacts_in_time():
+    drone = FakeDrone()
+    supervisor = FailsafeSupervisor(drone, hover_after=0.05, land_after=10, period=0.005)
+    try:
+        supervisor.heartbeat()
+        deadline = time.monotonic() + 5
+        while not drone.rc and time.monotonic() < deadline:
+            time.sleep(0.005)
+        assert drone.rc[0] == (0, 0, 0, 0)
+        assert supervisor.response_bound() < 1.0
+        assert "hovers=1" in supervisor.report()
+    finally:
+        supervisor.stop()
+
+
+def test_shaping_restarts_from_rest_after_a_hover():
+    import simulator
+
+    def mission(hawk, settings):
+        hawk.takeoff()
+        hawk.enable_rc_shaping(max_accel=250, max_jerk=1500, expo=0)
+        for _ in range(30):
+            hawk.move(0, 100, 0, 0)
+            hawk.drone.clock.sleep(0.033)
+        cruising = hawk.drone.rc
+        hawk.hover()
+        hawk.drone.clock.sleep(2)
+        hawk.move(0, 100, 0, 0)
+        hawk.drone.clock.sleep(0.033)
+        hawk.move(0, 100, 0, 0)
+        return {'cruising': cruising, 'resumed': hawk.drone.rc}
+
+    outcome = simulator.run_mission(mission, {'seed': 1})
+    assert outcome['ok'], outcome.get('error')
+    assert outcome['cruising'][1] == 100
+    assert outcome['resumed'][1] < 10
@@ -0,0 +1,161 @@
+import threading
+import time
+import pytest
+
+np = pytest.importorskip('numpy')
+pygame = pytest.importorskip('pygame')
+from flight_recorder import (ReplayClock, ReplayException, ReplayTello, RecordingTello,
+                             SessionRecorder, load_session)
+
+
+class FakeDrone():
+    """ Just enough of a Tello to record """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.battery = 90
+        self.frame = None
+
+    def get_battery(self):
+        return self.battery
+
+    def takeoff(self):
+        self.clock.now += 2.0
+        return 'ok'
+
+    def flip(self, direction):
+        raise RuntimeError("battery too low for a flip")
+
+    def get_frame_read(self):
+        return self
+
+
+@pytest.fixture
+def session(tmp_path, clock):
+    """ Record a short session: 3 loop iterations with a takeoff, a failed flip and frames """
+    path = str(tmp_path / 'session.jsonl')
+    recorder = SessionRecorder(path, clock=clock)
+    drone = FakeDrone(clock)
+    tello = RecordingTello(drone, recorder)
+    reader = tello.get_frame_read()
+
+    recorder.write('loop', work=0.01)
+    recorder.record(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RSHIFT))
+    assert tello.get_battery() == 90
+    assert tello.get_battery() == 90
+    drone.frame = np.zeros((2, 2, 3), dtype=np.uint8)
+    reader.frame
+    reader.frame
+    assert tello.takeoff() == 'ok'
+
+    clock.now = 2.5
+    recorder.write('loop', work=0.02)
+    drone.battery = 89
+    tello.get_battery()
+    with pytest.raises(RuntimeError):
+        tello.flip('f')
+    drone.frame = drone.frame.copy()
+    reader.frame
+
+    clock.now = 3.0
+    recorder.write('loop', work=0.01)
+    recorder.close()
+    assert tello.calls == {'get_battery': 3, 'takeoff': 1, 'flip': 1}
+    return path
+
+
+def test_recording_logs_changes_commands_and_frames(session):
+    entries = load_session(session)
+    assert [entry['value'] for entry in entries['telemetry']] == [90, 89]
+    takeoff, flip = entries['command']
+    assert (takeoff['name'], takeoff['result'], takeoff['duration'], takeoff['error']) == ('takeoff', 'ok', 2.0, None)
+    assert flip['args'] == ['f']
+    assert 'battery too low' in flip['error']
+    assert [entry['t'] for entry in entries['frame']] == [0.0, 2.5]
+    assert [entry['t'] for entry in entries['loop']] == [0.0, 2.5, 3.0]
+    assert [entry['type'] for entry in entries['input']] == ['down']
+
+
+def test_replay_answers_like_the_recording(session):
+    drone = ReplayTello(session, deterministic=True)
+    clock = drone.clock
+    reader = drone.get_frame_read()
+    assert clock.advance()
+    assert drone.get_battery() == 90
+    first = reader.frame
+    assert first is not None
+    # On the stepping thread a command's duration doesn't hold the loop up
+    assert drone.takeoff() == 'ok'
+
+    assert clock.advance()
+    assert clock.time() == 2.5
+    assert drone.get_battery() == 89
+    assert reader.frame is not first
+    with pytest.raises(ReplayException):
+        drone.flip('f')
+    assert drone.land() is None
+    assert drone.unmatched == {'land': 1}
+
+    assert clock.advance()
+    assert not clock.advance()
+    assert "takeoff" in drone.report()
+
+
+def test_deterministic_sleep_on_another_thread_waits_for_the_loop():
+    clock = ReplayClock([0.0, 1.0, 2.0, 3.0], deterministic=True)
+    clock.advance()
+    woke = threading.Event()
+
+    def command():
+        clock.sleep(1.5)
+        woke.set()
+
+    threading.Thread(target=command, daemon=True).start()
+    clock.advance()
+    assert not woke.wait(0.1)
+    clock.advance()
+    assert woke.wait(5)
+
+
+def test_deterministic_sleepers_wake_when_the_recording_ends():
+    clock = ReplayClock([0.0], deterministic=True)
+    clock.advance()
+    woke = threading.Event()
+    threading.Thread(target=lambda: (clock.sleep(10), woke.set()), daemon=True).start()
+    assert not clock.advance()
+    assert woke.wait(5)
+
+
+def test_real_time_replay_runs_at_speed():
+    clock = ReplayClock([0.0, 100.0], speed=50)
+    time.sleep(0.05)
+    assert 2.0 <= clock.time() < 10
+    assert clock.advance()
+    started = time.perf_counter()
+    clock.sleep(5)
+    assert time.perf_counter() - started < 1
+
+
+def test_deterministic_replay_reproduces_a_recorded_session(tmp_path):
+    import collections
+    import os
+    import subprocess
+    import sys
+    station = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pygame_test.py')
+    (tmp_path / 'flight.txt').write_text("0.3 tap shift\n1.0 down w\n1.5 up w\n1.6 tap 1\n2.4 tap shift\n")
+    common = [sys.executable, station, '--headless', '--no-render']
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(station))
+    subprocess.run(common + ['--simulator', '--script', 'flight.txt', '--duration', '3.5',
+                             '--record-session', 'recorded.jsonl'],
+                   cwd=tmp_path, env=env, check=True, capture_output=True, timeout=60)
+    subprocess.run(common + ['--replay-session', 'recorded.jsonl', '--deterministic',
+                             '--record-session', 'replayed.jsonl'],
+                   cwd=tmp_path, env=env, check=True, capture_output=True, timeout=60)
+
+    recorded, replayed = (load_session(str(tmp_path / name)) for name in ('recorded.jsonl', 'replayed.jsonl'))
+    assert len(replayed['loop']) == len(recorded['loop'])
+    assert len(replayed['frame']) == len(recorded['frame']) > 0
+    counts = [collections.Counter(entry['name'] for entry in session['command'])
+              for session in (recorded, replayed)]
+    assert counts[0]['send_rc_control'] > 0
+    assert counts[1] == counts[0]
@@ -0,0 +1,99 @@
+import time
+import pytest
+
+np = pytest.importorskip('numpy')
+from frame_ring import FrameRing, SharedFrameRead, ring_size, ALIGN, LATEST, DECODED
+
+
+def image(value, height=4, width=6):
+    return np.full((height, width, 3), value, dtype=np.uint8)
+
+
+def new_ring(slots=4, slot_bytes=4 * 6 * 3):
+    return FrameRing(bytearray(ring_size(slots, slot_bytes)), slots, slot_bytes)
+
+
+def test_write_then_view_without_copying():
+    ring = new_ring()
+    seq = ring.write(image(7), 123)
+    frame, stamp = ring.view(seq)
+    assert seq == 1
+    assert stamp == 123
+    assert frame.shape == (4, 6, 3)
+    assert (frame == 7).all()
+    assert np.shares_memory(frame, ring.pixels)
+    assert (ring.header[LATEST], ring.header[DECODED]) == (1, 1)
+
+
+def test_slots_hold_smaller_frames():
+    ring = new_ring()
+    seq = ring.write(image(1, height=2, width=3), 0)
+    assert ring.view(seq)[0].shape == (2, 3, 3)
+    with pytest.raises(ValueError):
+        ring.write(image(1, height=8, width=8), 0)
+
+
+def test_frames_are_overwritten_after_a_lap():
+    ring = new_ring(slots=4)
+    first = ring.write(image(1), 0)
+    for value in range(2, 5):
+        ring.write(image(value), 0)
+    assert ring.valid(first)
+    ring.write(image(5), 0)
+    assert not ring.valid(first)
+    assert ring.view(first) == (None, None)
+
+
+def test_second_view_shares_the_layout():
+    buffer = bytearray(ring_size(4, 72))
+    writer = FrameRing(buffer, 4, 72)
+    seq = writer.write(image(9), 55)
+    reader = FrameRing(buffer)
+    assert (reader.slots, reader.slot_bytes) == (4, 72)
+    frame, stamp = reader.view(seq)
+    assert (frame == 9).all() and stamp == 55
+
+
+def test_pixels_are_cache_line_aligned():
+    ring = new_ring(slots=3)
+    base = np.frombuffer(ring.pixels.base, dtype=np.uint8).ctypes.data
+    assert (ring.pixels.ctypes.data - base) % ALIGN == 0
+
+
+@pytest.fixture
+def h264(tmp_path):
+    """ A short H.264 stream, 30 frames that get brighter """
+    av = pytest.importorskip('av')
+    path = str(tmp_path / 'test.h264')
+    output = av.open(path, 'w', format='h264')
+    stream = output.add_stream('libx264', rate=30)
+    stream.width, stream.height, stream.pix_fmt = 320, 240, 'yuv420p'
+    for index in range(30):
+        frame = av.VideoFrame.from_ndarray(image(index * 8, 240, 320), format='rgb24')
+        for packet in stream.encode(frame):
+            output.mux(packet)
+    for packet in stream.encode():
+        output.mux(packet)
+    output.close()
+    return path
+
+
+def test_decodes_out_of_process(h264):
+    reader = SharedFrameRead(h264, slots=4, width=320, height=240)
+    try:
+        deadline = time.monotonic() + 20
+        while reader.decoded() < 30 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert reader.decoded() == 30
+        seq, stamp, frame = reader.read()
+        assert seq == 30
+        assert frame.shape == (240, 320, 3)
+        assert not frame.flags.writeable
+        # Stamped on arrival, in this process's perf_counter seconds
+        assert 0 < time.perf_counter() - stamp < 20
+        assert reader.valid()
+        assert reader.frame is frame
+    finally:
+        reader.stop()
+    assert reader.decoded() == 30
+    assert not reader.valid()
@@ -0,0 +1,70 @@
+import json
+import pytest
+
+pygame = pytest.importorskip('pygame')
+import headless
+
+
+def test_parse_command():
+    assert headless.parse_command("down w") == [(pygame.KEYDOWN, pygame.K_w)]
+    assert headless.parse_command("up UP") == [(pygame.KEYUP, pygame.K_UP)]
+    assert headless.parse_command("tap shift  # takeoff") == [
+        (pygame.KEYDOWN, pygame.K_RSHIFT), (pygame.KEYUP, pygame.K_RSHIFT)]
+    assert headless.parse_command("   # just a comment") == []
+
+
+def test_parse_command_rejects_unknown():
+    with pytest.raises(ValueError):
+        headless.parse_command("hold w")
+    with pytest.raises(KeyError):
+        headless.parse_command("down f12")
+
+
+def test_scripted_input_times_from_first_poll(tmp_path):
+    script = tmp_path / 'flight.txt'
+    script.write_text("2.0 up w\n0.0 tap shift\n\n1.0 down w  # forward\n")
+    source = headless.ScriptedInput(str(script))
+
+    events = source.poll(100.0)
+    assert [(event.type, event.key) for event in events] == [
+        (pygame.KEYDOWN, pygame.K_RSHIFT), (pygame.KEYUP, pygame.K_RSHIFT)]
+    assert source.poll(100.5) == []
+    assert [event.key for event in source.poll(101.0)] == [pygame.K_w]
+    assert not source.finished()
+    assert [event.type for event in source.poll(103.0)] == [pygame.KEYUP]
+    assert source.finished()
+
+
+def test_recorded_input_replays(tmp_path):
+    log = tmp_path / 'input.jsonl'
+    recorder = headless.InputRecorder(str(log))
+    recorder.record(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_w), 10.0)
+    recorder.record(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_F12), 10.5)
+    recorder.record(pygame.event.Event(pygame.KEYUP, key=pygame.K_w), 11.0)
+    recorder.close()
+
+    entries = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [(entry['t'], entry['type']) for entry in entries] == [(0.0, 'down'), (1.0, 'up')]
+
+    replay = headless.ReplayInput(str(log), speed=2.0, start=0.0)
+    assert [event.type for event in replay.poll(0.0)] == [pygame.KEYDOWN]
+    assert [event.type for event in replay.poll(0.5)] == [pygame.KEYUP]
+
+
+def test_loop_timer(clock):
+    timer = headless.LoopTimer(report_interval=1.0, clock=clock)
+    timer.set_budget(10)
+    for work in (0.05, 0.15, 0.05):
+        timer.begin()
+        clock.now += work
+        timer.end()
+        clock.now += 0.2 - work
+
+    assert timer.iterations == 3
+    assert timer.overruns == 1
+    assert list(timer.periods) == pytest.approx([0.2, 0.2])
+    assert not timer.due()
+    clock.now += 0.5
+    assert timer.due()
+    assert timer.report().startswith("loops=3 rate=2.7/s overruns=1")
+    assert not timer.due()
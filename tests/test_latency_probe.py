@@ -0,0 +1,69 @@
+import time
+import pytest
+
+np = pytest.importorskip('numpy')
+import latency_probe
+from latency_probe import (LatencyRecorder, SyntheticFrameRead, TIMESTAMP_BITS,
+                           decode_timestamp, displayed_frame, encode_timestamp)
+
+
+def blank(height=720, width=960):
+    return np.full((height, width, 3), 90, dtype=np.uint8)
+
+
+def test_timestamp_round_trip():
+    for ms in (0, 1, 123456789, (1 << TIMESTAMP_BITS) - 1):
+        assert decode_timestamp(encode_timestamp(blank(), ms)) == ms
+
+
+def test_frames_without_a_timestamp():
+    assert decode_timestamp(blank()) is None
+    assert decode_timestamp(blank(8, 8)) is None
+
+
+def test_timestamp_survives_lossy_compression():
+    cv2 = pytest.importorskip('cv2')
+    ok, jpeg = cv2.imencode('.jpg', encode_timestamp(blank(), 987654321), [cv2.IMWRITE_JPEG_QUALITY, 30])
+    assert ok
+    assert decode_timestamp(cv2.imdecode(jpeg, cv2.IMREAD_COLOR)) == 987654321
+
+
+def test_displayed_frame_undoes_the_display_rotation():
+    frame = np.arange(4 * 6 * 3, dtype=np.uint16).reshape(4, 6, 3)
+    # The camera thread rotates 90 degrees counterclockwise and the display
+    # loop makes a surface of that array, which surfarray reads back as is
+    pixels = np.rot90(frame)
+    assert np.array_equal(displayed_frame(pixels), frame)
+
+
+def test_recorder_stages_and_end_to_end():
+    recorder = LatencyRecorder()
+    timeline = {'decode': 10.0, 'rotate': 10.002, 'queue': 10.010, 'surface': 10.013, 'flip': 10.020}
+    recorder.record(timeline, flipped_wall_ms=5050, encoded_ms=5000)
+    recorder.record({'decode': 1.0})
+
+    assert recorder.frames == 1
+    assert recorder.stages['queue'][0] == pytest.approx(0.008)
+    assert recorder.pipeline[0] == pytest.approx(0.020)
+    assert recorder.end_to_end[0] == pytest.approx(0.050)
+    assert recorder.before_decode[0] == pytest.approx(0.030)
+    assert "total" in recorder.report()
+
+
+def test_recorder_handles_timestamp_wraparound():
+    recorder = LatencyRecorder()
+    timeline = dict.fromkeys(latency_probe.STAGES, 0.0)
+    recorder.record(timeline, flipped_wall_ms=10, encoded_ms=(1 << TIMESTAMP_BITS) - 30)
+    assert recorder.end_to_end[0] == pytest.approx(0.040)
+
+
+def test_synthetic_frames_carry_the_wall_clock():
+    reader = SyntheticFrameRead(width=640, height=480, fps=60)
+    try:
+        deadline = time.monotonic() + 2
+        while reader.frame is None and time.monotonic() < deadline:
+            time.sleep(0.005)
+        age = latency_probe.wall_clock_ms() - decode_timestamp(reader.frame)
+        assert 0 <= age < 500
+    finally:
+        reader.stop()
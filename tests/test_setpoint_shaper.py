@@ -0,0 +1,74 @@
+import pytest
+from setpoint_shaper import AxisShaper, SetpointShaper, MAX_STEP
+
+
+def run(shaper, target, dt, seconds):
+    values = []
+    for _ in range(int(round(seconds / dt))):
+        values.append(shaper.step(target, dt))
+    return values
+
+
+def test_step_reaches_target_within_limits_without_overshoot():
+    dt = 0.01
+    shaper = AxisShaper(max_accel=250, max_jerk=1500)
+    values = run(shaper, 100, dt, 1.5)
+    assert values[-1] == 100
+    assert max(values) == 100
+    accels = [(b - a) / dt for a, b in zip([0.0] + values, values)]
+    assert max(accels) <= 250 + 1e-6
+    jerks = [(b - a) / dt for a, b in zip([0.0] + accels, accels)]
+    assert max(jerks[:-1]) <= 1500 + 1e-6
+    # Ramp up and down the jerk plus cruise at max_accel, about 0.57s
+    assert 0.45 < values.index(100) * dt < 0.8
+
+
+def test_metrics_do_not_depend_on_loop_rate():
+    results = []
+    for dt in (0.01, 0.05):
+        shaper = AxisShaper(max_accel=250, max_jerk=1500)
+        run(shaper, 100, dt, 1.5)
+        run(shaper, 0, dt, 1.5)
+        results.append(shaper)
+    fast, slow = results
+    assert fast.total_change == pytest.approx(slow.total_change)
+    assert fast.travel == pytest.approx(slow.travel, rel=0.1)
+    assert len(fast.settling_times) == len(slow.settling_times) == 2
+    assert fast.settling_times == pytest.approx(slow.settling_times, abs=0.1)
+    assert fast.peak_accel == pytest.approx(slow.peak_accel, rel=0.1)
+
+
+def test_expo_softens_small_inputs_only():
+    shaper = AxisShaper(max_accel=250, max_jerk=1500, expo=0.5)
+    assert shaper.apply_expo(100) == 100
+    assert shaper.apply_expo(-100) == -100
+    assert shaper.apply_expo(50) < 50
+    assert shaper.apply_expo(-50) == -shaper.apply_expo(50)
+    assert shaper.apply_expo(150) == 100
+
+
+def test_long_gaps_are_clamped():
+    shaper = AxisShaper(max_accel=250, max_jerk=1500)
+    shaper.step(100, 5.0)
+    assert shaper.elapsed == MAX_STEP
+
+
+def test_setpoint_shaper_per_axis_limits_and_reset():
+    shaper = SetpointShaper(max_accel=100, expo=0.0, yaw={'max_accel': 1000})
+    for _ in range(10):
+        output = shaper.step((100, 100, 100, 100), 0.02)
+    assert all(isinstance(value, int) for value in output)
+    assert output[3] > output[0] == output[1] == output[2]
+
+    shaper.reset()
+    assert shaper.step((0, 0, 0, 0), 0.02) == (0, 0, 0, 0)
+    assert "settle_median" in shaper.report()
+
+
+def test_setpoint_shaper_records_the_raw_inputs():
+    shaper = SetpointShaper()
+    shaper.step((0, 50, 0, 0), 0)
+    for _ in range(3):
+        shaper.step((0, 50, 0, 0), 0.02)
+    shaper.step((0, 0, 0, 0), 5.0)
+    assert shaper.inputs == [[(0, 50, 0, 0), pytest.approx(0.06)], [(0, 0, 0, 0), MAX_STEP]]
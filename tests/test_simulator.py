@@ -0,0 +1,187 @@
+import time
+import pytest
+import simulator
+from simulator import RealTimeClock, SimulatedTello, SimulatorException, VirtualClock
+
+
+def test_virtual_clock_steps_listeners_through_a_sleep():
+    clock = VirtualClock()
+    steps = []
+    clock.listeners.append(steps.append)
+    clock.sleep(0.05)
+    clock.sleep(0)
+    assert clock.time() == pytest.approx(0.05)
+    assert sum(steps) == pytest.approx(0.05)
+    assert max(steps) <= simulator.STEP
+
+
+def test_real_time_clock_keeps_the_drone_flying():
+    clock = RealTimeClock()
+    steps = []
+    clock.listeners.append(steps.append)
+    time.sleep(0.1)
+    assert sum(steps) > 0.05
+    assert clock.time() == pytest.approx(sum(steps), abs=1e-6)
+
+
+def test_moves_follow_the_heading():
+    drone = SimulatedTello(seed=1)
+    drone.takeoff()
+    drone.move_forward(100)
+    drone.rotate_clockwise(90)
+    drone.move_forward(50)
+    assert (drone.x, drone.y) == pytest.approx((50, 100))
+    assert drone.get_yaw() == 90
+    assert drone.distance == pytest.approx(150)
+    # Blocking commands take as long as the real drone would
+    assert drone.clock.time() > 150 / drone.speed
+
+
+def test_invalid_commands_raise():
+    drone = SimulatedTello(seed=1)
+    with pytest.raises(SimulatorException):
+        drone.move_up(100)
+    drone.takeoff()
+    with pytest.raises(SimulatorException):
+        drone.move_up(10)
+    with pytest.raises(SimulatorException):
+        drone.move_up(600)
+    drone.battery = 40
+    with pytest.raises(SimulatorException):
+        drone.flip('f')
+
+
+def test_rc_flight_and_telemetry_units():
+    drone = SimulatedTello(seed=1, baro_noise=0)
+    drone.takeoff()
+    drone.send_rc_control(0, 50, 0, 0)
+    drone.clock.sleep(3)
+    assert drone.vy == pytest.approx(50, abs=1)
+    # dm/s, vgx along the nose
+    assert drone.get_speed_x() == 5
+    assert drone.get_speed_y() == 0
+    assert drone.get_height() == simulator.TAKEOFF_HEIGHT
+    assert drone.get_barometer() == drone.barometer + simulator.TAKEOFF_HEIGHT
+
+
+def test_wind_leaks_through_position_hold():
+    drone = SimulatedTello(seed=1, wind=(100, 0), wind_rejection=0.9)
+    drone.takeoff()
+    start = drone.x
+    drone.clock.sleep(2)
+    assert drone.x - start == pytest.approx(20, abs=1)
+
+
+def test_land_without_a_reply():
+    drone = SimulatedTello(seed=1)
+    drone.takeoff()
+    drone.send_rc_control(0, 50, 0, 0)
+    drone.send_command_without_return('land')
+    assert not drone.flying
+    assert drone.get_height() == 0
+    assert drone.rc == (0, 0, 0, 0)
+    with pytest.raises(SimulatorException):
+        drone.send_command_without_return('flip f')
+
+
+def test_expand_grid():
+    grid = simulator.expand_grid({'speed': [20, 40], 'seed': [0, 1, 2]})
+    assert len(grid) == 6
+    assert grid[0] == {'speed': 20, 'seed': 0}
+    assert grid[-1] == {'speed': 40, 'seed': 2}
+
+
+def straight_flight(hawk, settings):
+    hawk.takeoff()
+    hawk.drone.set_speed(settings['speed'])
+    hawk.drone.move_forward(200)
+    hawk.land()
+    return {'landed': not hawk.drone.flying}
+
+
+def test_run_mission_reports_the_outcome():
+    outcome = simulator.run_mission(straight_flight, {'speed': 50, 'seed': 1})
+    assert outcome['ok'], outcome.get('error')
+    assert outcome['landed']
+    assert outcome['distance'] == pytest.approx(200)
+    assert outcome['battery_used'] > 0
+    assert outcome['commands'] >= 3
+
+
+def test_run_mission_catches_failures():
+    outcome = simulator.run_mission(straight_flight, {'speed': 500, 'seed': 1})
+    assert not outcome['ok']
+    assert 'out of range' in outcome['error']
+
+
+def test_sweep_keeps_grid_order_and_speed_matters():
+    results = simulator.sweep(simulator.waypoint_mission,
+                              {'speed': [30, 60], 'seed': [1]}, processes=1)
+    assert [result['speed'] for result in results] == [30, 60]
+    assert all(result['ok'] and result['arrived'] for result in results)
+    assert results[0]['sim_seconds'] > results[1]['sim_seconds']
+
+
+def test_process_pool_sweep_matches_the_serial_run():
+    # The pool has to pickle the mission, settings and outcomes
+    grid = {'speed': [30, 60], 'wind': [(0, 0), (50, 0)], 'seed': [1]}
+    pooled = simulator.sweep(simulator.waypoint_mission, grid, processes=2, chunksize=1)
+    serial = simulator.sweep(simulator.waypoint_mission, grid, processes=1)
+
+    def comparable(result):
+        return {key: value for key, value in result.items() if key != 'cpu_seconds'}
+    assert [comparable(result) for result in pooled] == [comparable(result) for result in serial]
+    assert all(result['ok'] for result in pooled)
+
+
+def test_climb_to_ceiling_gives_up_without_progress():
+    def mission(hawk, settings):
+        hawk.takeoff()
+        # A climb that never happens, like a fused altitude that won't converge
+        hawk.drone.move_up = lambda distance: None
+        before = sum(hawk.drone.commands.values())
+        hawk.flyto_mission_ceiling()
+        return {'sent': sum(hawk.drone.commands.values()) - before}
+
+    outcome = simulator.run_mission(mission, {'seed': 1, 'baro_noise': 0})
+    assert outcome['ok'], outcome.get('error')
+    assert outcome['sent'] <= 3
+
+
+def test_second_order_response_overshoots():
+    drone = SimulatedTello(response_damping=0.5)
+    drone.takeoff()
+    drone.send_rc_control(0, 50, 0, 0)
+    speeds = []
+    for _ in range(200):
+        drone.clock.sleep(simulator.STEP)
+        speeds.append(drone.body_velocity()[1])
+    assert max(speeds) > 55
+    assert speeds[-1] == pytest.approx(50, abs=3)
+
+
+def test_step_response_measures_overshoot_and_settling():
+    response = simulator.StepResponse(axes=1, band=5)
+    response.command(0.0, [50])
+    for t, velocity in [(0.5, 40), (1.0, 58), (1.5, 53), (2.0, 50)]:
+        response.sample(t, [velocity])
+    response.command(3.0, [0])
+    response.finish()
+    assert response.overshoots == [8, 0]
+    assert response.settling_times == [1.0, 0.0]
+
+
+def test_shaping_reduces_overshoot_and_energy():
+    inputs = [[(0, 0, 0, 0), 1.0], [(0, 50, 0, 0), 3.0], [(0, 0, 0, 0), 3.0],
+              [(60, 0, 0, 0), 2.0], [(-60, 0, 0, 0), 2.0], [(0, 0, 0, 0), 3.0]]
+    comparison = simulator.compare_shaping(inputs, {'max_accel': 100, 'max_jerk': 300})
+    unshaped, shaped = comparison['unshaped'], comparison['shaped']
+    assert unshaped['ok'] and shaped['ok']
+    assert len(shaped['overshoots']) == len(unshaped['overshoots']) == 5
+    assert max(shaped['overshoots']) < max(unshaped['overshoots'])
+    assert sum(shaped['overshoots']) < sum(unshaped['overshoots'])
+    assert shaped['battery_used'] < unshaped['battery_used']
+    # Same inputs, so the unshaped run differs only by the limits
+    assert unshaped['commands'] == shaped['commands']
+    report = simulator.shaping_report(comparison)
+    assert report.startswith("unshaped: battery_used=") and "\nshaped: " in report
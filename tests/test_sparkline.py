@@ -0,0 +1,67 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pygame = pytest.importorskip('pygame')
+from sparkline import Sparkline
+
+
+def column_rows(graph, column):
+    """ Rows drawn in the line color in one column """
+    return np.flatnonzero((graph.pixels[column] == graph.color).all(axis=1)).tolist()
+
+
+def test_fixed_range_rows():
+    graph = Sparkline(width=10, height=11, seconds=10, low=0, high=100)
+    graph.update(100, 0.0)
+    assert column_rows(graph, 9) == [0]
+    graph.update(0, 1.0)
+    # Joined to the previous value with a vertical segment
+    assert column_rows(graph, 9) == list(range(11))
+    assert column_rows(graph, 8) == [0]
+
+
+def test_no_scroll_within_a_column():
+    graph = Sparkline(width=10, height=11, seconds=10, low=0, high=100)
+    graph.update(50, 0.0)
+    graph.update(100, 0.5)
+    assert column_rows(graph, 9) == [5]
+    assert graph.latest == 100
+
+
+def test_incremental_drawing_matches_a_full_redraw():
+    graph = Sparkline(width=40, height=20, seconds=4, low=0, high=100)
+    values = 50 + 40 * np.sin(np.arange(60) / 5)
+    for step, value in enumerate(values):
+        graph.update(value, step * 0.1)
+    drawn = graph.pixels.copy()
+    graph._redraw()
+    # Column 0 may still show its join to a value that has scrolled off
+    assert np.array_equal(drawn[1:], graph.pixels[1:])
+
+
+def test_range_widens_to_fit():
+    graph = Sparkline(width=10, height=11, seconds=10, min_span=20)
+    graph.update(100, 0.0)
+    assert (graph.low, graph.high) == (90, 110)
+    graph.update(150, 1.0)
+    assert graph.high >= 150
+    assert column_rows(graph, 9)[0] == pytest.approx(0, abs=1)
+
+
+def test_stalled_loop_holds_the_last_value():
+    graph = Sparkline(width=10, height=11, seconds=10, low=0, high=100)
+    graph.update(0, 0.0)
+    graph.update(100, 4.0)
+    assert graph.values[-5:-1].tolist() == [0, 0, 0, 0]
+    assert graph.values[-1] == 100
+    graph.update(50, 100.0)
+    assert not np.isnan(graph.values).any()
+
+
+def test_draw_blits_once_per_change():
+    screen = pygame.Surface((100, 100))
+    graph = Sparkline(width=10, height=11, seconds=10, low=0, high=100)
+    graph.update(100, 0.0)
+    graph.draw(screen, (5, 5))
+    assert not graph.dirty
+    assert screen.get_at((14, 5))[:3] != (0, 0, 0)
@@ -0,0 +1,29 @@
+from stats import percentile, summarize
+
+
+def test_percentile_nearest_rank():
+    ordered = list(range(101))
+    assert percentile(ordered, 0.0) == 0
+    assert percentile(ordered, 0.5) == 50
+    assert percentile(ordered, 0.95) == 95
+    assert percentile(ordered, 1.0) == 100
+
+
+def test_percentile_empty():
+    assert percentile([], 0.5) == 0.0
+
+
+def test_summarize_milliseconds():
+    text = summarize([0.003, 0.001, 0.002])
+    assert text == "p50=2.00ms p95=3.00ms p99=3.00ms max=3.00ms"
+
+
+def test_summarize_no_samples():
+    assert summarize([]) == "no samples"
+
+
+def test_stats_does_not_import_pygame():
+    import subprocess
+    import sys
+    code = "import sys, stats; sys.exit('pygame' in sys.modules)"
+    assert subprocess.run([sys.executable, '-c', code]).returncode == 0
@@ -0,0 +1,147 @@
+import math
+import pytest
+
+np = pytest.importorskip('numpy')
+import survey
+
+L_SHAPE = np.array([[0, 0], [600, 0], [600, 200], [200, 200], [200, 600], [0, 600]], dtype=float)
+
+
+def inside(polygon, points, slack=1e-6):
+    """ True if every point is inside or on the edge of the polygon """
+    polygon = np.asarray(polygon, dtype=float)
+    for x, y in points:
+        crossings = 0
+        for (x1, y1), (x2, y2) in zip(polygon, np.roll(polygon, -1, axis=0)):
+            # On an edge counts as inside
+            cross = (x2 - x1) * (y - y1) - (y2 - y1) * (x - x1)
+            if abs(cross) <= slack * math.hypot(x2 - x1, y2 - y1) and \
+                    min(x1, x2) - slack <= x <= max(x1, x2) + slack and \
+                    min(y1, y2) - slack <= y <= max(y1, y2) + slack:
+                break
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                crossings += 1
+        else:
+            if crossings % 2 == 0:
+                return False
+    return True
+
+
+def route_length(points):
+    return np.hypot(*np.diff(points, axis=0).T).sum()
+
+
+def test_lawnmower_rectangle_passes():
+    route = survey.lawnmower(survey.rectangle(0, 0, 1000, 400), 100)
+    # Passes run along the long side, 100cm apart and centred
+    assert np.allclose(np.unique(np.round(route[:, 1])), [50, 150, 250, 350])
+    assert np.allclose(route[:4], [[0, 50], [1000, 50], [1000, 150], [0, 150]])
+    assert inside(survey.rectangle(0, 0, 1000, 400), route)
+
+
+def test_sweep_angle_runs_along_the_long_side():
+    angle = survey.sweep_angle(survey.rectangle(0, 0, 200, 1000))
+    assert abs(math.cos(angle)) < 1e-9
+
+
+def test_lawnmower_concave_area_stays_inside():
+    route = survey.lawnmower(L_SHAPE, 50, angle=0.0)
+    assert inside(L_SHAPE, route)
+    # Passes above the notch only cover the narrow arm
+    assert route[route[:, 1] > 200][:, 0].max() == pytest.approx(200)
+
+
+def test_spiral_covers_a_rotated_rectangle_inside_it():
+    corners = np.array([[0, 0], [300, 300], [0, 600], [-300, 300]], dtype=float)
+    route = survey.spiral(corners, 100)
+    assert len(route) > 4
+    assert inside(corners, route)
+
+
+def test_spiral_rejects_other_shapes():
+    with pytest.raises(ValueError):
+        survey.spiral(L_SHAPE, 100)
+    with pytest.raises(ValueError):
+        survey.plan_survey([[0, 0], [400, 0], [0, 300]], 100, 100, 'spiral')
+
+
+def test_bad_arguments():
+    with pytest.raises(ValueError):
+        survey.lawnmower(L_SHAPE, 0)
+    with pytest.raises(ValueError):
+        survey.plan_survey(L_SHAPE, 100, 100, 'zigzag')
+
+
+def test_area():
+    assert survey.area(L_SHAPE) == pytest.approx(600 * 200 + 200 * 400)
+
+
+def test_simplify_drops_repeats_and_straight_runs():
+    points = [[0, 0], [0, 0], [100, 0], [200, 0], [200, 100], [200, 100]]
+    assert np.allclose(survey.simplify(points), [[0, 0], [200, 0], [200, 100]])
+    # Doubling back is a turn, not a straight run
+    assert len(survey.simplify([[0, 0], [100, 0], [0, 0]])) == 3
+
+
+def test_sorties_fit_the_budget_and_cover_the_route():
+    route = survey.simplify(survey.lawnmower(survey.rectangle(100, 100, 1100, 700), 100))
+    home = (0, 0)
+    sorties = survey.split_sorties(route, 4000, home)
+    assert len(sorties) > 1
+    for sortie in sorties:
+        path = np.vstack([home, sortie, home])
+        assert route_length(path) <= 4000 + 1e-6
+    # Each sortie picks up where the last one stopped
+    for previous, following in zip(sorties, sorties[1:]):
+        assert np.allclose(previous[-1], following[0])
+    assert sum(route_length(sortie) for sortie in sorties) == pytest.approx(route_length(route))
+
+
+def test_sortie_budget_too_small():
+    with pytest.raises(ValueError):
+        survey.split_sorties([[1000, 0], [1000, 500]], 1500)
+
+
+def test_plan_length_goes_through_home():
+    area = survey.rectangle(0, 0, 400, 300)
+    plan = survey.plan_survey(area, 120, 100, home=(100, -200))
+    route = plan.sorties[0]
+    expected = route_length(np.vstack([(100, -200), route, (100, -200)]))
+    assert plan.home == (100, -200)
+    assert plan.length() == pytest.approx(expected)
+    assert plan.length(0) == pytest.approx(expected)
+
+
+def test_commands_split_long_legs():
+    plan = survey.SurveyPlan([np.array([[0, 0], [1200, 0], [1200, 100]])], 100, 'lawnmower', 100)
+    assert plan.commands() == 3 + 1
+    assert plan.turns() == 1
+    assert "1 sorties" in plan.summary()
+
+
+def test_fly_survey_climbs_in_legs():
+    import simulator
+
+    def mission(hawk, settings):
+        hawk.takeoff()
+        plan = hawk.plan_survey(survey.rectangle(0, 0, 200, 200), 700, 100)
+        hawk.fly_survey(plan, closed_loop=False)
+        return {'altitude': hawk.altitude()}
+
+    outcome = simulator.run_mission(mission, {'seed': 1, 'baro_noise': 0,
+                                              'parameters': {'ceiling': 900}})
+    assert outcome['ok'], outcome.get('error')
+    assert outcome['position'][2] == pytest.approx(700, abs=20)
+
+
+def test_plan_survey_out_of_reach_returns_none():
+    import simulator
+
+    def mission(hawk, settings):
+        hawk.takeoff()
+        far_field = survey.rectangle(2000, 2000, 200, 200)
+        return {'plan': hawk.plan_survey(far_field, 100, 50, sortie_distance=500)}
+
+    outcome = simulator.run_mission(mission, {'seed': 1})
+    assert outcome['ok'], outcome.get('error')
+    assert outcome['plan'] is None
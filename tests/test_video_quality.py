@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+import pytest
+
+pytest.importorskip('djitellopy')
+from command_executor import CommandExecutor
+from video_quality import VideoStats, AdaptiveVideoQuality, QUALITY_LEVELS
+
+TOP = len(QUALITY_LEVELS) - 1
+
+
+class FakeHut():
+    """ Records the video settings it is sent and which thread sent them """
+
+    def __init__(self):
+        self.logger = logging.getLogger('drone_logger')
+        self.settings = []
+        self.threads = set()
+
+    def set_video_resolution(self, resolution):
+        self._set('resolution', resolution)
+
+    def set_video_fps(self, fps):
+        self._set('fps', fps)
+
+    def set_video_bitrate(self, bitrate):
+        self._set('bitrate', bitrate)
+
+    def _set(self, name, value):
+        self.settings.append((name, value))
+        self.threads.add(threading.get_ident())
+
+
+class InlineExecutor():
+    """ Runs submitted actions at once, or turns them all away """
+
+    def __init__(self, accept=True):
+        self.accept = accept
+
+    def submit(self, name, function, *args, lane=None, on_done=None):
+        if self.accept:
+            function(*args)
+        return self.accept
+
+
+def feed(stats, age, frames=30, dropped=0):
+    for _ in range(frames):
+        stats.frame_arrived()
+        stats.frame_processed(0.005)
+        stats.frame_displayed(0.0, now=age)
+    for _ in range(dropped):
+        stats.frame_dropped()
+
+
+def windows(controller, clock, count, age, dropped=0):
+    for _ in range(count):
+        feed(controller.stats, age, dropped=dropped)
+        clock.now += controller.window
+        controller.update()
+
+
+def make(clock, executor=None, **options):
+    hut = FakeHut()
+    controller = AdaptiveVideoQuality(hut, VideoStats(), executor or InlineExecutor(),
+                                      clock=clock, **options)
+    return controller, hut
+
+
+def test_stats_take_resets():
+    stats = VideoStats()
+    feed(stats, 0.1, frames=3, dropped=1)
+    sample = stats.take()
+    assert (sample['arrived'], sample['displayed'], sample['dropped']) == (3, 3, 1)
+    assert sample['ages'] == pytest.approx([0.1] * 3)
+    assert stats.take()['arrived'] == 0
+
+
+def test_steps_down_after_bad_windows_and_waits_for_cooldown(clock):
+    controller, hut = make(clock, cooldown=6.0)
+    clock.now = 10.0
+    windows(controller, clock, 1, age=0.4)
+    assert controller.level == TOP
+    windows(controller, clock, 1, age=0.4)
+    assert controller.level == TOP - 1
+    assert ('resolution', QUALITY_LEVELS[TOP - 1]['resolution']) in hut.settings
+
+    # Still bad, but within the cooldown
+    windows(controller, clock, 2, age=0.4)
+    assert controller.level == TOP - 1
+    windows(controller, clock, 1, age=0.4)
+    assert controller.level == TOP - 2
+
+
+def test_drops_count_as_bad(clock):
+    controller, _ = make(clock, cooldown=0)
+    windows(controller, clock, 2, age=0.01, dropped=20)
+    assert controller.level == TOP - 1
+
+
+def test_steps_up_after_good_windows(clock):
+    controller, _ = make(clock, cooldown=0, up_after=3)
+    controller.level = 0
+    windows(controller, clock, 2, age=0.01)
+    assert controller.level == 0
+    windows(controller, clock, 1, age=0.01)
+    assert controller.level == 1
+
+
+def test_in_between_windows_change_nothing(clock):
+    controller, _ = make(clock, cooldown=0)
+    controller.level = 2
+    windows(controller, clock, 10, age=0.12)
+    assert controller.level == 2
+
+
+def test_rejected_change_keeps_the_level(clock):
+    controller, hut = make(clock, InlineExecutor(accept=False), cooldown=0)
+    windows(controller, clock, 2, age=0.4)
+    assert controller.level == TOP
+    assert hut.settings == []
+
+
+def test_settings_are_sent_on_the_executor(clock):
+    executor = CommandExecutor()
+    controller, hut = make(clock, executor)
+    assert controller.set_level(1)
+    deadline = time.monotonic() + 5
+    while executor.busy() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    executor.stop(timeout=5)
+    assert [name for name, _ in hut.settings] == ['resolution', 'fps', 'bitrate']
+    assert threading.get_ident() not in hut.threads
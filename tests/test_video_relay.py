@@ -0,0 +1,150 @@
+import base64
+import hashlib
+import socket
+import threading
+import urllib.error
+import urllib.request
+import pytest
+
+np = pytest.importorskip('numpy')
+cv2 = pytest.importorskip('cv2')
+from video_relay import VideoRelay, WEBSOCKET_GUID
+
+
+def frame(width=960, height=720, value=0):
+    return np.full((height, width, 3), value, dtype=np.uint8)
+
+
+@pytest.fixture
+def relay():
+    relay = VideoRelay(port=0, width=320)
+    relay.start()
+    stop = threading.Event()
+
+    # Stand-in for the camera thread
+    def publish():
+        value = 0
+        while not stop.wait(0.01):
+            value = (value + 1) % 256
+            relay.publish(frame(value=value))
+
+    thread = threading.Thread(target=publish, daemon=True)
+    thread.start()
+    yield relay
+    stop.set()
+    thread.join()
+    relay.stop()
+
+
+def address(relay):
+    return relay.server.server_address[:2]
+
+
+def test_publish_keeps_only_the_newest_frame():
+    relay = VideoRelay()
+    first, second = frame(), frame()
+    relay.publish(first)
+    relay.publish(first)
+    relay.publish(None)
+    relay.publish(second)
+    assert relay.raw_frame is second
+    assert relay.frames_published == 2
+    assert relay.frames_skipped == 1
+
+
+def test_encode_resizes_keeping_aspect_ratio():
+    jpeg = VideoRelay(width=320)._encode(frame())
+    image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+    assert image.shape == (240, 320, 3)
+
+
+def test_snapshot(relay):
+    host, port = address(relay)
+    with urllib.request.urlopen(f"http://{host}:{port}/snapshot.jpg", timeout=5) as response:
+        assert response.headers['Content-Type'] == 'image/jpeg'
+        jpeg = response.read()
+    image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+    assert image.shape == (240, 320, 3)
+    assert relay.frames_encoded >= 1
+
+
+def open_websocket(relay, key, upgrade=True):
+    """ Send the handshake, returns (connection, stream, status line, headers) """
+    conn = socket.create_connection(address(relay), timeout=5)
+    request = "GET /ws HTTP/1.1\r\nHost: localhost\r\n"
+    if upgrade:
+        request += "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+    if key:
+        request += f"Sec-WebSocket-Key: {key}\r\n"
+    conn.sendall((request + "Sec-WebSocket-Version: 13\r\n\r\n").encode())
+    stream = conn.makefile('rb')
+    status = stream.readline()
+    headers = {}
+    for line in iter(stream.readline, b'\r\n'):
+        name, value = line.decode().split(':', 1)
+        headers[name.lower()] = value.strip()
+    return conn, stream, status, headers
+
+
+def read_frame(stream):
+    """ (first byte, payload) of one unmasked frame from the relay """
+    first, length = stream.read(2)
+    if length == 126:
+        length = int.from_bytes(stream.read(2), 'big')
+    elif length == 127:
+        length = int.from_bytes(stream.read(8), 'big')
+    return first, stream.read(length)
+
+
+def masked(opcode, payload):
+    """ A final frame as a viewer must send it """
+    mask = b'\x01\x02\x03\x04'
+    body = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+    return bytes([0x80 | opcode, 0x80 | len(payload)]) + mask + body
+
+
+def test_websocket_sends_binary_jpeg_messages(relay):
+    key = base64.b64encode(b'0123456789abcdef').decode()
+    conn, stream, status, headers = open_websocket(relay, key)
+    with conn:
+        assert b' 101 ' in status
+        expected = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest())
+        assert headers['sec-websocket-accept'] == expected.decode()
+
+        first, jpeg = read_frame(stream)
+        assert first == 0x82
+        assert jpeg[:2] == b'\xff\xd8'
+
+
+@pytest.mark.parametrize('upgrade, key', [(True, None), (False, 'dGhlIHNhbXBsZSBub25jZQ==')])
+def test_malformed_websocket_upgrade_is_400(relay, upgrade, key):
+    conn, stream, status, headers = open_websocket(relay, key, upgrade)
+    with conn:
+        assert b' 400 ' in status
+
+
+def test_websocket_answers_ping_and_close(relay):
+    conn, stream, status, headers = open_websocket(relay, 'dGhlIHNhbXBsZSBub25jZQ==')
+    with conn:
+        assert b' 101 ' in status
+        conn.sendall(masked(0x9, b'hello'))
+        first, payload = read_frame(stream)
+        while first == 0x82:
+            first, payload = read_frame(stream)
+        assert (first, payload) == (0x8A, b'hello')
+
+        conn.sendall(masked(0x8, (1000).to_bytes(2, 'big')))
+        first, payload = read_frame(stream)
+        while first == 0x82:
+            first, payload = read_frame(stream)
+        assert (first, payload) == (0x88, (1000).to_bytes(2, 'big'))
+        # Nothing follows the close and the relay lets the viewer go
+        assert stream.read() == b''
+    assert relay.clients == 0
+
+
+def test_unknown_path_is_404(relay):
+    host, port = address(relay)
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(f"http://{host}:{port}/nothing", timeout=5)
+    assert error.value.code == 404
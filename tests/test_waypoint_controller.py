@@ -0,0 +1,113 @@
+import math
+import types
+import pytest
+import simulator
+from waypoint_controller import PID, WaypointController
+
+
+def test_pid_proportional_and_output_limit():
+    pid = PID(kp=2.0, output_limit=50)
+    assert pid.update(10, 0.1) == 20
+    assert pid.update(100, 0.1) == 50
+    assert pid.update(-100, 0.1) == -50
+
+
+def test_pid_derivative_uses_measured_rate():
+    pid = PID(kp=0.0, kd=0.5)
+    # A setpoint jump doesn't kick the output when the rate is known
+    assert pid.update(100, 0.1, rate=0.0) == 0.0
+    assert pid.update(100, 0.1, rate=20.0) == -10.0
+
+
+def test_pid_derivative_from_error_without_rate():
+    pid = PID(kp=0.0, kd=1.0)
+    pid.update(10, 0.1)
+    assert pid.update(12, 0.1) == pytest.approx(20.0)
+
+
+def test_pid_does_not_wind_up_while_saturated():
+    pid = PID(kp=1.0, ki=1.0, output_limit=40)
+    for _ in range(100):
+        pid.update(500, 0.1)
+    assert pid.integral == 0.0
+    pid.update(10, 0.1)
+    assert pid.integral == pytest.approx(1.0)
+
+
+def test_pid_integral_limit():
+    pid = PID(kp=0.0, ki=1.0, integral_limit=5)
+    for _ in range(100):
+        pid.update(10, 0.1)
+    assert pid.integral == 5
+
+
+def test_pursuit_point_looks_ahead_along_the_leg():
+    hut = types.SimpleNamespace(drone=None, x=0.0, y=0.0)
+    controller = WaypointController(hut, lookahead=50)
+    controller.x, controller.y = 100.0, 30.0
+    assert controller._pursuit_point((0, 0), (400, 0)) == pytest.approx((150.0, 0.0))
+    # Never past the end of the leg
+    controller.x = 380.0
+    assert controller._pursuit_point((0, 0), (400, 0)) == pytest.approx((400.0, 0.0))
+
+
+def waypoints_mission(hawk, settings):
+    hawk.takeoff()
+    arrived = hawk.fly_waypoints(settings['route'], **settings.get('options', {}))
+    return {'arrived': arrived, 'estimate': (hawk.x, hawk.y)}
+
+
+def test_flies_a_route_and_settles_on_the_last_waypoint():
+    route = [(200, 0), (200, 200), (0, 200)]
+    outcome = simulator.run_mission(waypoints_mission, {'route': route, 'seed': 1})
+    assert outcome['ok'], outcome.get('error')
+    assert outcome['arrived']
+    x, y, _ = outcome['position']
+    # Arrival is judged on the estimate, the true position is a bit further off
+    assert math.hypot(*(a - b for a, b in zip(outcome['estimate'], route[-1]))) < 15
+    assert math.hypot(x - 0, y - 200) < 40
+
+
+def test_max_rc_sets_the_cruise_speed():
+    times = []
+    for max_rc in (30, 60, 100):
+        outcome = simulator.run_mission(waypoints_mission, {
+            'route': [(0, 800)], 'options': {'max_rc': max_rc}, 'seed': 1})
+        assert outcome['arrived']
+        times.append(outcome['sim_seconds'])
+    assert times[0] > times[1] > times[2]
+
+
+def test_go_home_keeps_the_estimate_when_it_falls_short():
+    def mission(hawk, settings):
+        hawk.takeoff()
+        hawk.fly_waypoints([(0, 300)])
+        hawk.fly_waypoints = lambda route, **options: WaypointController(
+            hawk, timeout=0.5, clock=hawk.time, sleep=hawk.sleep).fly(route)
+        hawk.go_home(closed_loop=True)
+        return {'estimate': (hawk.x, hawk.y)}
+
+    outcome = simulator.run_mission(mission, {'seed': 1})
+    assert outcome['ok'], outcome.get('error')
+    x, y = outcome['estimate']
+    assert y > 100
+    assert math.hypot(x - outcome['position'][0], y - outcome['position'][1]) < 40
+
+
+@pytest.mark.parametrize('wind', [(100, 0), (300, 0), (0, -200)])
+def test_arrives_where_it_thinks_in_wind(wind):
+    def mission(hawk, settings):
+        hawk.takeoff()
+        # Wind also moves the drone during takeoff, which no controller can
+        # see, so measure the flight from where it starts
+        start = hawk.drone.x, hawk.drone.y
+        arrived = hawk.fly_waypoints(settings['route'])
+        return {'arrived': arrived, 'flown': (hawk.drone.x - start[0], hawk.drone.y - start[1])}
+
+    route = [(200, 0), (200, 200), (0, 200)]
+    outcome = simulator.run_mission(mission, {'route': route, 'wind': wind, 'seed': 1})
+    assert outcome['ok'], outcome.get('error')
+    assert outcome['arrived']
+    # Within tolerance of the estimate, and the estimate within 10cm of the truth
+    x, y = outcome['flown']
+    assert math.hypot(x - 0, y - 200) < 25
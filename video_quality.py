@@ -0,0 +1,186 @@
+import threading
+import time
+from djitellopy import Tello
+from command_executor import MANEUVER
+
+# Video settings from lightest to heaviest load on the ground station.
+# The last level is what the drone streams by default.
+QUALITY_LEVELS = [
+    {'resolution': Tello.RESOLUTION_480P, 'fps': Tello.FPS_5, 'bitrate': Tello.BITRATE_1MBPS},
+    {'resolution': Tello.RESOLUTION_480P, 'fps': Tello.FPS_15, 'bitrate': Tello.BITRATE_2MBPS},
+    {'resolution': Tello.RESOLUTION_480P, 'fps': Tello.FPS_30, 'bitrate': Tello.BITRATE_3MBPS},
+    {'resolution': Tello.RESOLUTION_720P, 'fps': Tello.FPS_15, 'bitrate': Tello.BITRATE_3MBPS},
+    {'resolution': Tello.RESOLUTION_720P, 'fps': Tello.FPS_30, 'bitrate': Tello.BITRATE_4MBPS},
+    {'resolution': Tello.RESOLUTION_720P, 'fps': Tello.FPS_30, 'bitrate': Tello.BITRATE_AUTO},
+]
+
+#--------------------------- BEGIN VideoStats CLASS ----------------------------
+
+class VideoStats():
+    """
+    Collects per-frame measurements from the camera thread and the display
+    loop: the processing each new frame gets on its way to the screen
+    (rotation and surface creation), how old a frame is when it is shown
+    and how many frames never made it to the screen. A frame's age runs
+    from the arrival stamp the out-of-process reader gives it, so it
+    includes the decode; with djitellopy's own reader it can only run from
+    when the camera thread first sees the decoded frame.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.ages = []
+        self.processing = []
+        self.arrived = 0
+        self.dropped = 0
+        self.displayed = 0
+
+    def frame_arrived(self):
+        with self.lock:
+            self.arrived += 1
+
+    def frame_processed(self, seconds):
+        with self.lock:
+            self.processing.append(seconds)
+
+    def frame_dropped(self):
+        """ A frame was replaced in the queue before the display took it """
+        with self.lock:
+            self.dropped += 1
+
+    def frame_displayed(self, arrived_at, now=None):
+        """ A frame that arrived at arrived_at (time.perf_counter) was just shown """
+        now = time.perf_counter() if now is None else now
+        with self.lock:
+            self.displayed += 1
+            self.ages.append(now - arrived_at)
+
+    def take(self):
+        """ Return and reset the measurements gathered since the last take() """
+        with self.lock:
+            snapshot = {
+                'ages': sorted(self.ages),
+                'processing': sorted(self.processing),
+                'arrived': self.arrived,
+                'dropped': self.dropped,
+                'displayed': self.displayed,
+            }
+            self.clear()
+        return snapshot
+
+#---------------------------- END VideoStats CLASS -----------------------------
+
+#---------------------- BEGIN AdaptiveVideoQuality CLASS -----------------------
+
+class AdaptiveVideoQuality():
+    """
+    Steps the drone's video resolution, FPS and bitrate down when the
+    ground station can't keep up and back up when it has headroom.
+
+    Every window seconds the 90th percentile frame age and drop rate are
+    compared to the target. It takes down_after bad windows in a row to
+    step down and up_after clearly good windows in a row to step up, and
+    no change is made within cooldown seconds of the last one, so the
+    stream doesn't flap between two levels.
+    """
+
+    def __init__(self, hut, stats, executor, target_age=0.15, window=2.0, down_after=2,
+                 up_after=5, cooldown=6.0, max_drop_rate=0.25,
+                 clock=time.perf_counter):
+        """
+        Arguments
+            hut:           HeadsUpTello whose video settings are adjusted
+            stats:         VideoStats fed by the camera thread and display loop
+            executor:      CommandExecutor the settings are sent to the drone on
+            target_age:    Seconds a frame may be old when it is shown
+            window:        Seconds of measurements per decision
+            down_after:    Bad windows in a row before stepping down
+            up_after:      Good windows in a row before stepping up
+            cooldown:      Seconds to wait after a change before the next
+            max_drop_rate: Fraction of frames that may be dropped
+        """
+        self.hut = hut
+        self.stats = stats
+        self.executor = executor
+        self.target_age = target_age
+        self.window = window
+        self.down_after = down_after
+        self.up_after = up_after
+        self.cooldown = cooldown
+        self.max_drop_rate = max_drop_rate
+        self.clock = clock
+
+        self.level = len(QUALITY_LEVELS) - 1
+        self.bad_windows = 0
+        self.good_windows = 0
+        self.window_start = clock()
+        self.last_change = self.window_start
+        self.last_summary = None
+
+    def update(self):
+        """ Call once per loop; evaluates and adjusts when a window has passed """
+        now = self.clock()
+        if now - self.window_start < self.window:
+            return
+        self.window_start = now
+
+        sample = self.stats.take()
+        if not sample['ages']:
+            return
+
+        ages = sample['ages']
+        age_p90 = ages[int(0.9 * (len(ages) - 1))]
+        drop_rate = sample['dropped'] / sample['arrived'] if sample['arrived'] else 0.0
+        processing = sample['processing']
+        processing_p90 = processing[int(0.9 * (len(processing) - 1))] if processing else 0.0
+        self.last_summary = (f"level={self.level} age_p90={age_p90 * 1000:.0f}ms "
+                             f"drop={drop_rate:.0%} processing_p90={processing_p90 * 1000:.1f}ms")
+
+        if age_p90 > self.target_age or drop_rate > self.max_drop_rate:
+            self.bad_windows += 1
+            self.good_windows = 0
+        elif age_p90 < 0.6 * self.target_age and drop_rate < self.max_drop_rate / 4:
+            self.good_windows += 1
+            self.bad_windows = 0
+        else:
+            self.bad_windows = 0
+            self.good_windows = 0
+
+        if now - self.last_change < self.cooldown:
+            return
+        if self.bad_windows >= self.down_after and self.level > 0:
+            self.set_level(self.level - 1, now)
+        elif self.good_windows >= self.up_after and self.level < len(QUALITY_LEVELS) - 1:
+            self.set_level(self.level + 1, now)
+
+    def set_level(self, level, now=None):
+        """
+        Switch to a quality level. The settings go to the drone on the
+        command executor, one command at a time with the others, because
+        each one waits for the drone's reply. Returns False if the executor
+        turned them away; the level is left alone and tried again later.
+        """
+        if not self.executor.submit(f'video quality {level}', self._apply, QUALITY_LEVELS[level], lane=MANEUVER):
+            self.hut.logger.warning(f"Video quality change to {level} not queued, drone is busy")
+            return False
+        self.hut.logger.info(f"Video quality {self.level} -> {level} ({self.last_summary})")
+        self.level = level
+        self.bad_windows = 0
+        self.good_windows = 0
+        self.last_change = self.clock() if now is None else now
+        return True
+
+    def _apply(self, settings):
+        try:
+            self.hut.set_video_resolution(settings['resolution'])
+            self.hut.set_video_fps(settings['fps'])
+            self.hut.set_video_bitrate(settings['bitrate'])
+        except Exception as excp:
+            self.hut.logger.warning(f"Could not change video settings: {excp}")
+        # Measurements from the old settings say nothing about the new ones
+        self.stats.take()
+
+#----------------------- END AdaptiveVideoQuality CLASS ------------------------
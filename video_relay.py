@@ -0,0 +1,367 @@
+import base64
+import hashlib
+import logging
+import socket
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+
+# Magic string from RFC 6455 used to answer the WebSocket handshake
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+MJPEG_BOUNDARY = "heads-up-frame"
+
+# WebSocket opcodes the relay sends or answers
+WS_BINARY = 0x2
+WS_CLOSE = 0x8
+WS_PING = 0x9
+WS_PONG = 0xA
+
+# Viewers only send control frames, refuse anything bigger than this
+MAX_VIEWER_MESSAGE = 65536
+
+VIEWER_PAGE = b"""<!DOCTYPE html>
+<html><head><title>Heads-Up Flight</title></head>
+<body style="background:#211d1e;margin:0">
+<img src="/stream.mjpg" style="display:block;margin:auto;max-width:100%">
+</body></html>
+"""
+
+#--------------------------- BEGIN VideoRelay CLASS ----------------------------
+
+class VideoRelay():
+    """
+    Shares the drone's video feed with any number of local viewers.
+
+    The ground station hands every decoded frame to publish(). A single
+    worker thread re-encodes only the newest frame to JPEG at the chosen
+    width and quality, and each viewer connection sends whichever JPEG is
+    newest when it is ready for another one. A slow viewer simply skips
+    frames - nothing ever waits on a viewer, so the drone link and the
+    pygame loop never feel them.
+
+    Endpoints (localhost only by default):
+        /             small viewer page
+        /stream.mjpg  multipart MJPEG stream
+        /snapshot.jpg the latest frame
+        /ws           WebSocket sending one binary JPEG message per frame
+                      (pings and close from the viewer are answered)
+    """
+
+    def __init__(self, port=8080, width=640, quality=70, host='127.0.0.1',
+                 logger=None):
+        """
+        Arguments
+            port:    TCP port to serve on
+            width:   Width of the relayed video, height keeps the aspect
+                     ratio. None relays at the drone's resolution.
+            quality: JPEG quality from 1 to 100
+            host:    Interface to listen on, keep 127.0.0.1 unless viewers
+                     on other machines really need the feed
+        """
+        self.port = port
+        self.width = width
+        self.quality = quality
+        self.host = host
+        self.logger = logger or logging.getLogger('drone_logger')
+
+        self.condition = threading.Condition()
+        self.raw_frame = None
+        self.last_published = None
+        self.jpeg = None
+        self.sequence = 0
+        self.clients = 0
+        self.running = False
+
+        # Counters for the relay's health
+        self.frames_published = 0
+        self.frames_encoded = 0
+        self.frames_skipped = 0
+
+        self.server = None
+
+    def start(self):
+        """ Start the encoder worker and the HTTP server """
+        self.running = True
+        self.server = ThreadingHTTPServer((self.host, self.port), RelayRequestHandler)
+        self.server.daemon_threads = True
+        self.server.relay = self
+        threading.Thread(target=self._encode_loop, daemon=True).start()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.logger.info(f"Video relay serving on http://{self.host}:{self.port}/")
+
+    def stop(self):
+        """ Stop serving and wake every waiting viewer so it can exit """
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def publish(self, frame):
+        """
+        Offer a decoded RGB frame to the relay. Never blocks on encoding or
+        viewers; if the encoder is still busy the previous unencoded frame
+        is replaced.
+        """
+        if frame is None or frame is self.last_published:
+            return
+        with self.condition:
+            if self.raw_frame is not None:
+                self.frames_skipped += 1
+            self.raw_frame = frame
+            self.last_published = frame
+            self.frames_published += 1
+            self.condition.notify_all()
+
+    def _encode_loop(self):
+        """ Worker thread: turn the newest raw frame into a JPEG """
+        while self.running:
+            with self.condition:
+                while self.running and (self.raw_frame is None or self.clients == 0):
+                    self.condition.wait(0.5)
+                    # Nobody is watching, don't hold on to stale frames
+                    if self.clients == 0:
+                        self.raw_frame = None
+                frame = self.raw_frame
+                self.raw_frame = None
+            if frame is None:
+                continue
+
+            jpeg = self._encode(frame)
+            if jpeg is None:
+                continue
+
+            with self.condition:
+                self.jpeg = jpeg
+                self.sequence += 1
+                self.frames_encoded += 1
+                self.condition.notify_all()
+
+    def _encode(self, frame):
+        """ Resize and JPEG encode one frame """
+        if self.width and frame.shape[1] != self.width:
+            height = int(frame.shape[0] * self.width / frame.shape[1])
+            frame = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        # djitellopy hands out RGB frames, OpenCV encodes BGR
+        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            self.logger.warning("Video relay could not encode a frame")
+            return None
+        return buffer.tobytes()
+
+    def next_jpeg(self, last_sequence, timeout=2.0):
+        """
+        Wait for a JPEG newer than last_sequence and return (sequence, jpeg).
+        Returns (last_sequence, None) on timeout or when the relay stops.
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: not self.running or self.sequence > last_sequence, timeout)
+            if not self.running or self.sequence <= last_sequence:
+                return last_sequence, None
+            return self.sequence, self.jpeg
+
+    def add_client(self):
+        with self.condition:
+            self.clients += 1
+            self.condition.notify_all()
+
+    def remove_client(self):
+        with self.condition:
+            self.clients -= 1
+
+    def stats(self):
+        """ Return a one-line summary of relay activity """
+        return (f"viewers={self.clients} published={self.frames_published} "
+                f"encoded={self.frames_encoded} skipped={self.frames_skipped}")
+
+#---------------------------- END VideoRelay CLASS -----------------------------
+
+#----------------------- BEGIN RelayRequestHandler CLASS -----------------------
+
+class RelayRequestHandler(BaseHTTPRequestHandler):
+    """ Serves one viewer connection for VideoRelay. """
+
+    # WebSocket upgrades must be answered with HTTP/1.1
+    protocol_version = 'HTTP/1.1'
+
+    # Give up on viewers that stop reading instead of tying up a thread
+    timeout = 10
+
+    def log_message(self, format, *args):
+        """ Route http.server's access log to the drone log """
+        self.server.relay.logger.debug(f"Video relay: {format % args}")
+
+    def setup(self):
+        super().setup()
+        # Set once a WebSocket viewer closes, writes are serialized because
+        # the reader thread answers pings while frames are being sent
+        self.viewer_closed = threading.Event()
+        self.write_lock = threading.Lock()
+
+    def do_GET(self):
+        if self.path == '/':
+            self._send_page()
+        elif self.path == '/snapshot.jpg':
+            self._send_snapshot()
+        elif self.path == '/stream.mjpg':
+            self._stream(self._send_mjpeg_part, self._start_mjpeg)
+        elif self.path == '/ws':
+            if (self.headers.get('Upgrade', '').lower() != 'websocket'
+                    or not self.headers.get('Sec-WebSocket-Key')):
+                self.send_error(400, "Expected a WebSocket upgrade")
+                return
+            self._stream(self._send_websocket_message, self._start_websocket)
+        else:
+            self.send_error(404)
+
+    def _send_page(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(VIEWER_PAGE)))
+        self.end_headers()
+        self.wfile.write(VIEWER_PAGE)
+
+    def _send_snapshot(self):
+        relay = self.server.relay
+        relay.add_client()
+        try:
+            # Wait for a fresh frame, the stored one may be stale if nobody was watching
+            _, jpeg = relay.next_jpeg(relay.sequence)
+        finally:
+            relay.remove_client()
+        if jpeg is None:
+            self.send_error(503, "No video yet")
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(jpeg)))
+        self.end_headers()
+        self.wfile.write(jpeg)
+
+    def _stream(self, send, start):
+        """ Send the newest JPEG every time one is ready, skipping any we missed """
+        relay = self.server.relay
+        relay.add_client()
+        dropped = 0
+        try:
+            start()
+            sequence = 0
+            while relay.running and not self.viewer_closed.is_set():
+                latest, jpeg = relay.next_jpeg(sequence)
+                if jpeg is None:
+                    continue
+                if sequence:
+                    dropped += latest - sequence - 1
+                sequence = latest
+                send(jpeg)
+        except (ConnectionError, TimeoutError, OSError):
+            pass
+        finally:
+            relay.remove_client()
+            relay.logger.info(f"Video relay viewer {self.client_address[0]} left, "
+                              f"dropped {dropped} frames")
+
+    def _start_mjpeg(self):
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}')
+        self.end_headers()
+
+    def _send_mjpeg_part(self, jpeg):
+        self.wfile.write(f"--{MJPEG_BOUNDARY}\r\n"
+                         f"Content-Type: image/jpeg\r\n"
+                         f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+        self.wfile.write(jpeg)
+        self.wfile.write(b"\r\n")
+        self.wfile.flush()
+
+    def _start_websocket(self):
+        key = self.headers['Sec-WebSocket-Key']
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest())
+        self.send_response(101, 'Switching Protocols')
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', accept.decode())
+        self.end_headers()
+        self.close_connection = True
+        threading.Thread(target=self._read_websocket, daemon=True).start()
+
+    def _send_websocket_message(self, jpeg):
+        """ Send jpeg as a single binary WebSocket message """
+        self._send_websocket_frame(WS_BINARY, jpeg)
+
+    def _send_websocket_frame(self, opcode, payload):
+        """ Send one unmasked, final WebSocket frame, nothing after a close """
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+        with self.write_lock:
+            if self.viewer_closed.is_set():
+                return
+            self.wfile.write(header + payload)
+            self.wfile.flush()
+            if opcode == WS_CLOSE:
+                self.viewer_closed.set()
+
+    def _read_websocket(self):
+        """
+        Reader thread for a WebSocket viewer: answers pings with a pong and
+        a close with a close, which also ends the stream. Other messages
+        are ignored. Reads straight from the socket, whose timeouts don't
+        spoil it the way they do rfile; a viewer can't send anything before
+        the handshake reply, so rfile holds nothing unread.
+        """
+        try:
+            while not self.viewer_closed.is_set():
+                try:
+                    first = self._read_exactly(1)
+                except socket.timeout:
+                    # Viewers rarely send anything, keep waiting
+                    continue
+                opcode, payload = self._read_websocket_frame(first[0])
+                if opcode == WS_PING:
+                    self._send_websocket_frame(WS_PONG, payload)
+                elif opcode == WS_CLOSE:
+                    # Echo the status code back
+                    self._send_websocket_frame(WS_CLOSE, payload[:2])
+        except (ConnectionError, TimeoutError, OSError):
+            pass
+        finally:
+            self.viewer_closed.set()
+
+    def _read_websocket_frame(self, first):
+        """ Read the rest of a viewer's frame, returns (opcode, unmasked payload) """
+        opcode = first & 0x0F
+        second = self._read_exactly(1)[0]
+        length = second & 0x7F
+        if length == 126:
+            length, = struct.unpack('!H', self._read_exactly(2))
+        elif length == 127:
+            length, = struct.unpack('!Q', self._read_exactly(8))
+        if length > MAX_VIEWER_MESSAGE:
+            raise ConnectionError(f"WebSocket message of {length} bytes from viewer")
+        # Viewers must mask what they send
+        mask = self._read_exactly(4) if second & 0x80 else bytes(4)
+        payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(self._read_exactly(length)))
+        return opcode, payload
+
+    def _read_exactly(self, count):
+        data = b''
+        while len(data) < count:
+            chunk = self.connection.recv(count - len(data))
+            if not chunk:
+                raise ConnectionError("Viewer closed the connection")
+            data += chunk
+        return data
+
+#------------------------ END RelayRequestHandler CLASS ------------------------
@@ -0,0 +1,309 @@
+import math
+import time
+
+# The Tello reports vgx/vgy/vgz in decimeters per second
+TELEMETRY_SPEED_SCALE = 10
+
+# Widest wind drift (cm/s) the drift range starts a flight with, more than
+# the position hold leaks in any wind the Tello can fly in
+MAX_DRIFT = 100
+
+# How fast (cm/s per second) the range of drift the telemetry allows is let
+# out again, so the estimate can follow the wind when it changes
+DRIFT_WIDEN = 0.3
+
+#------------------------------ BEGIN PID CLASS --------------------------------
+
+class PID():
+    """
+    A small PID controller. When the caller knows how fast the measured
+    value is changing (e.g. velocity telemetry) it can pass that in as
+    rate and the derivative term uses it instead of differentiating the
+    error, which avoids a kick every time the setpoint jumps.
+    """
+
+    def __init__(self, kp, ki=0.0, kd=0.0, integral_limit=None, output_limit=None):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.integral_limit = integral_limit
+        self.output_limit = output_limit
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.last_error = None
+
+    def update(self, error, dt, rate=None):
+        """
+        Return the control output for this error.
+
+        Arguments
+            error: setpoint - measurement
+            dt:    seconds since the last update
+            rate:  measured rate of change of the measurement, optional
+        """
+        if rate is not None:
+            derivative = -rate
+        elif self.last_error is not None and dt > 0:
+            derivative = (error - self.last_error) / dt
+        else:
+            derivative = 0.0
+        self.last_error = error
+
+        output = self.kp * error + self.ki * self.integral + self.kd * derivative
+        # Only integrate while the output isn't saturated, otherwise long
+        # legs wind the integral up and the drone overshoots at the end
+        saturated = self.output_limit is not None and abs(output) >= self.output_limit
+        if dt > 0 and not saturated:
+            self.integral += error * dt
+            if self.integral_limit is not None:
+                self.integral = max(-self.integral_limit, min(self.integral_limit, self.integral))
+
+        if self.output_limit is not None:
+            output = max(-self.output_limit, min(self.output_limit, output))
+        return output
+
+#------------------------------- END PID CLASS ---------------------------------
+
+#----------------------- BEGIN WaypointController CLASS ------------------------
+
+class WaypointController():
+    """
+    Closed-loop waypoint tracking for a HeadsUpTello using RC commands.
+
+    Position is dead-reckoned from the drone's velocity telemetry and
+    heading comes from its yaw telemetry. The controller heads for a
+    pure-pursuit point a lookahead distance down the current leg at max_rc,
+    so the drone flows from one waypoint into the next without stopping to
+    rotate. On the last leg the speed tapers off with the distance left,
+    and within lookahead of the last waypoint PID control settles the drone
+    on it. Only the final waypoint has to be reached within tolerance, and
+    that is judged on the dead-reckoned position: nothing confirms it, so
+    the drone can be further off than tolerance by however much the
+    estimate has drifted.
+
+    Coordinates match HeadsUpTello: x is to the right and y is forward of
+    the heading the mission started with, bearings are clockwise degrees.
+    """
+
+    def __init__(self, hut, rate=20, tolerance=15, settle_speed=10,
+                 lookahead=60, kp=0.6, ki=0.05, kd=0.35, max_rc=60,
+                 face_travel=False, yaw_kp=1.0, timeout=60, rc_speed=1.0,
+                 response_time=0.4, clock=time.monotonic, sleep=time.sleep):
+        """
+        Arguments
+            hut:          The HeadsUpTello to fly
+            rate:         Control loop rate in Hz
+            tolerance:    cm from the final waypoint that counts as arrived
+            settle_speed: cm/s the drone must be slower than to finish
+            lookahead:    Pure-pursuit lookahead distance in cm
+            kp, ki, kd:   Position PID gains (RC units per cm, cm*s, cm/s)
+            max_rc:       Cruise speed, and the largest RC value sent on
+                          the horizontal axes
+            face_travel:  Yaw toward the direction of travel while flying
+            yaw_kp:       RC units per degree of heading error
+            timeout:      Seconds before giving up on the route
+            rc_speed:     cm/s of velocity per RC unit
+            response_time: Seconds for the drone to get most of the way to
+                          a newly commanded velocity
+            clock, sleep: Time source, swap in a virtual clock for simulation
+        """
+        self.hut = hut
+        self.drone = hut.drone
+        self.period = 1.0 / rate
+        self.tolerance = tolerance
+        self.settle_speed = settle_speed
+        self.lookahead = lookahead
+        self.max_rc = max_rc
+        self.face_travel = face_travel
+        self.yaw_kp = yaw_kp
+        self.timeout = timeout
+        self.rc_speed = rc_speed
+        self.response_time = response_time
+        self.clock = clock
+        self.sleep = sleep
+        self.pid_x = PID(kp, ki, kd, integral_limit=600, output_limit=max_rc)
+        self.pid_y = PID(kp, ki, kd, integral_limit=600, output_limit=max_rc)
+
+        # Telemetry yaw is relative to power-on, mission bearings are
+        # relative to takeoff. This offset converts between the two.
+        self.yaw_offset = 0.0
+        self.x, self.y = hut.x, hut.y
+        self.command_x, self.command_y = 0.0, 0.0
+        self.model_x, self.model_y = 0.0, 0.0
+        self.drift_x, self.drift_y = 0.0, 0.0
+        self.reset_drift()
+        self.commands = 0
+
+    def reset_drift(self):
+        """ Allow any drift up to MAX_DRIFT again, the first readings narrow it down """
+        self.drift_low, self.drift_high = [-MAX_DRIFT, -MAX_DRIFT], [MAX_DRIFT, MAX_DRIFT]
+
+    def heading(self):
+        """ Current bearing in the mission frame from yaw telemetry """
+        return (self.drone.get_yaw() - self.yaw_offset) % 360
+
+    def velocity(self, dt):
+        """
+        Current horizontal velocity (right, forward) in cm/s in the mission
+        frame. The Tello reports vgx along its power-on nose direction and
+        vgy to the right of it, the same frame as its yaw, but only to the
+        nearest 10cm/s. Slow creeping would read as zero and never show up
+        in the position, so the velocity the last command should produce
+        is used instead whenever it agrees with the rounded telemetry.
+        Wind shows up as a gap between the two. Each reading only says the
+        drift is within half a step of that gap, so the drift is taken from
+        the middle of the range every reading since the last wind change
+        allows, which narrows as the commanded velocity changes, and added
+        to the modelled response to the commanded velocity straight away.
+        """
+        forward = self.drone.get_speed_x() * TELEMETRY_SPEED_SCALE
+        right = self.drone.get_speed_y() * TELEMETRY_SPEED_SCALE
+        offset = math.radians(self.yaw_offset)
+        measured_x = right * math.cos(offset) - forward * math.sin(offset)
+        measured_y = right * math.sin(offset) + forward * math.cos(offset)
+
+        blend = 1 - math.exp(-dt / self.response_time) if dt > 0 else 0.0
+        self.model_x += (self.command_x * self.rc_speed - self.model_x) * blend
+        self.model_y += (self.command_y * self.rc_speed - self.model_y) * blend
+        self.drift_x = self._drift_range(0, measured_x - self.model_x, dt)
+        self.drift_y = self._drift_range(1, measured_y - self.model_y, dt)
+
+        estimate_x = self.model_x + self.drift_x
+        estimate_y = self.model_y + self.drift_y
+        half_step = TELEMETRY_SPEED_SCALE / 2
+        estimate_x = max(measured_x - half_step, min(measured_x + half_step, estimate_x))
+        estimate_y = max(measured_y - half_step, min(measured_y + half_step, estimate_y))
+        return estimate_x, estimate_y
+
+    def _drift_range(self, axis, gap, dt):
+        """ Narrow the drift range on axis with a measured-minus-model gap, return its middle """
+        half_step = TELEMETRY_SPEED_SCALE / 2
+        low = max(self.drift_low[axis] - DRIFT_WIDEN * dt, gap - half_step)
+        high = min(self.drift_high[axis] + DRIFT_WIDEN * dt, gap + half_step)
+        if low > high:
+            # The wind changed faster than the range widens, start over
+            low, high = gap - half_step, gap + half_step
+        self.drift_low[axis], self.drift_high[axis] = low, high
+        return (low + high) / 2
+
+    def _pursuit_point(self, start, end):
+        """ Point lookahead cm down the leg start->end from our projection on it """
+        leg_x, leg_y = end[0] - start[0], end[1] - start[1]
+        length = math.hypot(leg_x, leg_y)
+        if length == 0:
+            return end
+        along = ((self.x - start[0]) * leg_x + (self.y - start[1]) * leg_y) / length
+        along = min(length, max(0.0, along) + self.lookahead)
+        return start[0] + leg_x * along / length, start[1] + leg_y * along / length
+
+    def _send(self, vx, vy, yaw_rc, bearing):
+        """ Rotate a mission-frame velocity command into the body frame and send it """
+        angle = math.radians(bearing)
+        left_right = self._clip(vx * math.cos(angle) - vy * math.sin(angle))
+        forward_back = self._clip(vx * math.sin(angle) + vy * math.cos(angle))
+        self.drone.send_rc_control(left_right, forward_back, 0, int(max(-100, min(100, yaw_rc))))
+        self.commands += 1
+        # Remember what we asked for in the mission frame for velocity()
+        self.command_x = left_right * math.cos(angle) + forward_back * math.sin(angle)
+        self.command_y = forward_back * math.cos(angle) - left_right * math.sin(angle)
+
+    def _clip(self, value):
+        return int(max(-self.max_rc, min(self.max_rc, value)))
+
+    def fly(self, waypoints):
+        """
+        Fly through every (x, y) waypoint in order. Returns True when the
+        dead-reckoned position settled within tolerance of the last one,
+        False on timeout or low battery. Either way HeadsUpTello's
+        coordinates are updated to that estimate, not to where the drone
+        was told to go.
+        """
+        waypoints = [tuple(point) for point in waypoints]
+        if not waypoints:
+            return True
+
+        self.x, self.y = self.hut.x, self.hut.y
+        self.yaw_offset = (self.drone.get_yaw() - self.hut.rotation_angle) % 360
+        self.pid_x.reset()
+        self.pid_y.reset()
+        self.command_x, self.command_y = 0.0, 0.0
+        self.model_x, self.model_y = 0.0, 0.0
+        # The wind may have changed since the last flight
+        self.reset_drift()
+        hold_bearing = self.hut.rotation_angle
+
+        start = (self.x, self.y)
+        index = 0
+        arrived = False
+        settling = False
+        began = last = self.clock()
+
+        while True:
+            now = self.clock()
+            dt = now - last
+            last = now
+
+            vx, vy = self.velocity(dt)
+            self.x += vx * dt
+            self.y += vy * dt
+            bearing = self.heading()
+
+            if self.drone.get_battery() < self.hut.min_op_battery:
+                self.hut.logger.error("Battery too low during waypoint flight.")
+                break
+            if now - began > self.timeout:
+                self.hut.logger.warning(f"Waypoint flight timed out at ({self.x:.0f}, {self.y:.0f}).")
+                break
+
+            # Hand over to the next leg once we are inside the lookahead
+            # circle of an intermediate waypoint
+            target = waypoints[index]
+            while index < len(waypoints) - 1 and \
+                    math.hypot(target[0] - self.x, target[1] - self.y) < self.lookahead:
+                start = target
+                index += 1
+                target = waypoints[index]
+
+            final = index == len(waypoints) - 1
+            distance = math.hypot(target[0] - self.x, target[1] - self.y)
+            if final and distance < self.tolerance and math.hypot(vx, vy) < self.settle_speed:
+                arrived = True
+                break
+
+            if final and distance < self.lookahead:
+                # Settle on the last waypoint
+                if not settling:
+                    self.pid_x.reset()
+                    self.pid_y.reset()
+                    settling = True
+                command_x = self.pid_x.update(target[0] - self.x, dt, vx)
+                command_y = self.pid_y.update(target[1] - self.y, dt, vy)
+            else:
+                # Head for the pursuit point at cruise speed, slowing down on
+                # the last leg to meet the settling PID where it takes over
+                settling = False
+                speed = self.max_rc
+                if final:
+                    speed = min(speed, self.pid_x.kp * distance)
+                aim = self._pursuit_point(start, target)
+                aim_x, aim_y = aim[0] - self.x, aim[1] - self.y
+                aim_distance = math.hypot(aim_x, aim_y) or 1.0
+                command_x = speed * aim_x / aim_distance
+                command_y = speed * aim_y / aim_distance
+
+            if self.face_travel and distance > self.tolerance:
+                hold_bearing = math.degrees(math.atan2(target[0] - self.x, target[1] - self.y)) % 360
+            yaw_error = (hold_bearing - bearing + 180) % 360 - 180
+            yaw_rc = self.yaw_kp * yaw_error
+
+            self._send(command_x, command_y, yaw_rc, bearing)
+            self.sleep(max(0.0, self.period - (self.clock() - now)))
+
+        self.drone.send_rc_control(0, 0, 0, 0)
+        self.hut.x, self.hut.y = self.x, self.y
+        self.hut.rotation_angle = self.heading()
+        return arrived
+
+#------------------------ END WaypointController CLASS -------------------------